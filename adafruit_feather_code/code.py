@@ -1,7 +1,21 @@
+import sys
 import time
-from lora_setup import get_lora_radio
+from framing import (is_frame, decode_frame, encode_frame, FrameError, serial_envelope, split_batch, pack_batch,
+                     group_batches, TYPE_END, TYPE_FILE, TYPE_XFER_BEGIN, TYPE_BATCH, FLAG_POLL)
+from windowed_receiver import begin_transfer, run_transfer
 import os
 
+try:
+    import usb_cdc
+    serial_out = usb_cdc.console
+except ImportError:
+    serial_out = None
+
+try:
+    import supervisor  # Lets us notice a new command (e.g. STOP) while responses stream in
+except ImportError:
+    supervisor = None
+
 # --- Configuration ---
 LORA_FREQ = 915.0
 TX_POWER = 20
@@ -10,13 +24,101 @@ INTER_PACKET_TIMEOUT = 0.4
 LOOP_SLEEP = 0.01
 MAX_RETRIES = 0
 
-def handle_command(rfm9x, command):
-    FINAL_TOKEN = "END_OF_STREAM"
-    message = command.encode('utf-8')
+last_transfer = None  # Kept so a lost final ACK can be repeated
+pending_commands = []  # Lines typed during a windowed transfer, sent once it ends
+
+def forward_frame(rfm9x, packet):
+    """Passes a received frame to the basestation unchanged, wrapped for the serial link."""
+    envelope = serial_envelope(bytes(packet), rfm9x.last_rssi)
+    if serial_out is not None:
+        serial_out.write(envelope)
+    else:
+        sys.stdout.buffer.write(envelope)
+        sys.stdout.flush()
+
+def handle_transfer(rfm9x, frame, packet_count):
+    """Runs a windowed transfer started by the rover. Returns the updated packet count."""
+    global last_transfer
 
-    print(f"[TX] Sending ({len(message)} bytes): {command}")
+    receiver = begin_transfer(frame)
+    if receiver is None:
+        return packet_count
+    if frame.flags & FLAG_POLL:
+        # The rover sent it unacknowledged after losing our link ACKs; it waits for an XFER_ACK
+        rfm9x.send(receiver.ack_packet())
+
+    counter = [packet_count]
+
+    def deliver(seq, packet):
+        counter[0] += 1
+        forward_frame(rfm9x, packet)
+
+    start_time = time.time()
+    complete = run_transfer(rfm9x, receiver, deliver, stop_requested=stop_requested)
+    elapsed = time.time() - start_time
+    last_transfer = receiver
+    if complete:
+        print(f"[XFER] Transfer {frame.msg_id} complete: {receiver.total} packets, "
+              f"{receiver.duplicates} duplicates, {receiver.recovered} left to FEC, {elapsed:.2f}s")
+    elif receiver.aborted:
+        print(f"[XFER] Transfer {frame.msg_id} stopped at {receiver.next_seq}/{receiver.total} packets, {elapsed:.2f}s")
+    elif receiver.abandoned:
+        print(f"[XFER] Transfer {frame.msg_id} given up by the rover at {receiver.next_seq}/{receiver.total} packets")
+    else:
+        print(f"[XFER] Transfer {frame.msg_id} timed out at {receiver.next_seq}/{receiver.total} packets")
+    return counter[0]
+
+def read_serial_command():
+    """Returns a line typed while waiting for responses, or None if nothing is pending."""
+    if supervisor is None or not supervisor.runtime.serial_bytes_available:
+        return None
+    line = input().strip()
+    return line or None
+
+def stop_requested():
+    """
+    Checked during a windowed transfer. A typed line is kept for after the
+    transfer; STOP or CANCEL also ends the transfer early.
+    """
+    command = read_serial_command()
+    if command is None:
+        return False
+    pending_commands.append(command)
+    return command.split()[0].upper() in ("STOP", "CANCEL")
+
+def send_batch(rfm9x, batch):
+    if len(batch) == 1:
+        message = batch[0].encode('utf-8')
+        print(f"[TX] Sending ({len(message)} bytes): {batch[0]}")
+    else:
+        message = encode_frame(TYPE_BATCH, pack_batch(batch))
+        print(f"[TX] Sending batch of {len(batch)} ({len(message)} bytes): {'; '.join(batch)}")
     rfm9x.send_with_ack(message)
 
+def handle_command(rfm9x, command):
+    """
+    Sends a command line to the rover and forwards its responses. Commands
+    separated by ';' go out packed into as few TYPE_BATCH frames as possible.
+    """
+    commands = split_batch(command)
+    if len(commands) <= 1:
+        send_batch(rfm9x, [command])
+        receive_responses(rfm9x)
+        return
+
+    for batch in group_batches(commands):
+        send_batch(rfm9x, batch)
+        receive_responses(rfm9x)
+
+def receive_responses(rfm9x):
+    """
+    Forwards responses until every command sent so far has ended. The rover
+    runs commands concurrently, so a command typed meanwhile (STOP, STATUS)
+    is sent right away and its responses interleave with the running one's.
+    """
+    FINAL_TOKEN = "END_OF_STREAM"  # Sent by rovers that predate binary frames
+    outstanding = 1  # Frames sent whose END hasn't arrived yet
+
 #    print(f"[RX] Waiting for response... (waiting for final packet signal '{FINAL_TOKEN}')")
 
     start_time = time.time()
@@ -24,18 +126,65 @@ def handle_command(rfm9x, command):
     packet_count = 0
 
     while True:
+        command = pending_commands.pop(0) if pending_commands else read_serial_command()
+        if command:
+            for batch in group_batches(split_batch(command)):
+                send_batch(rfm9x, batch)
+                outstanding += 1
+
         packet = rfm9x.receive(timeout=INTER_PACKET_TIMEOUT, with_ack=True)
         current_time = time.time()
 
         if packet:
-            packet_count += 1
             last_packet_time = current_time  # Reset the timeout window on every packet
 
+            if is_frame(packet):
+                try:
+                    frame = decode_frame(packet)
+                except FrameError as e:
+                    print(f"[ERROR] Dropped corrupt frame: {e}")
+                    continue
+
+                if (frame.type == TYPE_XFER_BEGIN and frame.flags & FLAG_POLL and last_transfer is not None
+                        and last_transfer.xfer_id == frame.msg_id
+                        and (last_transfer.done or last_transfer.aborted)):
+                    # A polled start of the transfer that just ended; the rover missed its ACKs.
+                    rfm9x.send(last_transfer.ack_packet())
+                    continue
+
+                if frame.type == TYPE_XFER_BEGIN:
+                    # The basestation needs the transfer layout to rebuild FEC blocks.
+                    forward_frame(rfm9x, packet)
+                    packet_count = handle_transfer(rfm9x, frame, packet_count)
+                    last_packet_time = time.time()
+                    continue
+
+                if (frame.type == TYPE_FILE and frame.flags & FLAG_POLL and last_transfer is not None
+                        and last_transfer.xfer_id == frame.msg_id
+                        and (last_transfer.done or last_transfer.aborted)):
+                    # The rover never saw our final (or abort) ACK and is polling again.
+                    rfm9x.send(last_transfer.ack_packet())
+                    continue
+
+                forward_frame(rfm9x, packet)
+                if frame.type == TYPE_END:
+                    outstanding -= 1
+                    if outstanding <= 0:
+                        break
+                    continue
+                packet_count += 1
+                continue
+
+            packet_count += 1
+
             try:
                 decoded = packet.decode('utf-8').strip()
                 if decoded == FINAL_TOKEN:
 #                     print("[RX] Final packet received. End of message stream.")
-                    break
+                    outstanding -= 1
+                    if outstanding <= 0:
+                        break
+                    continue
                 print(f"[RECEIVED #{packet_count}] [{len(packet)} bytes]: {decoded}")
             except UnicodeDecodeError:
                 print(f"[ERROR] Received invalid UTF-8 data (packet #{packet_count})")
@@ -49,6 +198,8 @@ def handle_command(rfm9x, command):
     print(f"[RX] Total packets received (excluding final token): {packet_count}")
 
 def main():
+    from lora_setup import get_lora_radio  # Imported here so the command logic loads without the board (lora_sim.py)
+
     print("Basestation online. Type commands to send to the rover. Type 'exit' to quit.")
     rfm9x = get_lora_radio()
     rfm9x.ack_delay = 0.01
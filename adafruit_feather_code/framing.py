@@ -0,0 +1,169 @@
+import struct
+from collections import namedtuple
+
+try:
+    from binascii import crc_hqx
+except ImportError:  # CircuitPython's binascii has no crc_hqx
+    crc_hqx = None
+
+'''
+Binary framing shared by the rover, the Feather and the basestation.
+Keep the copies in rover_code/, adafruit_feather_code/ and basestation_code/ identical
+(checks/check_framing.py); payload layouts only the rover and basestation
+read are in payloads.py.
+
+Every LoRa packet is a frame:
+
+    byte 0     0xA0 | version   (0xA0-0xAF are never valid UTF-8 lead bytes)
+    byte 1     frame type
+    byte 2     flags
+    byte 3     message id (one per command / transfer)
+    byte 4-5   seq          (big endian)
+    byte 6-7   total        (big endian)
+    byte 8-9   CRC-16/CCITT-FALSE over bytes 0-7 and the payload
+    byte 10-   payload (raw bytes, no text encoding)
+
+On the serial link the Feather wraps every frame as
+    SERIAL_SYNC, frame length, RSSI (signed byte), frame
+so the basestation can tell frames apart from the Feather's text lines.
+'''
+
+FRAME_MAGIC = 0xA0
+FRAME_VERSION = 1
+
+TYPE_TEXT = 0x01        # Text response chunk
+TYPE_FILE = 0x02        # Bulk data chunk (images, files)
+TYPE_END = 0x03         # End of a command's response stream
+TYPE_IMAGE_INFO = 0x04  # Image descriptor sent before an image transfer
+TYPE_XFER_BEGIN = 0x05  # Start of a windowed transfer, payload = XFER_INFO
+TYPE_XFER_ACK = 0x06    # Windowed transfer ACK, seq = next expected, payload = bitmap
+TYPE_BATCH = 0x07       # Several commands in one uplink frame, payload = pack_batch()
+TYPE_STATUS = 0x08      # End of one batched command, seq = index in batch, payload = status + command
+TYPE_STATS = 0x09       # Rover metrics (STATS), payload = payloads.STATS_HEADER + STATS_COMMAND per command
+
+FLAG_POLL = 0x01        # Receiver should ACK after this frame
+FLAG_COMPRESSED = 0x02  # Message payloads joined in seq order form one compression.py stream
+FLAG_ABORT = 0x04       # XFER_ACK: the receiver stopped the transfer (operator typed STOP); sender gives up
+
+HEADER = struct.Struct(">BBBBHH")
+CRC = struct.Struct(">H")
+HEADER_SIZE = HEADER.size + CRC.size
+MAX_PACKET_SIZE = 252   # RFM9x payload limit
+MAX_PAYLOAD_SIZE = MAX_PACKET_SIZE - HEADER_SIZE
+
+# window, FEC data chunks per block (0 = no FEC), FEC parity chunks per full block,
+# data chunk count, data length in bytes before padding
+XFER_INFO = struct.Struct(">BBBHI")
+
+CODEC_ZLIB = 0
+CODEC_TILES = 1         # zlib of TILE_HEADER, changed-tile bitmap and packed tiles (rover_code/delta_image.py)
+CODEC_PROGRESSIVE = 2   # Adam7 passes packed one after another, zlib flushed per pass (rover_code/progressive.py)
+CODEC_DCT = 3           # Quality byte and zlib of quantized 8x8 DCT coefficients (rover_code/dct_codec.py)
+IMAGE_INFO = struct.Struct(">HHBB")  # width, height, bit depth, codec
+
+STATUS_OK = 0
+STATUS_ERROR = 1        # The command raised
+STATUS_UNKNOWN = 2      # No such command
+BATCH_SEPARATOR = ";"   # Separates commands typed or scripted as one batch
+
+SERIAL_SYNC = 0xFE      # Never appears in UTF-8 text
+SERIAL_HEADER = struct.Struct(">BBb")
+
+Frame = namedtuple("Frame", ["type", "flags", "msg_id", "seq", "total", "payload"])
+
+
+class FrameError(ValueError):
+    pass
+
+
+def _make_crc_table():
+    table = []
+    for byte in range(256):
+        crc = byte << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else (crc << 1)
+        table.append(crc & 0xFFFF)
+    return table
+
+
+_CRC_TABLE = None if crc_hqx else _make_crc_table()
+
+
+def crc16(data, crc=0xFFFF):
+    if crc_hqx:
+        return crc_hqx(data, crc)
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFF) ^ _CRC_TABLE[((crc >> 8) ^ byte) & 0xFF]
+    return crc
+
+
+def is_frame(packet):
+    return packet is not None and len(packet) >= HEADER_SIZE and (packet[0] & 0xF0) == FRAME_MAGIC
+
+
+def encode_frame(frame_type, payload=b"", msg_id=0, seq=0, total=1, flags=0):
+    header = HEADER.pack(FRAME_MAGIC | FRAME_VERSION, frame_type, flags, msg_id & 0xFF, seq, total)
+    return header + CRC.pack(crc16(payload, crc16(header))) + payload
+
+
+def decode_frame(packet):
+    """Parses and CRC-checks a frame. Raises FrameError on anything malformed."""
+    if not is_frame(packet):
+        raise FrameError("Not a frame")
+    magic, frame_type, flags, msg_id, seq, total = HEADER.unpack_from(packet)
+    if magic & 0x0F != FRAME_VERSION:
+        raise FrameError(f"Unsupported frame version {magic & 0x0F}")
+    (expected,) = CRC.unpack_from(packet, HEADER.size)
+    payload = bytes(packet[HEADER_SIZE:])
+    if crc16(payload, crc16(packet[:HEADER.size])) != expected:
+        raise FrameError("CRC mismatch")
+    return Frame(frame_type, flags, msg_id, seq, total, payload)
+
+
+def fec_layout(data_chunks, block_size, parity):
+    """
+    Splits a transfer into Reed-Solomon blocks. Returns (first seq, data chunks,
+    parity chunks) per block; each block is sent as its data chunks followed by
+    its parity chunks. The last block gets parity in proportion to its size.
+    """
+    blocks = []
+    seq = 0
+    for start in range(0, data_chunks, block_size):
+        k = min(block_size, data_chunks - start)
+        m = max(1, (k * parity + block_size - 1) // block_size)
+        blocks.append((seq, k, m))
+        seq += k + m
+    return blocks
+
+
+def split_batch(text):
+    """Splits "MOVE FORWARD 1 5; STATUS" into its commands."""
+    return [command.strip() for command in text.split(BATCH_SEPARATOR) if command.strip()]
+
+
+def pack_batch(commands):
+    return "\n".join(commands).encode('utf-8')
+
+
+def unpack_batch(payload):
+    return [command.strip() for command in bytes(payload).decode('utf-8').split("\n") if command.strip()]
+
+
+def group_batches(commands, limit=MAX_PAYLOAD_SIZE):
+    """Groups consecutive commands into as few batch payloads of at most limit bytes as possible."""
+    groups = []
+    size = 0
+    for command in commands:
+        length = len(command.encode('utf-8'))
+        if groups and size + 1 + length <= limit:
+            groups[-1].append(command)
+            size += 1 + length
+        else:
+            groups.append([command])
+            size = length
+    return groups
+
+
+def serial_envelope(frame, rssi=0):
+    rssi = max(-128, min(127, int(rssi)))
+    return SERIAL_HEADER.pack(SERIAL_SYNC, len(frame), rssi) + frame
@@ -0,0 +1,151 @@
+import struct
+import time
+from framing import (encode_frame, decode_frame, is_frame, FrameError, fec_layout, XFER_INFO,
+                     TYPE_FILE, TYPE_XFER_BEGIN, TYPE_XFER_ACK, FLAG_POLL, FLAG_ABORT)
+
+'''
+Receiver side of the rover's windowed selective-repeat transfers
+(see rover_code/windowed_transfer.py for the sender).
+
+Data frames are buffered until they can be delivered in order, and an ACK with
+the next expected sequence number plus a bitmap of the out-of-order frames is
+sent back whenever the rover polls at the end of a burst.
+
+For FEC transfers a block counts as fully received once any k of its k+m
+frames arrived; the basestation rebuilds the missing ones from parity.
+
+The operator can stop a transfer early (e.g. once a progressive image looks
+good enough): the next ACK then carries FLAG_ABORT and the rover gives up.
+
+A repeated XFER_BEGIN means the rover missed the link ACK for the first one;
+it is answered with an XFER_ACK. Any other frame means the rover has given
+up on the transfer: run_transfer returns and leaves it unACKed, so the
+rover's retry reaches the normal receive loop.
+'''
+
+ACK_BITMAP = struct.Struct(">I")
+MAX_WINDOW = 32
+
+TRANSFER_TIMEOUT = 15.0  # Give up if the rover goes quiet for this long mid-transfer
+ACK_TURNAROUND = 0.05    # Let the rover switch back to receive before ACKing
+
+
+class WindowedReceiver:
+    def __init__(self, xfer_id, total, window, blocks=None):
+        self.xfer_id = xfer_id
+        self.total = total
+        self.window = max(1, min(MAX_WINDOW, window))
+        self.next_seq = 0
+        self.pending = {}
+        self.received = 0
+        self.duplicates = 0
+        self.blocks = blocks or []  # FEC blocks as (first seq, data chunks, parity chunks)
+        self.block_counts = [0] * len(self.blocks)
+        self.recovered = 0
+        self.aborted = False
+        self.abandoned = False  # The rover moved on to other frames
+
+    @property
+    def done(self):
+        return self.next_seq >= self.total
+
+    def on_data(self, seq, packet, deliver):
+        """
+        Stores a data frame and delivers everything that is now in order.
+        deliver(seq, packet) is called once per sequence number, in order.
+        """
+        if seq < self.next_seq or seq in self.pending or seq - self.next_seq > MAX_WINDOW:
+            self.duplicates += 1
+            return
+        self.received += 1
+        self.pending[seq] = packet
+        if self.blocks:
+            self._count_block(seq)
+        while self.next_seq in self.pending:
+            packet = self.pending.pop(self.next_seq)
+            if packet is not None:
+                deliver(self.next_seq, packet)
+            self.next_seq += 1
+
+    def _count_block(self, seq):
+        for index, (first, k, m) in enumerate(self.blocks):
+            if first <= seq < first + k + m:
+                self.block_counts[index] += 1
+                if self.block_counts[index] == k:
+                    # Enough to decode: mark the rest of the block as received.
+                    for other in range(max(first, self.next_seq), first + k + m):
+                        if other not in self.pending:
+                            self.pending[other] = None
+                            self.recovered += 1
+                return
+
+    def ack_packet(self):
+        bitmap = 0
+        for seq in self.pending:
+            bit = seq - self.next_seq - 1
+            if 0 <= bit < MAX_WINDOW:
+                bitmap |= 1 << bit
+        return encode_frame(TYPE_XFER_ACK, ACK_BITMAP.pack(bitmap), msg_id=self.xfer_id,
+                            seq=self.next_seq, total=self.total, flags=FLAG_ABORT if self.aborted else 0)
+
+    def handle_frame(self, frame, packet, deliver):
+        """Processes one decoded frame. Returns an ACK packet to send, or None."""
+        if frame.type == TYPE_XFER_BEGIN and frame.msg_id == self.xfer_id:
+            return self.ack_packet()  # Our link ACK for it got lost
+        if frame.type != TYPE_FILE:
+            self.abandoned = True
+            return None
+        if frame.msg_id != self.xfer_id:
+            return None
+        self.on_data(frame.seq, bytes(packet), deliver)
+        return self.ack_packet() if frame.flags & FLAG_POLL else None
+
+
+def begin_transfer(frame):
+    """Creates a WindowedReceiver from a TYPE_XFER_BEGIN frame, or returns None."""
+    if frame.type != TYPE_XFER_BEGIN:
+        return None
+    if len(frame.payload) < XFER_INFO.size:
+        window = frame.payload[0] if frame.payload else 1
+        return WindowedReceiver(frame.msg_id, frame.total, window)
+    window, fec_block, fec_parity, data_chunks, _ = XFER_INFO.unpack_from(frame.payload)
+    blocks = fec_layout(data_chunks, fec_block, fec_parity) if fec_block else None
+    return WindowedReceiver(frame.msg_id, frame.total, window, blocks)
+
+
+def run_transfer(rfm9x, receiver, deliver, timeout=TRANSFER_TIMEOUT, stop_requested=None):
+    """
+    Receives a whole transfer. Returns True if every frame arrived.
+    stop_requested() is checked between packets; once it returns True the
+    transfer is aborted at the rover's next poll.
+    """
+    last_packet_time = time.monotonic()
+    while not receiver.done:
+        if not receiver.aborted and stop_requested is not None and stop_requested():
+            receiver.aborted = True
+        # Link-level ACKs are off here; the rover only waits for our bitmap ACKs.
+        packet = rfm9x.receive(timeout=0.5, with_ack=False)
+        if packet is None:
+            if time.monotonic() - last_packet_time > timeout:
+                return False
+            continue
+        last_packet_time = time.monotonic()
+        if not is_frame(packet):
+            continue
+        try:
+            frame = decode_frame(packet)
+        except FrameError as e:
+            print(f"[XFER] Dropped corrupt frame: {e}")
+            continue
+        ack = receiver.handle_frame(frame, packet, deliver)
+        if receiver.abandoned:
+            return False
+        if ack is not None:
+            time.sleep(ACK_TURNAROUND)
+            rfm9x.send(ack)
+            if receiver.aborted:
+                return False
+    # The final ACK tells the rover it can stop.
+    time.sleep(ACK_TURNAROUND)
+    rfm9x.send(receiver.ack_packet())
+    return True
@@ -1 +1,2 @@
-LOG_FILE = "config.log"
\ No newline at end of file
+LOG_FILE = "config.log"
+SESSION_DB = "sessions.db"   # Commands and received packets, see session_store.py
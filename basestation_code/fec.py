@@ -0,0 +1,75 @@
+try:
+    from reedsolo import RSCodec
+except ImportError:
+    RSCodec = None
+    print("Warning: reedsolo is not installed. FEC transfers cannot be decoded.")
+
+from framing import fec_layout
+
+'''
+Rebuilds FEC-encoded transfers from any sufficient subset of chunks.
+See rover_code/fec.py for the encoder and block layout.
+'''
+
+
+class FecError(ValueError):
+    pass
+
+
+def fec_complete(chunks, blocks):
+    """True once every block has at least k of its chunks."""
+    for first, k, m in blocks:
+        if sum(1 for seq in range(first, first + k + m) if seq in chunks) < k:
+            return False
+    return True
+
+
+def missing_for_decode(chunks, blocks):
+    """Number of extra chunks still needed per incomplete block, as {first seq: count}."""
+    missing = {}
+    for first, k, m in blocks:
+        have = sum(1 for seq in range(first, first + k + m) if seq in chunks)
+        if have < k:
+            missing[first] = k - have
+    return missing
+
+
+def fec_decode(chunks, data_chunks, block_size, parity, data_length):
+    """
+    chunks maps seq -> payload for every chunk that arrived.
+    Returns the original data, trimmed to data_length.
+    """
+    blocks = fec_layout(data_chunks, block_size, parity)
+    data = bytearray()
+    codecs = {}
+
+    for first, k, m in blocks:
+        present = [seq for seq in range(first, first + k + m) if seq in chunks]
+        if len(present) < k:
+            raise FecError(f"Block at seq {first} has {len(present)} of {k} required chunks")
+
+        if all(seq in chunks for seq in range(first, first + k)):
+            for seq in range(first, first + k):
+                data.extend(chunks[seq])
+            continue
+
+        if RSCodec is None:
+            raise FecError("reedsolo is not installed")
+        codec = codecs.get(m) or codecs.setdefault(m, RSCodec(m))
+        chunk_size = len(chunks[present[0]])
+        erasures = [seq - first for seq in range(first, first + k + m) if seq not in chunks]
+        rows = [chunks.get(seq) for seq in range(first, first + k + m)]
+        block = [bytearray(chunk_size) for _ in range(k)]
+        codeword = bytearray(k + m)
+
+        for column in range(chunk_size):
+            for position, row in enumerate(rows):
+                codeword[position] = row[column] if row is not None else 0
+            decoded = codec.decode(codeword, erase_pos=erasures, only_erasures=True)[0]
+            for position in range(k):
+                block[position][column] = decoded[position]
+
+        for row in block:
+            data.extend(row)
+
+    return bytes(data[:data_length])
@@ -0,0 +1,292 @@
+import argparse
+import base64
+import binascii
+import math
+import os
+import re
+import sys
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+import png
+from payloads import DCT_HEADER, DCT_BLOCK, DCT_QUANT, DCT_ZIGZAG
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+    print("Warning: numpy is not installed. Images are decoded pixel by pixel (slow).")
+
+'''
+Decoding of the rover's packed greyscale images (images.convert_image on the
+rover): find the zlib stream, inflate it, unpack the bit_depth-bit pixels and
+write an 8-bit greyscale PNG.
+
+The stream may arrive as raw bytes (binary frames), as hex (older rovers and
+log excerpts) or as base64 (terminal.txt); decode_image() works out which.
+reconstructor.py and serial_utils/file_transfer.py both decode through here,
+and the serial reader feeds transfers into a StreamDecoder chunk by chunk.
+Lossy CODEC_DCT images (rover_code/dct_codec.py) are decoded by decode_dct().
+Archived transfers can be decoded in bulk across processes:
+
+    python image_decoder.py transfers/*.txt --bit-depth 4 --size 64x64 --workers 4
+'''
+
+HEX_TEXT = re.compile(rb"[0-9a-fA-F]+")
+BASE64_TEXT = re.compile(rb"[A-Za-z0-9+/]+={0,2}")
+
+
+def _looks_like_zlib(data):
+    return len(data) >= 2 and data[0] & 0x0F == 8 and ((data[0] << 8) | data[1]) % 31 == 0
+
+
+def inflate(data):
+    """
+    Returns the decompressed pixel data in data: a zlib stream as raw bytes,
+    hex or base64 (str or bytes, whitespace ignored).
+    """
+    if isinstance(data, str):
+        data = data.encode("ascii", errors="replace")
+    data = bytes(data)
+    candidates = []
+    if _looks_like_zlib(data):
+        candidates.append(data)
+    text = b"".join(data.split())
+    if HEX_TEXT.fullmatch(text) and len(text) % 2 == 0:
+        candidates.append(bytes.fromhex(text.decode("ascii")))
+    if BASE64_TEXT.fullmatch(text) and len(text) % 4 == 0:
+        candidates.append(base64.b64decode(text))
+    if not candidates:
+        raise ValueError("Image data is neither a zlib stream, hex nor base64")
+
+    # Hex text is also valid base64, so the first stream that inflates wins
+    error = None
+    for candidate in candidates:
+        try:
+            return zlib.decompress(candidate)
+        except zlib.error as e:
+            error = e
+    raise ValueError(f"Image data does not decompress: {error}")
+
+
+def unpack_range(raw, bit_depth, start, count):
+    """
+    count bit_depth-bit values from value index start on, scaled to 0-255
+    (a uint8 array with numpy, a list without). raw must hold them all.
+    """
+    max_val = (1 << bit_depth) - 1
+    scale = 255 // max_val
+    first_bit = start * bit_depth
+    skip = first_bit % 8
+
+    if np is not None:
+        end = (first_bit + count * bit_depth + 7) // 8
+        bits = np.unpackbits(np.frombuffer(bytes(raw[first_bit // 8:end]), dtype=np.uint8))
+        bits = bits[skip:skip + count * bit_depth]
+        weights = (1 << np.arange(bit_depth - 1, -1, -1)).astype(np.uint8)
+        values = bits.reshape(count, bit_depth) @ weights
+        return (values * scale).astype(np.uint8)
+
+    pixels = []
+    buffer = 0
+    bits_in_buffer = 0
+
+    for byte in raw[first_bit // 8:]:
+        buffer = (buffer << 8) | (byte & (0xFF >> skip))
+        bits_in_buffer += 8 - skip
+        skip = 0
+
+        while bits_in_buffer >= bit_depth and len(pixels) < count:
+            bits_in_buffer -= bit_depth
+            val = (buffer >> bits_in_buffer) & max_val
+            pixels.append(val * scale)
+
+        buffer &= (1 << bits_in_buffer) - 1
+        if len(pixels) == count:
+            break
+
+    return pixels
+
+
+def unpack_pixels(raw, bit_depth, width, height):
+    """
+    0-255 greyscale pixels, row-major: a (height, width) uint8 array with
+    numpy, a flat list without.
+    """
+    total_pixels = width * height
+    if len(raw) * 8 // bit_depth < total_pixels:
+        raise ValueError(f"Not enough pixel data: expected {total_pixels}, got {len(raw) * 8 // bit_depth}")
+    pixels = unpack_range(raw, bit_depth, 0, total_pixels)
+    return pixels.reshape(height, width) if np is not None else pixels
+
+
+class StreamDecoder:
+    """
+    Decodes a CODEC_ZLIB image while its chunks arrive in order: each chunk
+    goes through one decompressobj and every row that is complete afterwards
+    is unpacked right away, so the work done tracks the data received.
+    """
+
+    def __init__(self, width, height, bit_depth):
+        self.width = width
+        self.height = height
+        self.bit_depth = bit_depth
+        self.decompressor = zlib.decompressobj()
+        self.raw = bytearray()
+        self.rows_done = 0
+        self.pixels = np.zeros((height, width), dtype=np.uint8) if np is not None else [0] * (width * height)
+
+    def feed(self, data):
+        """Adds the next bytes of the zlib stream. Returns the number of complete rows."""
+        if not self.decompressor.eof:
+            self.raw += self.decompressor.decompress(data)
+        ready = min(self.height, len(self.raw) * 8 // self.bit_depth // max(1, self.width))
+        if ready > self.rows_done:
+            start, end = self.rows_done * self.width, ready * self.width
+            values = unpack_range(self.raw, self.bit_depth, start, end - start)
+            if np is not None:
+                self.pixels[self.rows_done:ready] = values.reshape(-1, self.width)
+            else:
+                self.pixels[start:end] = values
+            self.rows_done = ready
+        return self.rows_done
+
+    @property
+    def coverage(self):
+        """Share of the pixels decoded so far."""
+        return self.rows_done / max(1, self.height)
+
+    @property
+    def status(self):
+        return f"row {self.rows_done}/{self.height}"
+
+    def render(self):
+        """0-255 greyscale pixels; rows not received yet are black."""
+        return self.pixels
+
+
+def _dct_matrix():
+    n = DCT_BLOCK
+    matrix = np.array([[math.cos((2 * x + 1) * u * math.pi / (2 * n)) for x in range(n)] for u in range(n)])
+    matrix[0] /= math.sqrt(2)
+    return matrix * math.sqrt(2 / n)
+
+
+def decode_dct(data, width, height):
+    """
+    Pixels of a CODEC_DCT image (payload format in rover_code/dct_codec.py)
+    as a (height, width) uint8 array, and the quality it was sent at.
+    """
+    if np is None:
+        raise ValueError("DCT images need numpy")
+    (quality,) = DCT_HEADER.unpack_from(data)
+    body = zlib.decompress(data[DCT_HEADER.size:])
+    rows, cols = -(-height // DCT_BLOCK), -(-width // DCT_BLOCK)
+    count = rows * cols * DCT_BLOCK * DCT_BLOCK
+    if len(body) != 2 * count:
+        raise ValueError(f"DCT payload holds {len(body) // 2} coefficients, a {width}x{height} image has {count}")
+
+    # Unsigned 16-bit values, high bytes first, zigzag-mapped back to signed; then bands back into blocks
+    mapped = (np.frombuffer(body[:count], dtype=np.uint8).astype(np.int64) << 8) | np.frombuffer(body[count:], dtype=np.uint8)
+    levels = ((mapped >> 1) ^ -(mapped & 1)).reshape(DCT_BLOCK * DCT_BLOCK, -1).T.copy()
+    levels[:, 0] = np.cumsum(levels[:, 0])
+
+    scale = 5000 // quality if quality < 50 else 200 - 2 * quality
+    table = np.clip((np.array(DCT_QUANT, dtype=np.int64) * scale + 50) // 100, 1, 255)
+    zigzag = list(DCT_ZIGZAG)
+    coefficients = np.zeros(levels.shape, dtype=np.float64)
+    coefficients[:, zigzag] = levels * table[zigzag]
+    matrix = _dct_matrix()
+    blocks = matrix.T @ coefficients.reshape(rows, cols, DCT_BLOCK, DCT_BLOCK) @ matrix
+    image = blocks.swapaxes(1, 2).reshape(rows * DCT_BLOCK, cols * DCT_BLOCK)[:height, :width]
+    return np.clip(np.round(image + 128), 0, 255).astype(np.uint8), quality
+
+
+def write_png(pixels, width, height, output_path="reconstructed.png"):
+    """Saves 0-255 greyscale pixels (flat or rows, list or array) as an 8-bit PNG."""
+    writer = png.Writer(width, height, greyscale=True, bitdepth=8)
+    with open(output_path, "wb") as f:
+        if np is not None:
+            # Each uint8 row already is the PNG's packed scanline
+            writer.write_packed(f, np.asarray(pixels, dtype=np.uint8).reshape(height, width))
+        else:
+            writer.write(f, [pixels[i * width:(i + 1) * width] for i in range(height)])
+
+
+def decode_image(data, bit_depth=4, size=(128, 128)):
+    """Pixels of an image transferred as raw, hex or base64 zlib data (see unpack_pixels)."""
+    width, height = size
+    return unpack_pixels(inflate(data), bit_depth, width, height)
+
+
+def guess_size(raw_length, bit_depth):
+    """(side, side) if raw_length bytes hold a square image at bit_depth, else None."""
+    side = math.isqrt(raw_length * 8 // bit_depth)
+    for candidate in (side, side - 1):
+        if candidate > 0 and (candidate * candidate * bit_depth + 7) // 8 == raw_length:
+            return candidate, candidate
+    return None
+
+
+def decode_file(path, bit_depth=4, size=None, output_dir=None):
+    """
+    Decodes one archived transfer to a PNG next to it (or in output_dir).
+    With size None the image is assumed square. Returns the PNG's path.
+    """
+    with open(path, "rb") as f:
+        raw = inflate(f.read())
+    size = size or guess_size(len(raw), bit_depth)
+    if size is None:
+        raise ValueError(f"{len(raw)} bytes at {bit_depth}bpp is not a square image; give the size")
+    output = os.path.splitext(path)[0] + ".png"
+    if output_dir:
+        output = os.path.join(output_dir, os.path.basename(output))
+    write_png(unpack_pixels(raw, bit_depth, *size), size[0], size[1], output)
+    return output
+
+
+def _decode_job(job):
+    path, bit_depth, size, output_dir = job
+    try:
+        return path, decode_file(path, bit_depth, size, output_dir), None
+    except (OSError, ValueError, binascii.Error) as e:
+        return path, None, str(e)
+
+
+def decode_files(paths, bit_depth=4, size=None, output_dir=None, workers=None):
+    """
+    Decodes many archived transfers in a process pool. Returns
+    (path, PNG path or None, error or None) per input, in order.
+    """
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    jobs = [(path, bit_depth, size, output_dir) for path in paths]
+    if workers == 1 or len(jobs) < 2:
+        return [_decode_job(job) for job in jobs]
+    chunksize = max(1, len(jobs) // (4 * (workers or os.cpu_count() or 1)))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_decode_job, jobs, chunksize=chunksize))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Decode archived rover image transfers to PNG")
+    parser.add_argument("files", nargs="+", help="Files holding a zlib image stream (raw, hex or base64)")
+    parser.add_argument("--bit-depth", type=int, default=4, choices=range(1, 8))
+    parser.add_argument("--size", help="WIDTHxHEIGHT (default: assume a square image)")
+    parser.add_argument("--output-dir", help="Write the PNGs here instead of next to the inputs")
+    parser.add_argument("--workers", type=int, default=None, help="Decoding processes (default: one per CPU)")
+    options = parser.parse_args()
+
+    size = tuple(int(value) for value in options.size.lower().split("x")) if options.size else None
+    failed = 0
+    for path, output, error in decode_files(options.files, options.bit_depth, size, options.output_dir,
+                                            options.workers):
+        if error:
+            failed += 1
+            print(f"[ERROR] {path}: {error}")
+        else:
+            print(f"[IMAGE] {path} -> {output}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,175 @@
+import atexit
+import os
+import queue
+import threading
+import time
 from datetime import datetime
 from config import LOG_FILE
 
+'''
+The basestation log (config.log).
+
+log_to_file() only timestamps the line and queues it. A writer thread keeps
+the file open and appends the queued lines in groups: a group is written
+once FLUSH_LINES lines are waiting or FLUSH_INTERVAL seconds after its first
+line, whichever comes first. The file is fsynced at most every
+FSYNC_INTERVAL seconds (0 = after every group, None = leave it to the OS),
+and rotated to config.log.1, .2, ... once it exceeds MAX_BYTES or is older
+than ROTATE_INTERVAL seconds.
+
+log_fatal() writes synchronously, after everything already queued, and
+fsyncs before returning, for errors the process may not survive.
+flush_log() waits until every queued line is written, e.g. before the log
+is read back; it also runs at exit.
+'''
+
+FLUSH_LINES = 512           # Lines that make a group worth writing at once
+FLUSH_INTERVAL = 0.2        # Seconds a line may wait for its group
+FSYNC_INTERVAL = 1.0        # Seconds between fsyncs (0 = every group, None = never)
+MAX_BYTES = 5 * 1024 * 1024
+ROTATE_INTERVAL = None      # Seconds before the log is rotated regardless of size (None = size only)
+BACKUPS = 5                 # Rotated logs kept
+
+
+def timestamp():
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+
+
+class AsyncLog:
+    def __init__(self, path, flush_lines=FLUSH_LINES, flush_interval=FLUSH_INTERVAL, fsync_interval=FSYNC_INTERVAL,
+                 max_bytes=MAX_BYTES, rotate_interval=ROTATE_INTERVAL, backups=BACKUPS):
+        self.path = path
+        self.flush_lines = flush_lines
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+        self.max_bytes = max_bytes
+        self.rotate_interval = rotate_interval
+        self.backups = backups
+        self.queue = queue.SimpleQueue()    # Lines, or an Event to set once everything before it is written
+        self.lock = threading.Lock()        # Guards pending and the file
+        self.pending = []                   # Lines taken off the queue for the next group
+        self.file = None
+        self.opened = 0.0
+        self.last_fsync = 0.0
+        self.thread = threading.Thread(target=self._write_loop, name="logger", daemon=True)
+        self.thread.start()
+
+    def write(self, message):
+        self.queue.put(f"{timestamp()}    {message}\n")
+
+    def flush(self, timeout=5.0):
+        """Waits until every line queued so far is in the file. Returns False on timeout."""
+        done = threading.Event()
+        self.queue.put(done)
+        return done.wait(timeout)
+
+    def write_now(self, message):
+        """Writes message and everything queued before it, and fsyncs, before returning."""
+        line = f"{timestamp()}    {message}\n"
+        with self.lock:
+            lines, self.pending = self.pending, []
+            lines, events = self._drain(lines)
+            lines.append(line)
+            try:
+                self._commit(lines, fsync=True)
+            except OSError as e:
+                print(f"[ERROR] Could not write {self.path}: {e}")
+        for event in events:
+            event.set()
+
+    def _drain(self, lines):
+        events = []
+        while True:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                return lines, events
+            if isinstance(item, threading.Event):
+                events.append(item)
+            else:
+                lines.append(item)
+
+    def _write_loop(self):
+        while True:
+            item = self.queue.get()
+            events = []
+            deadline = time.monotonic() + self.flush_interval
+            # Group commit: keep collecting until the group is full, its time is up or someone waits for it
+            while True:
+                if isinstance(item, threading.Event):
+                    events.append(item)
+                    break
+                with self.lock:
+                    self.pending.append(item)
+                    full = len(self.pending) >= self.flush_lines
+                if full:
+                    break
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            try:
+                with self.lock:
+                    lines, self.pending = self.pending, []
+                    self._commit(lines)
+            except OSError as e:
+                print(f"[ERROR] Could not write {self.path}: {e}")
+            for event in events:
+                event.set()
+
+    def _commit(self, lines, fsync=False):
+        if not lines:
+            return
+        if self.file is None:
+            self._open()
+        self.file.write("".join(lines))
+        self.file.flush()
+        now = time.monotonic()
+        if fsync or (self.fsync_interval is not None and now - self.last_fsync >= self.fsync_interval):
+            os.fsync(self.file.fileno())
+            self.last_fsync = now
+        if self.file.tell() >= self.max_bytes or (self.rotate_interval and now - self.opened >= self.rotate_interval):
+            self._rotate()
+
+    def _open(self):
+        self.file = open(self.path, "a", encoding="utf-8")
+        self.opened = time.monotonic()
+
+    def _rotate(self):
+        self.file.close()
+        self.file = None
+        for number in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{number}"):
+                os.replace(f"{self.path}.{number}", f"{self.path}.{number + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+
+_log = None
+_log_lock = threading.Lock()
+
+
+def get_log():
+    """The log writer for LOG_FILE, started on first use."""
+    global _log
+    if _log is None:
+        with _log_lock:
+            if _log is None:
+                _log = AsyncLog(LOG_FILE)
+                atexit.register(_log.flush)
+    return _log
+
+
 def log_to_file(message):
-    with open(LOG_FILE, "a", encoding="utf-8") as f:
-        f.write(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]}    {message}\n")
+    get_log().write(message)
+
+
+def log_fatal(message):
+    get_log().write_now(message)
+
+
+def flush_log():
+    get_log().flush()
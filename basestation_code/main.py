@@ -1,8 +1,14 @@
+import argparse
 from serial_utils.serial_interface import SerialInterface
 
 def main():
+    parser = argparse.ArgumentParser(description="Basestation serial interface to the Feather")
+    parser.add_argument("--port", default=None, help="Serial port of the Feather (default: detect it), "
+                                                     "or the pty printed by rover_code/fake_feather.py")
+    options = parser.parse_args()
+
     print("Basestation online. Starting serial interface...")
-    serial_interface = SerialInterface()
+    serial_interface = SerialInterface(port=options.port)
     serial_interface.connect()
     serial_interface.start_reader()
     serial_interface.interactive_mode()
@@ -0,0 +1,40 @@
+import struct
+
+'''
+Payload layouts of the image codecs and the STATS snapshot, shared by the
+rover and the basestation. The Feather forwards these frames without
+looking inside, so they are kept out of framing.py. Keep the copies in
+rover_code/ and basestation_code/ identical.
+'''
+
+# kind (TILE_KEYFRAME / TILE_DELTA), tile size, frame id, base frame id, changed tile count
+TILE_HEADER = struct.Struct(">BBBBH")
+TILE_KEYFRAME = 0
+TILE_DELTA = 1
+
+# Adam7 interlacing: (x offset, y offset, x step, y step) of each pass, and the
+# block each pass's pixels cover in a preview before the later passes arrive
+ADAM7_PASSES = ((0, 0, 8, 8), (4, 0, 8, 8), (0, 4, 4, 8), (2, 0, 4, 4), (0, 2, 2, 4), (1, 0, 2, 2), (0, 1, 1, 2))
+ADAM7_BLOCKS = ((8, 8), (4, 8), (4, 4), (2, 4), (2, 2), (1, 2), (1, 1))
+
+# CODEC_DCT: block side, JPEG luminance quantization table (row-major, scaled
+# by quality), and the row-major index of each coefficient in zigzag order
+DCT_HEADER = struct.Struct(">B")  # quality 1-100
+DCT_BLOCK = 8
+DCT_QUANT = (16, 11, 10, 16, 24, 40, 51, 61,
+             12, 12, 14, 19, 26, 58, 60, 55,
+             14, 13, 16, 24, 40, 57, 69, 56,
+             14, 17, 22, 29, 51, 87, 80, 62,
+             18, 22, 37, 56, 68, 109, 103, 77,
+             24, 35, 55, 64, 81, 104, 113, 92,
+             49, 64, 78, 87, 103, 121, 120, 101,
+             72, 92, 95, 98, 112, 100, 103, 99)
+DCT_ZIGZAG = (0, 1, 8, 16, 9, 2, 3, 10, 17, 24, 32, 25, 18, 11, 4, 5,
+              12, 19, 26, 33, 40, 48, 41, 34, 27, 20, 13, 6, 7, 14, 21, 28,
+              35, 42, 49, 56, 57, 50, 43, 36, 29, 22, 15, 23, 30, 37, 44, 51,
+              58, 59, 52, 45, 38, 31, 39, 46, 53, 60, 61, 54, 47, 55, 62, 63)
+
+# STATS snapshot: uptime (s), CPU (0.1 %), RSS (KiB), threads, jobs, radio queue, number of command entries
+STATS_HEADER = struct.Struct(">IHIBBHB")
+# Per command: name, runs, errors, packets sent, bytes sent, ACK retries, handler p50/p90/max (ms)
+STATS_COMMAND = struct.Struct(">8sHHIIHIII")
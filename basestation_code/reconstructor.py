@@ -1,6 +1,8 @@
 import zlib
 import re
-import png
+from payloads import TILE_HEADER, TILE_KEYFRAME, ADAM7_PASSES, ADAM7_BLOCKS
+import image_decoder
+from image_decoder import decode_image, write_png
 
 import base64  # make sure this is imported at the top
 
@@ -15,29 +17,118 @@ def from_hex_str(hex_str):
 
 
 def unpack_pixels(data, bit_depth, width, height):
-    total_pixels = width * height
-    max_val = (1 << bit_depth) - 1
-    scale = 255 // max_val
+    """0-255 greyscale pixels as a flat list (see image_decoder.unpack_pixels)."""
+    pixels = image_decoder.unpack_pixels(data, bit_depth, width, height)
+    return pixels.ravel().tolist() if hasattr(pixels, "ravel") else pixels
 
-    pixels = []
-    buffer = 0
-    bits_in_buffer = 0
 
-    for byte in data:
-        buffer = (buffer << 8) | byte
-        bits_in_buffer += 8
+def tile_boxes(width, height, tile):
+    """(x, y, w, h) of every tile, row-major; edge tiles are clipped to the image."""
+    return [(x, y, min(tile, width - x), min(tile, height - y))
+            for y in range(0, height, tile) for x in range(0, width, tile)]
 
-        while bits_in_buffer >= bit_depth and len(pixels) < total_pixels:
-            bits_in_buffer -= bit_depth
-            val = (buffer >> bits_in_buffer) & max_val
-            pixels.append(val * scale)
 
-        buffer &= (1 << bits_in_buffer) - 1
+class TileDecoder:
+    """
+    Keeps the last CODEC_TILES image and patches it with the changed tiles of
+    each delta update (payload format in rover_code/delta_image.py).
+    """
 
-    if len(pixels) < total_pixels:
-        raise ValueError(f"Not enough pixel data: expected {total_pixels}, got {len(pixels)}")
+    def __init__(self):
+        self.pixels = None      # 0-255 greyscale, row-major
+        self.shape = None       # (width, height, bit depth)
+        self.frame_id = None
+
+    def apply(self, data, width, height, bit_depth):
+        """Decodes one update; returns (pixels, is keyframe, tiles received)."""
+        body = zlib.decompress(data)
+        kind, tile, frame_id, base_id, changed = TILE_HEADER.unpack_from(body)
+        offset = TILE_HEADER.size
+        boxes = tile_boxes(width, height, tile)
+
+        if kind == TILE_KEYFRAME:
+            indices = list(range(len(boxes)))
+            pixels = [0] * (width * height)
+        else:
+            if self.pixels is None or self.frame_id != base_id or self.shape != (width, height, bit_depth):
+                raise ValueError(f"Delta frame {frame_id} is based on frame {base_id}, but frame {self.frame_id} "
+                                 f"is stored; send CAMERA KEY for a full frame")
+            bitmap = body[offset:offset + (len(boxes) + 7) // 8]
+            offset += len(bitmap)
+            indices = [i for i in range(len(boxes)) if bitmap[i // 8] & (0x80 >> (i % 8))]
+            pixels = list(self.pixels)
+        if len(indices) != changed:
+            raise ValueError(f"Tile bitmap lists {len(indices)} tiles, header says {changed}")
+
+        count = sum(boxes[i][2] * boxes[i][3] for i in indices)
+        values = unpack_pixels(body[offset:], bit_depth, count, 1) if count else []
+        position = 0
+        for index in indices:
+            x, y, w, h = boxes[index]
+            for row in range(y, y + h):
+                pixels[row * width + x:row * width + x + w] = values[position:position + w]
+                position += w
+
+        self.pixels = pixels
+        self.shape = (width, height, bit_depth)
+        self.frame_id = frame_id
+        return pixels, kind == TILE_KEYFRAME, len(indices)
+
+
+class ProgressiveDecoder:
+    """
+    Inflates a CODEC_PROGRESSIVE image as its chunks arrive in order and
+    renders whatever passes are complete (format in rover_code/progressive.py).
+    Each known pixel fills its Adam7 block, so the preview starts out coarse and
+    sharpens with every pass.
+    """
 
-    return pixels
+    def __init__(self, width, height, bit_depth):
+        self.width = width
+        self.height = height
+        self.bit_depth = bit_depth
+        self.decompressor = zlib.decompressobj()
+        self.raw = bytearray()
+        self.passes = [[(x, y) for y in range(y0, height, dy) for x in range(x0, width, dx)]
+                       for x0, y0, dx, dy in ADAM7_PASSES]
+        self.pass_bytes = [(len(coords) * bit_depth + 7) // 8 for coords in self.passes]
+        self.passes_done = 0
+
+    def feed(self, data):
+        """Adds the next bytes of the zlib stream. Returns the number of complete passes."""
+        if not self.decompressor.eof:
+            self.raw += self.decompressor.decompress(data)
+        end = sum(self.pass_bytes[:self.passes_done])
+        while self.passes_done < len(self.passes) and end + self.pass_bytes[self.passes_done] <= len(self.raw):
+            end += self.pass_bytes[self.passes_done]
+            self.passes_done += 1
+        return self.passes_done
+
+    @property
+    def coverage(self):
+        """Share of the pixels received so far in complete passes."""
+        return sum(len(coords) for coords in self.passes[:self.passes_done]) / max(1, self.width * self.height)
+
+    @property
+    def status(self):
+        return f"pass {self.passes_done}/{len(self.passes)}"
+
+    def render(self):
+        """0-255 greyscale pixels, row-major, from the complete passes."""
+        width, height = self.width, self.height
+        pixels = [0] * (width * height)
+        offset = 0
+        for number in range(self.passes_done):
+            coords = self.passes[number]
+            size = self.pass_bytes[number]
+            values = unpack_pixels(self.raw[offset:offset + size], self.bit_depth, len(coords), 1) if coords else []
+            offset += size
+            block_w, block_h = ADAM7_BLOCKS[number]
+            for (x, y), value in zip(coords, values):
+                run = [value] * min(block_w, width - x)
+                for row in range(y, min(y + block_h, height)):
+                    pixels[row * width + x:row * width + x + len(run)] = run
+        return pixels
 
 
 def convert_terminal_to_image(
@@ -65,20 +156,10 @@ def convert_terminal_to_image(
         ]
 
         hex_data = ''.join(hex_lines)
-        # compressed_data = from_hex_str(hex_data)
-        compressed_data = from_base64_str(hex_data)
-
-        raw_data = zlib.decompress(compressed_data)
-
+        # base64 (terminal.txt) or hex (older logs); decode_image tells them apart
         width, height = size
-        pixels = unpack_pixels(raw_data, bit_depth, width, height)
-
-        # Split flat pixels into rows
-        image = [pixels[i * width:(i + 1) * width] for i in range(height)]
-
-        with open(output_path, 'wb') as f:
-            writer = png.Writer(width, height, greyscale=True, bitdepth=8)
-            writer.write(f, image)
+        pixels = decode_image(hex_data, bit_depth, size)
+        write_png(pixels, width, height, output_path)
 
         print(f"Reconstructed image saved to '{output_path}'")
 
@@ -86,4 +167,5 @@ def convert_terminal_to_image(
         print(f"Failed to reconstruct image: {e}")
 
 
-convert_terminal_to_image()
+if __name__ == "__main__":
+    convert_terminal_to_image()
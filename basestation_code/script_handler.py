@@ -1,14 +1,17 @@
 import os
 import time
+from framing import group_batches, BATCH_SEPARATOR
 
 class ScriptRunner:
     """
     Runs command scripts located in the specified scripts directory.
     Supports commands, WAIT delays, FOR loops, and ignores comments (#).
+    Consecutive commands are sent as one batch ("A; B; C") when they fit in a
+    single frame, so they cost one uplink packet and one response stream.
     """
     import os
 
-    def __init__(self, command_handler, scripts_dir=None):
+    def __init__(self, command_handler, scripts_dir=None, batching=True):
         if scripts_dir is None:
             # Get the absolute path to this script's directory
             base_dir = os.path.dirname(os.path.abspath(__file__))
@@ -19,6 +22,7 @@ class ScriptRunner:
         
         self.command_handler = command_handler
         self.scripts_dir = scripts_dir
+        self.batching = batching
 
 
     def run_script(self, filename):
@@ -46,18 +50,36 @@ class ScriptRunner:
         self._process_lines(lines)
 
     def _process_lines(self, lines):
+        pending = []
         i = 0
         while i < len(lines):
             line = lines[i]
             if line.upper().startswith("FOR:"):
+                self._send_commands(pending)
                 i = self._process_for_loop(lines, i)
             elif line.upper().startswith("WAIT"):
+                self._send_commands(pending)
                 self._handle_wait(line)
                 i += 1
             else:
-                print(f"[SCRIPT] >> {line}")
-                self.command_handler(line)
+                pending.append(line)
                 i += 1
+        self._send_commands(pending)
+
+    def _send_commands(self, pending):
+        """Sends and clears the queued commands, batched where they fit in one frame."""
+        if not pending:
+            return
+        if self.batching:
+            commands = [command.strip() for line in pending for command in line.split(BATCH_SEPARATOR)]
+            groups = group_batches([command for command in commands if command])
+        else:
+            groups = [[line] for line in pending]
+        for group in groups:
+            line = f"{BATCH_SEPARATOR} ".join(group)
+            print(f"[SCRIPT] >> {line}")
+            self.command_handler(line)
+        pending.clear()
 
     def _process_for_loop(self, lines, start_index):
         try:
@@ -77,15 +99,17 @@ class ScriptRunner:
             return i
 
         for _ in range(repeat_count):
+            pending = []
             j = 0
             while j < len(block):
                 line = block[j]
                 if line.upper().startswith("WAIT"):
+                    self._send_commands(pending)
                     self._handle_wait(line)
                 else:
-                    print(f"[SCRIPT] >> {line}")
-                    self.command_handler(line)
+                    pending.append(line)
                 j += 1
+            self._send_commands(pending)
 
         return i + 1
 
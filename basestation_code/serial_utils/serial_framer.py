@@ -0,0 +1,61 @@
+from framing import SERIAL_SYNC, SERIAL_HEADER
+
+'''
+Splits the Feather's serial stream into forwarded frames
+(SERIAL_SYNC, length, RSSI, frame) and text lines.
+
+Received bytes are appended to one bytearray and consumed by moving an
+offset, and the search for the next newline resumes where the last one
+stopped. The consumed bytes are only dropped once the buffer is drained or
+COMPACT_AT of them have piled up, so a long transfer costs about one copy
+per byte instead of a copy of everything still buffered for every line.
+'''
+
+COMPACT_AT = 65536
+ITEM_FRAME = "frame"
+ITEM_LINE = "line"
+HEADER_SIZE = SERIAL_HEADER.size
+
+
+class SerialFramer:
+    def __init__(self, compact_at=COMPACT_AT):
+        self.compact_at = compact_at
+        self.buffer = bytearray()
+        self.start = 0      # First byte not handed out yet
+        self.scanned = 0    # Bytes from start on known to hold no newline
+
+    def feed(self, data):
+        """Adds received bytes. Returns (ITEM_FRAME, packet, rssi) / (ITEM_LINE, line, 0) for each complete item."""
+        buffer = self.buffer
+        buffer += data
+        size = len(buffer)
+        start = self.start
+        items = []
+        while start < size:
+            if buffer[start] == SERIAL_SYNC:
+                if size - start < HEADER_SIZE:
+                    break
+                _, length, rssi = SERIAL_HEADER.unpack_from(buffer, start)
+                end = start + HEADER_SIZE + length
+                if end > size:
+                    break
+                items.append((ITEM_FRAME, bytes(buffer[start + HEADER_SIZE:end]), rssi))
+                start = end
+                continue
+            newline = buffer.find(b"\n", start + self.scanned)
+            if newline < 0:
+                self.scanned = size - start
+                break
+            items.append((ITEM_LINE, bytes(buffer[start:newline]), 0))
+            start = newline + 1
+            self.scanned = 0
+
+        if start == size or start >= self.compact_at:
+            del buffer[:start]
+            start = 0
+        self.start = start
+        return items
+
+    def pending(self):
+        """The bytes of the incomplete frame or line at the end."""
+        return bytes(self.buffer[self.start:])
@@ -1,27 +1,48 @@
-import time
+import queue
 import serial
 import threading
 from script_handler import ScriptRunner
-from reconstructor import convert_terminal_to_image
+from reconstructor import TileDecoder, ProgressiveDecoder, write_png
+from image_decoder import StreamDecoder, decode_image, decode_dct
+from session_store import SessionStore, LINE
 
-from logger import log_to_file
+from logger import log_to_file, log_fatal
+from framing import (decode_frame, FrameError, fec_layout, IMAGE_INFO, XFER_INFO,
+                     CODEC_ZLIB, CODEC_TILES, CODEC_PROGRESSIVE, CODEC_DCT, TYPE_TEXT, TYPE_FILE, TYPE_END, TYPE_IMAGE_INFO, TYPE_XFER_BEGIN,
+                     TYPE_STATUS, TYPE_STATS, FLAG_COMPRESSED, STATUS_OK, STATUS_UNKNOWN)
+from payloads import STATS_HEADER, STATS_COMMAND
+from fec import fec_complete, fec_decode
+from compression import decompress
 from .port_finder import find_adafruit_port
 from .file_transfer import reconstruct_image_from_hex
+from .serial_framer import SerialFramer, ITEM_FRAME
 
 
 class SerialInterface:
-    FILE_TRANSFER_GAP = 1.0  # seconds
+    DEFAULT_IMAGE_INFO = (64, 64, 4, CODEC_ZLIB)  # width, height, bit depth, codec
 
-    def __init__(self, port=None, baudrate=11520, timeout=1):
+    def __init__(self, port=None, baudrate=11520, timeout=1, store=None):
         self.port = port if port is not None else find_adafruit_port()
         self.baudrate = baudrate
         self.timeout = timeout
         self.ser = None
         self.stop_event = threading.Event()
         self.reader_thread = None
-        self.file_transfer_active = False
+        self.consumer_thread = None
+        self.inbox = queue.Queue()  # Frames and lines from the reader, handled on the consumer thread
+        self.framer = SerialFramer()
+        self.file_transfer_active = False  # Raw binary lines from text-era rovers, until a text line or END frame
         self.file_transfer_buffer = bytearray()
-        self.file_transfer_last_time = None
+        self.image_info = {}    # msg id -> (width, height, bit depth, codec)
+        self.file_chunks = {}   # msg id -> {seq: payload}
+        self.transfers = {}     # msg id -> (XFER_INFO fields, FEC blocks or None)
+        self.completed = set()  # msg ids whose transfer was already rebuilt
+        self.text_chunks = {}   # msg id -> {seq: payload} of compressed responses
+        self.stats_chunks = {}  # msg id -> {seq: payload} of a STATS snapshot
+        self.last_image = None  # (compressed data, size, bit depth, codec) of the last complete image
+        self.tile_decoder = TileDecoder()  # Stored CAMERA frame that delta updates patch
+        self.previews = {}      # msg id -> (Stream/ProgressiveDecoder, chunk seqs in data order, next index)
+        self.store = store if store is not None else SessionStore()  # Every command and packet, for DISPLAY and replay
 
     def connect(self):
         try:
@@ -30,7 +51,7 @@ class SerialInterface:
             log_to_file(f"[INFO] Connected to {self.port} at {self.baudrate} baud.")
         except serial.SerialException as e:
             print(f"[ERROR] Could not open serial port {self.port}: {e}")
-            log_to_file(f"[ERROR] Could not open serial port {self.port}: {e}")
+            log_fatal(f"[ERROR] Could not open serial port {self.port}: {e}")
             raise e
 
     def finish_file_transfer(self, bit_depth=4, image_size=(128, 128)):
@@ -47,45 +68,318 @@ class SerialInterface:
 
         self.file_transfer_active = False
         self.file_transfer_buffer = bytearray()
-        self.file_transfer_last_time = None
+
+    def handle_frame(self, packet, rssi=0):
+        try:
+            frame = decode_frame(packet)
+        except FrameError as e:
+            print(f"[ERROR] Dropped corrupt frame: {e}")
+            log_to_file(f"[ERROR] Dropped corrupt frame: {e}")
+            return
+        self.store.record_frame(packet, frame, rssi)
+
+        if frame.type == TYPE_TEXT and frame.flags & FLAG_COMPRESSED:
+            # The frames form one compressed stream; print the text once all are in.
+            chunks = self.text_chunks.setdefault(frame.msg_id, {})
+            chunks[frame.seq] = len(packet), frame.payload
+            if len(chunks) < frame.total:
+                return
+            message = self.finish_compressed_text(frame.msg_id, frame.total)
+
+        elif frame.type == TYPE_TEXT:
+            text = frame.payload.decode('utf-8', errors='replace').strip()
+            message = f"[FEATHER] [RECEIVED #{frame.seq + 1}/{frame.total}] [{len(packet)} bytes]: {text}"
+
+        elif frame.type == TYPE_IMAGE_INFO:
+            width, height, bit_depth, codec = IMAGE_INFO.unpack_from(frame.payload)
+            self.image_info[frame.msg_id] = (width, height, bit_depth, codec)
+            kind = "DCT" if codec == CODEC_DCT else f"{bit_depth}bpp"
+            message = f"[FEATHER] [IMAGE] Expecting a {width}x{height} {kind} image"
+
+        elif frame.type == TYPE_XFER_BEGIN:
+            info = XFER_INFO.unpack_from(frame.payload)
+            window, fec_block, fec_parity, data_chunks, data_length = info
+            blocks = fec_layout(data_chunks, fec_block, fec_parity) if fec_block else None
+            self.transfers[frame.msg_id] = (info, blocks)
+            message = f"[FEATHER] [XFER] Transfer {frame.msg_id}: {frame.total} packets, {data_length} bytes, window {window}"
+            if fec_block:
+                message += f", FEC {fec_parity} parity per {fec_block} chunks"
+
+        elif frame.type == TYPE_FILE:
+            message = f"[FEATHER] [FILE #{frame.seq + 1}/{frame.total}] [{len(packet)} bytes] RSSI {rssi}"
+            if frame.msg_id in self.completed:
+                # Spare FEC chunks that arrive after the transfer was rebuilt
+                print(message)
+                log_to_file(message)
+                return
+            chunks = self.file_chunks.setdefault(frame.msg_id, {})
+            chunks[frame.seq] = frame.payload
+            _, blocks = self.transfers.get(frame.msg_id, (None, None))
+            if fec_complete(chunks, blocks) if blocks else len(chunks) == frame.total:
+                print(message)
+                log_to_file(message)
+                self.finish_frame_transfer(frame.msg_id, frame.total)
+                return
+            if frame.msg_id in self.image_info and self.image_info[frame.msg_id][3] in (CODEC_ZLIB, CODEC_PROGRESSIVE):
+                # Decode as the chunks come in instead of after the last one
+                print(message)
+                log_to_file(message)
+                self.update_preview(frame.msg_id, frame.total)
+                return
+
+        elif frame.type == TYPE_STATS:
+            chunks = self.stats_chunks.setdefault(frame.msg_id, {})
+            chunks[frame.seq] = frame.payload
+            if len(chunks) < frame.total:
+                return
+            data = b"".join(chunks[seq] for seq in sorted(chunks))
+            del self.stats_chunks[frame.msg_id]
+            try:
+                message = self.format_stats(decompress(data) if frame.flags & FLAG_COMPRESSED else data)
+            except Exception as e:
+                message = f"[ERROR] Undecodable STATS snapshot: {e}"
+
+        elif frame.type == TYPE_STATUS:
+            self.end_message(frame.msg_id)
+            status = frame.payload[0] if frame.payload else STATUS_OK
+            label = "OK" if status == STATUS_OK else "UNKNOWN" if status == STATUS_UNKNOWN else "ERROR"
+            command = frame.payload[1:].decode('utf-8', errors='replace')
+            message = f"[FEATHER] [BATCH {frame.seq + 1}/{frame.total}] {label}: {command}"
+
+        elif frame.type == TYPE_END:
+            if self.file_transfer_active:
+                self.finish_file_transfer()
+            self.end_message(frame.msg_id)
+            message = "[FEATHER] [RX] Final packet received. End of message stream."
+
+        else:
+            message = f"[FEATHER] [FRAME] Unhandled frame type {frame.type}"
+
+        print(message)
+        log_to_file(message)
+
+    def end_message(self, msg_id):
+        """Flushes whatever is still pending for a message once the rover says it is done."""
+        if msg_id in self.text_chunks:
+            partial = self.finish_compressed_text(msg_id, None)
+            print(partial)
+            log_to_file(partial)
+        if self.stats_chunks.pop(msg_id, None) is not None:
+            print(f"[ERROR] STATS snapshot {msg_id} incomplete; send STATS again.")
+            log_to_file(f"[ERROR] STATS snapshot {msg_id} incomplete")
+        self.completed.discard(msg_id)
+        chunks = self.file_chunks.pop(msg_id, None)
+        preview = self.previews.pop(msg_id, None)
+        if preview is not None and preview[0].coverage:
+            # A stopped transfer still leaves the rows or passes that arrived
+            decoder, order, next_index = preview
+            width, height, bit_depth, codec = self.image_info.pop(msg_id)
+            data = b"".join(chunks[seq] for seq in order[:next_index])
+            self.last_image = (data, (width, height), bit_depth, codec)
+            message = (f"[FEATHER] [IMAGE] Transfer {msg_id} stopped at {decoder.status} "
+                       f"({100 * decoder.coverage:.0f}% of pixels); partial image kept in 'reconstructed.png'")
+            print(message)
+            log_to_file(message)
+            return
+        if chunks is not None:
+            print(f"[ERROR] Transfer {msg_id} ended with {len(chunks)} chunks; use RESEND for the rest.")
+            log_to_file(f"[ERROR] Transfer {msg_id} ended incomplete with {len(chunks)} chunks")
+
+    def finish_compressed_text(self, msg_id, total):
+        """
+        Decompresses a compressed response. With total None (stream ended early)
+        only the chunks up to the first gap can be inflated.
+        """
+        chunks = self.text_chunks.pop(msg_id)
+        received = len(chunks)
+        on_air = sum(size for size, _ in chunks.values())
+        stream = bytearray()
+        seq = 0
+        while seq in chunks:
+            stream.extend(chunks[seq][1])
+            seq += 1
+        try:
+            text = decompress(bytes(stream)).decode('utf-8', errors='replace').strip()
+        except Exception as e:
+            text = f"<undecodable compressed text: {e}>"
+        if total is None:
+            return (f"[FEATHER] [RECEIVED {received} packets, first {seq} usable] [{on_air} bytes on air, compressed, "
+                    f"{len(text.encode('utf-8'))} bytes text] [INCOMPLETE]: {text}")
+        return (f"[FEATHER] [RECEIVED {total}/{total}] [{on_air} bytes on air, compressed, "
+                f"{len(text.encode('utf-8'))} bytes text]: {text}")
+
+    @staticmethod
+    def format_stats(data):
+        """A STATS snapshot (payloads.STATS_HEADER, then a STATS_COMMAND per command) as a table."""
+        uptime, cpu, rss, threads, jobs, radio_queue, count = STATS_HEADER.unpack_from(data)
+        lines = [f"[FEATHER] [STATS] Up {uptime}s, CPU {cpu / 10:.1f}%, RSS {rss / 1024:.1f} MiB, {threads} threads, "
+                 f"{jobs} jobs, {radio_queue} packets queued",
+                 f"    {'COMMAND':<8} {'RUNS':>5} {'ERR':>4} {'PKTS':>6} {'BYTES':>8} {'RETRY':>5} "
+                 f"{'P50 ms':>7} {'P90 ms':>7} {'MAX ms':>7}"]
+        for index in range(count):
+            name, runs, errors, packets, size, retries, p50, p90, slowest = STATS_COMMAND.unpack_from(
+                data, STATS_HEADER.size + index * STATS_COMMAND.size)
+            name = name.rstrip(b"\0").decode('utf-8', errors='replace')
+            lines.append(f"    {name:<8} {runs:>5} {errors:>4} {packets:>6} {size:>8} {retries:>5} "
+                         f"{p50:>7} {p90:>7} {slowest:>7}")
+        return "\n".join(lines)
+
+    def finish_frame_transfer(self, msg_id, total):
+        chunks = self.file_chunks.pop(msg_id)
+        self.completed.add(msg_id)
+        info, blocks = self.transfers.pop(msg_id, (None, None))
+        width, height, bit_depth, codec = self.image_info.pop(msg_id, self.DEFAULT_IMAGE_INFO)
+        preview = self.previews.pop(msg_id, None)
+        try:
+            if blocks:
+                _, fec_block, fec_parity, data_chunks, data_length = info
+                data = fec_decode(chunks, data_chunks, fec_block, fec_parity, data_length)
+            else:
+                data = b"".join(chunks[seq] for seq in range(total))
+            self.last_image = (data, (width, height), bit_depth, codec)
+            if codec == CODEC_TILES:
+                self.apply_tiles(data, width, height, bit_depth)
+            elif codec == CODEC_DCT:
+                pixels, quality = decode_dct(data, width, height)
+                write_png(pixels, width, height, "reconstructed.png")
+                message = f"[FEATHER] DCT image (quality {quality}) reconstructed. Saved to 'reconstructed.png'"
+                print(message)
+                log_to_file(message)
+            else:
+                # Usually the stream decoder already holds every row; FEC-rebuilt chunks need a pass over the data
+                decoder = preview[0] if preview is not None else None
+                if decoder is None or decoder.coverage < 1:
+                    decoder = self.stream_decoder(codec, width, height, bit_depth)
+                    decoder.feed(data)
+                    if decoder.coverage < 1:
+                        raise ValueError(f"image data ends at {decoder.status}")
+                write_png(decoder.render(), width, height, "reconstructed.png")
+                print("[FEATHER] Image reconstruction complete. Saved to 'reconstructed.png'")
+                log_to_file("[FEATHER] Image reconstruction complete. Saved to 'reconstructed.png'")
+        except Exception as e:
+            print(f"[ERROR] Failed to reconstruct image: {e}")
+            log_to_file(f"[ERROR] Failed to reconstruct image: {e}")
+
+    @staticmethod
+    def stream_decoder(codec, width, height, bit_depth):
+        """Incremental decoder for a CODEC_ZLIB or CODEC_PROGRESSIVE image."""
+        if codec == CODEC_PROGRESSIVE:
+            return ProgressiveDecoder(width, height, bit_depth)
+        return StreamDecoder(width, height, bit_depth)
+
+    def update_preview(self, msg_id, total):
+        """
+        Feeds the chunks that are now contiguous from the start of an image to
+        its stream decoder and saves reconstructed.png whenever more rows (or
+        another progressive pass) are complete.
+        """
+        chunks = self.file_chunks[msg_id]
+        if msg_id not in self.previews:
+            width, height, bit_depth, codec = self.image_info[msg_id]
+            _, blocks = self.transfers.get(msg_id, (None, None))
+            # With FEC the data chunks sit at the front of each block, parity behind them
+            order = [seq for first, k, _ in blocks for seq in range(first, first + k)] if blocks else list(range(total))
+            self.previews[msg_id] = (self.stream_decoder(codec, width, height, bit_depth), order, 0)
+        decoder, order, next_index = self.previews[msg_id]
+        coverage = decoder.coverage
+        try:
+            while next_index < len(order) and order[next_index] in chunks:
+                decoder.feed(chunks[order[next_index]])
+                next_index += 1
+            if decoder.coverage > coverage:
+                write_png(decoder.render(), decoder.width, decoder.height, "reconstructed.png")
+        except Exception as e:
+            print(f"[ERROR] Failed to render preview: {e}")
+            log_to_file(f"[ERROR] Failed to render preview: {e}")
+            return
+        finally:
+            self.previews[msg_id] = (decoder, order, next_index)
+        # Every progressive pass is worth a line; plain images only every quarter
+        progressive = isinstance(decoder, ProgressiveDecoder)
+        if (progressive and decoder.coverage > coverage) or int(4 * decoder.coverage) > int(4 * coverage):
+            message = (f"[FEATHER] [IMAGE] Decoded to {decoder.status} ({100 * decoder.coverage:.0f}% of pixels, "
+                       f"{next_index}/{len(order)} chunks), saved to 'reconstructed.png'")
+            print(message)
+            log_to_file(message)
+
+    def apply_tiles(self, data, width, height, bit_depth):
+        """Patches the stored CAMERA frame with a keyframe or delta update and saves it."""
+        pixels, keyframe, tiles = self.tile_decoder.apply(data, width, height, bit_depth)
+        write_png(pixels, width, height, "reconstructed.png")
+        kind = "keyframe" if keyframe else f"delta, {tiles} tiles changed"
+        message = (f"[FEATHER] [IMAGE] Frame {self.tile_decoder.frame_id} ({kind}, {len(data)} bytes) "
+                   f"saved to 'reconstructed.png'")
+        print(message)
+        log_to_file(message)
+
+    def handle_line(self, line):
+        self.store.record_line(line)
+        try:
+            decoded_line = line.decode('utf-8')
+            if self.file_transfer_active:
+                self.finish_file_transfer()
+            print(f"[FEATHER] {decoded_line.strip()}")
+            log_to_file(f"[FEATHER] {decoded_line.strip()}")
+        except UnicodeDecodeError:
+            if not self.file_transfer_active:
+                print("[FEATHER] Entering file transfer mode (raw binary detected).")
+                log_to_file("[FEATHER] Entering file transfer mode (raw binary detected).")
+                self.file_transfer_active = True
+            self.file_transfer_buffer.extend(line)
+
+    def dispatch(self, kind, data, rssi):
+        if kind == ITEM_FRAME:
+            self.handle_frame(data, rssi)
+        else:
+            self.handle_line(data)
+
+    def process_buffer(self, buffer):
+        """
+        Handles every complete frame and line at the start of buffer and
+        returns the bytes that are still incomplete.
+        """
+        framer = SerialFramer()
+        for item in framer.feed(buffer):
+            self.dispatch(*item)
+        return framer.pending()
 
     def start_reader(self):
+        """
+        Starts the reader thread, which blocks on the port and only splits
+        what arrives into frames and lines, and the consumer thread, which
+        decodes, prints and logs them, so a slow disk or a big image never
+        holds up the port.
+        """
         def read_from_port():
-            buffer = b""
             while not self.stop_event.is_set():
                 try:
-                    if self.ser.in_waiting > 0:
-                        data = self.ser.read(self.ser.in_waiting)
-                        buffer += data
-                    while b"\n" in buffer:
-                        line, buffer = buffer.split(b"\n", 1)
-                        try:
-                            decoded_line = line.decode('utf-8')
-                            if self.file_transfer_active:
-                                self.finish_file_transfer()
-                            print(f"[FEATHER] {decoded_line.strip()}")
-                            log_to_file(f"[FEATHER] {decoded_line.strip()}")
-                        except UnicodeDecodeError:
-                            if not self.file_transfer_active:
-                                print("[FEATHER] Entering file transfer mode (raw binary detected).")
-                                log_to_file("[FEATHER] Entering file transfer mode (raw binary detected).")
-                                self.file_transfer_active = True
-                            self.file_transfer_buffer.extend(line)
-                            self.file_transfer_last_time = time.time()
-                    if self.file_transfer_active:
-                        if self.file_transfer_last_time and (time.time() - self.file_transfer_last_time > self.FILE_TRANSFER_GAP):
-                            if buffer:
-                                self.file_transfer_buffer.extend(buffer)
-                                buffer = b""
-                            self.finish_file_transfer()
-                    else:
-                        time.sleep(0.05)
+                    # Waits for the first byte (up to the port timeout), then takes everything already there
+                    data = self.ser.read(self.ser.in_waiting or 1)
                 except Exception as e:
-                    print(f"[ERROR] Serial read error: {e}")
-                    log_to_file(f"[ERROR] Serial read error: {e}")
+                    if not self.stop_event.is_set():
+                        print(f"[ERROR] Serial read error: {e}")
+                        log_fatal(f"[ERROR] Serial read error: {e}")
+                    break
+                for item in self.framer.feed(data):
+                    self.inbox.put(item)
+            self.inbox.put(None)
+
+        def consume():
+            while True:
+                item = self.inbox.get()
+                if item is None:
                     break
+                try:
+                    self.dispatch(*item)
+                except Exception as e:
+                    print(f"[ERROR] Failed to handle serial data: {e}")
+                    log_to_file(f"[ERROR] Failed to handle serial data: {e}")
+            if self.file_transfer_active:
+                self.finish_file_transfer()
 
-        self.reader_thread = threading.Thread(target=read_from_port, daemon=True)
+        self.consumer_thread = threading.Thread(target=consume, name="serial-consumer", daemon=True)
+        self.consumer_thread.start()
+        self.reader_thread = threading.Thread(target=read_from_port, name="serial-reader", daemon=True)
         self.reader_thread.start()
 
     def send_command(self, cmd):
@@ -93,6 +387,7 @@ class SerialInterface:
             try:
                 print(f"[SEND] {cmd}")
                 log_to_file(f"[SEND] {cmd}")
+                self.store.start_session(cmd)
                 self.ser.write((cmd + "\r\n").encode('utf-8'))
                 self.ser.flush()
             except serial.SerialException as e:
@@ -135,64 +430,122 @@ class SerialInterface:
             self.close()
 
     def extract_and_display_image(self):
-        from config import LOG_FILE
-
+        if self.last_image is None:
+            # Nothing received in this run: the last SCREENSHOT or CAMERA from the session store
+            self.display_from_store()
+            return
         try:
-            with open(LOG_FILE, "r", encoding="utf-8") as f:
-                lines = f.readlines()
+            self.display_image(*self.last_image, tile_decoder=self.tile_decoder)
+            log_to_file("[INFO] DISPLAY completed image reconstruction.")
+        except Exception as e:
+            print(f"[ERROR] DISPLAY command failed: {e}")
+            log_to_file(f"[ERROR] DISPLAY command failed: {e}")
 
-            start_idx = None
-            end_idx = None
+    @staticmethod
+    def display_image(data, size, bit_depth, codec, tile_decoder=None):
+        """Saves an image's data, complete or not, to reconstructed.png."""
+        if codec == CODEC_TILES:
+            if tile_decoder is None:
+                tile_decoder = TileDecoder()
+                tile_decoder.apply(data, size[0], size[1], bit_depth)
+            write_png(tile_decoder.pixels, size[0], size[1], "reconstructed.png")
+        elif codec == CODEC_DCT:
+            write_png(decode_dct(data, size[0], size[1])[0], size[0], size[1], "reconstructed.png")
+        else:
+            # Also draws what arrived of a transfer that was stopped early
+            decoder = SerialInterface.stream_decoder(codec, size[0], size[1], bit_depth)
+            decoder.feed(data)
+            write_png(decoder.render(), size[0], size[1], "reconstructed.png")
 
-            for i in reversed(range(len(lines))):
-                if "[RX] Final packet received" in lines[i]:
-                    end_idx = i
-                elif "[SEND] SCREENSHOT" in lines[i] and end_idx is not None:
-                    start_idx = i
-                    break
+    def display_from_store(self):
+        try:
+            session_id = self.store.latest_session(("SCREENSHOT", "CAMERA"))
+            if session_id is None:
+                print("[ERROR] Could not find SCREENSHOT session in the session store.")
+                log_to_file("[ERROR] DISPLAY could not find SCREENSHOT session.")
+                return
+            packets = self.store.packets(session_id)
+            image = self.image_from_packets(packets)
+            if image is not None:
+                self.display_image(*image)
+                print(f"[INFO] Image of session {session_id} reconstructed. Saved to 'reconstructed.png'")
+                log_to_file("[INFO] DISPLAY completed image reconstruction.")
+                return
 
-            if start_idx is not None and end_idx is not None:
-                relevant = []
-                for line in lines[start_idx:end_idx + 1]:
-                    line_content = line.strip().split("    ", 1)
-                    if len(line_content) == 2:
-                        content = line_content[1]
-                        if "[FEATHER] [RECEIVED]" in content and ": " in content:
-                            payload = content.split(": ", 1)[1].strip()
-                            if "[" not in payload and "]" not in payload:
-                                relevant.append(payload + "\n")
-
-                if relevant:
-                    with open("terminal1.txt", "w", encoding="utf-8") as out:
-                        out.writelines(relevant)
-
-                    print("[INFO] Saved image data to terminal1.txt")
-                    log_to_file("[INFO] DISPLAY extracted pure image data to terminal1.txt")
-
-                    convert_terminal_to_image(
-                        terminal_file='terminal1.txt',
-                        output_path='reconstructed.png',
-                        bit_depth=4,
-                        size=(64, 64)
-                    )
-
-                    print("[INFO] Image reconstruction complete.")
-                    log_to_file("[INFO] DISPLAY completed image reconstruction.")
-                else:
-                    print("[ERROR] No valid image data found in block.")
-                    log_to_file("[ERROR] DISPLAY found no valid image data.")
+            # Text-era transfers: the payload lines are hex or base64 of the zlib stream
+            relevant = []
+            for frame_type, _, data in packets:
+                content = data.decode('utf-8', errors='replace').strip() if frame_type is LINE else ""
+                if "[RECEIVED]" in content and ": " in content:
+                    payload = content.split(": ", 1)[1].strip()
+                    if "[" not in payload and "]" not in payload:
+                        relevant.append(payload + "\n")
+            if relevant:
+                write_png(decode_image("".join(relevant), bit_depth=4, size=(64, 64)), 64, 64, "reconstructed.png")
+                print("[INFO] Image reconstruction complete.")
+                log_to_file("[INFO] DISPLAY completed image reconstruction.")
             else:
-                print("[ERROR] Could not find SCREENSHOT session in log.")
-                log_to_file("[ERROR] DISPLAY could not find SCREENSHOT session.")
+                print(f"[ERROR] No valid image data found in session {session_id}.")
+                log_to_file("[ERROR] DISPLAY found no valid image data.")
 
         except Exception as e:
             print(f"[ERROR] DISPLAY command failed: {e}")
             log_to_file(f"[ERROR] DISPLAY command failed: {e}")
 
+    def image_from_packets(self, packets):
+        """
+        (data, size, bit depth, codec) of the last image among a session's
+        stored packets, or None. Without every chunk the data ends at the
+        first missing one, as for a stopped transfer.
+        """
+        infos, transfers, chunks = {}, {}, {}
+        for frame_type, _, packet in packets:
+            if frame_type not in (TYPE_IMAGE_INFO, TYPE_XFER_BEGIN, TYPE_FILE):
+                continue
+            frame = decode_frame(packet)
+            if frame_type == TYPE_IMAGE_INFO:
+                infos[frame.msg_id] = IMAGE_INFO.unpack_from(frame.payload)
+                chunks[frame.msg_id] = {}
+            elif frame_type == TYPE_XFER_BEGIN:
+                transfers[frame.msg_id] = XFER_INFO.unpack_from(frame.payload), frame.total
+            elif frame.msg_id in chunks:
+                chunks[frame.msg_id][frame.seq] = frame.payload
+        if not infos:
+            return None
+        msg_id = list(infos)[-1]
+        width, height, bit_depth, codec = infos[msg_id]
+        received = chunks[msg_id]
+        info, total = transfers.get(msg_id, (None, max(received, default=-1) + 1))
+        if info is not None and info[1]:
+            _, fec_block, fec_parity, data_chunks, data_length = info
+            blocks = fec_layout(data_chunks, fec_block, fec_parity)
+            if fec_complete(received, blocks):
+                data = fec_decode(received, data_chunks, fec_block, fec_parity, data_length)
+            else:
+                order = [seq for first, k, _ in blocks for seq in range(first, first + k)]
+                data = self.contiguous(received, order)
+        else:
+            data = self.contiguous(received, range(total))
+        return data, (width, height), bit_depth, codec
+
+    @staticmethod
+    def contiguous(chunks, order):
+        """The chunks in order up to the first missing one, joined."""
+        data = bytearray()
+        for seq in order:
+            if seq not in chunks:
+                break
+            data += chunks[seq]
+        return bytes(data)
+
     def close(self):
         self.stop_event.set()
         if self.reader_thread:
+            if self.ser is not None and hasattr(self.ser, "cancel_read"):
+                self.ser.cancel_read()  # Wakes the blocked read instead of waiting out the timeout
             self.reader_thread.join()
+            self.consumer_thread.join()
+        self.store.close()
         if self.ser and self.ser.is_open:
             self.ser.close()
             print("[INFO] Serial port closed.")
@@ -0,0 +1,190 @@
+import sqlite3
+import sys
+import threading
+import time
+from config import SESSION_DB
+from framing import split_batch
+
+'''
+Every command the basestation sends and everything the Feather returns,
+in SQLite (sessions.db next to config.log).
+
+A session is one command line as sent, which may be a batch of several
+commands ("HELP; SCREENSHOT img.png"); the frames and text lines that
+arrive until the next line belong to it, with the frame header fields,
+RSSI and arrival time alongside the raw frame. Sessions are indexed by
+each command of their line and packets by session, frame type and msg id, so finding the last
+SCREENSHOT and reading back its frames costs the same however long the
+log has grown. Packets are buffered and written FLUSH_ROWS at a time in
+one transaction, or sooner once the oldest is FLUSH_SECONDS old, a command
+is sent or anything is read back. WAL mode skips the fsync per commit; a
+crash loses at most the buffered packets, never the file.
+
+    python session_store.py [SCREENSHOT] [--limit 20]   lists recent sessions
+    python session_store.py --show ID                   prints one session's packets
+'''
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    command TEXT NOT NULL,      -- First word of the first command, upper case (SCREENSHOT, CAMERA, ...)
+    line TEXT NOT NULL,         -- The whole command as sent
+    started REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS packets (
+    id INTEGER PRIMARY KEY,
+    session_id INTEGER,         -- NULL for anything before the first command
+    received REAL NOT NULL,
+    type INTEGER,               -- Frame type, NULL for a text line
+    msg_id INTEGER,
+    seq INTEGER,
+    total INTEGER,
+    rssi INTEGER,
+    data BLOB NOT NULL          -- The whole frame, or the text line
+);
+CREATE TABLE IF NOT EXISTS session_commands (
+    command TEXT NOT NULL,      -- First word of each command in the line, upper case
+    session_id INTEGER NOT NULL,
+    PRIMARY KEY (command, session_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS packets_by_session ON packets (session_id, type);
+CREATE INDEX IF NOT EXISTS packets_by_message ON packets (msg_id, id);
+"""
+
+LINE = None  # Packet type of a text line
+FLUSH_ROWS = 64  # Buffered packets written in one transaction
+FLUSH_SECONDS = 1.0  # Age of the oldest buffered packet that forces a write when the next one arrives
+
+INSERT_PACKET = ("INSERT INTO packets (session_id, received, type, msg_id, seq, total, rssi, data) "
+                 "VALUES (?, ?, ?, ?, ?, ?, ?, ?)")
+
+
+class SessionStore:
+    def __init__(self, path=SESSION_DB):
+        self.path = path
+        self.lock = threading.Lock()  # Commands come from the input thread, packets from the serial consumer
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        indexed = self.db.execute("SELECT 1 FROM sqlite_master WHERE name = 'session_commands'").fetchone()
+        self.db.executescript(SCHEMA)
+        if not indexed:
+            # A store from before batches were indexed: its sessions go by their first word
+            self.db.execute("INSERT OR IGNORE INTO session_commands SELECT command, id FROM sessions")
+        self.session_id = None  # Packets go to the command sent in this run, not an old one
+        self.pending = []  # Packet rows not written yet
+
+    def start_session(self, line):
+        """Records a command line as sent; what arrives next belongs to it. Returns the session id."""
+        commands = [command.split(maxsplit=1)[0].upper() for command in split_batch(line)] or [""]
+        with self.lock:
+            self._flush()
+            self.db.execute("BEGIN")
+            cursor = self.db.execute("INSERT INTO sessions (command, line, started) VALUES (?, ?, ?)",
+                                     (commands[0], line, time.time()))
+            self.session_id = cursor.lastrowid
+            self.db.executemany("INSERT OR IGNORE INTO session_commands (command, session_id) VALUES (?, ?)",
+                                [(command, self.session_id) for command in commands])
+            self.db.execute("COMMIT")
+        return self.session_id
+
+    def record_frame(self, packet, frame, rssi=0):
+        self._record((frame.type, frame.msg_id, frame.seq, frame.total, rssi, bytes(packet)))
+
+    def record_line(self, line):
+        self._record((LINE, None, None, None, None, bytes(line)))
+
+    def _record(self, fields):
+        now = time.time()
+        with self.lock:
+            self.pending.append((self.session_id, now, *fields))
+            if len(self.pending) >= FLUSH_ROWS or now - self.pending[0][1] >= FLUSH_SECONDS:
+                self._flush()
+
+    def flush(self):
+        """Writes the buffered packets."""
+        with self.lock:
+            self._flush()
+
+    def _flush(self):
+        """Writes the buffered packets in one transaction. Call with the lock held."""
+        if not self.pending:
+            return
+        self.db.execute("BEGIN")
+        self.db.executemany(INSERT_PACKET, self.pending)
+        self.db.execute("COMMIT")
+        self.pending.clear()
+
+    def latest_session(self, commands):
+        """Id of the last session with any of commands in its line, or None."""
+        with self.lock:
+            self._flush()
+            rows = [self.db.execute("SELECT MAX(session_id) FROM session_commands WHERE command = ?",
+                                    (command,)).fetchone()[0]
+                    for command in commands]
+        rows = [row for row in rows if row is not None]
+        return max(rows) if rows else None
+
+    def session(self, session_id):
+        """(command line, start time) of a session, or None."""
+        with self.lock:
+            self._flush()
+            return self.db.execute("SELECT line, started FROM sessions WHERE id = ?", (session_id,)).fetchone()
+
+    def packets(self, session_id, types=None):
+        """(type, rssi, data) of a session's packets in arrival order; type LINE for text lines."""
+        query = "SELECT type, rssi, data FROM packets WHERE session_id = ?"
+        if types is not None:
+            query += f" AND type IN ({', '.join('?' * len(types))})"
+        with self.lock:
+            self._flush()
+            return self.db.execute(query + " ORDER BY id", (session_id, *(types or ()))).fetchall()
+
+    def sessions(self, command=None, limit=20):
+        """(id, line, started, frames, lines, mean RSSI) of the last sessions, newest first."""
+        query = ("SELECT s.id, s.line, s.started, COUNT(p.type), COUNT(p.id) - COUNT(p.type), AVG(p.rssi) "
+                 "FROM (SELECT * FROM sessions {} ORDER BY id DESC LIMIT ?) s "
+                 "LEFT JOIN packets p ON p.session_id = s.id GROUP BY s.id ORDER BY s.id DESC")
+        with self.lock:
+            self._flush()
+            if command is None:
+                return self.db.execute(query.format(""), (limit,)).fetchall()
+            where = "WHERE id IN (SELECT session_id FROM session_commands WHERE command = ?)"
+            return self.db.execute(query.format(where), (command.upper(), limit)).fetchall()
+
+    def close(self):
+        with self.lock:
+            self._flush()
+            self.db.close()
+
+
+def main():
+    import argparse
+    from datetime import datetime
+    parser = argparse.ArgumentParser(description="List the basestation's recorded sessions")
+    parser.add_argument("command", nargs="?", help="Only sessions of this command (SCREENSHOT, CAMERA, ...)")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--show", type=int, help="Print the packets of one session")
+    parser.add_argument("--db", default=SESSION_DB)
+    options = parser.parse_args()
+
+    store = SessionStore(options.db)
+    if options.show is not None:
+        session = store.session(options.show)
+        if session is None:
+            sys.exit(f"[ERROR] No session {options.show}")
+        print(f"[SESSION {options.show}] {datetime.fromtimestamp(session[1])} {session[0]}")
+        for frame_type, rssi, data in store.packets(options.show):
+            if frame_type is LINE:
+                print(f"  [LINE] {data.decode('utf-8', errors='replace').strip()}")
+            else:
+                print(f"  [FRAME type {frame_type}] {len(data)} bytes, RSSI {rssi}")
+        return
+    for session_id, line, started, frames, lines, rssi in reversed(store.sessions(options.command, options.limit)):
+        signal = f", mean RSSI {rssi:.0f}" if rssi is not None else ""
+        print(f"[SESSION {session_id}] {datetime.fromtimestamp(started):%Y-%m-%d %H:%M:%S} {line}: "
+              f"{frames} frames, {lines} lines{signal}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+import os
+import random
+import sys
+import timeit
+
+'''
+Bytes on air for typical command responses with and without the preset
+dictionary compression in rover_code/compression.py. Run from the repository root:
+
+    python benchmarks/bench_compression.py [packet size]
+'''
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "rover_code"))
+
+import zlib
+from compression import compress, decompress, maybe_compress
+from framing import HEADER_SIZE
+
+_rng = random.Random(42)
+
+
+def _mac():
+    return ":".join(f"{_rng.randrange(256):02X}" for _ in range(6))
+
+
+# Representative outputs of each command type. The exact numbers don't matter,
+# the structure does; none of these are copied into the dictionary verbatim.
+SAMPLES = {
+    "PING": (
+        "PING 1.1.1.1 (1.1.1.1) 56(84) bytes of data.\n"
+        "64 bytes from 1.1.1.1: icmp_seq=1 ttl=58 time=21.7 ms\n\n"
+        "--- 1.1.1.1 ping statistics ---\n"
+        "1 packets transmitted, 1 received, 0% packet loss, time 0ms\n"
+        "rtt min/avg/max/mdev = 21.654/21.654/21.654/0.000 ms"
+    ),
+    "DNS": (
+        "Server:\t\t192.168.4.1\nAddress:\t192.168.4.1#53\n\n"
+        "Non-authoritative answer:\nName:\trutgers.edu\nAddress: 128.6.46.111"
+    ),
+    "NET": (
+        "HTTP/2 200 \nserver: GitHub.com\ndate: Fri, 18 Apr 2025 14:02:51 GMT\n"
+        "content-type: text/html; charset=utf-8\nvary: X-PJAX, X-PJAX-Container, Turbo-Visit, Turbo-Frame, "
+        "Accept-Encoding, Accept, X-Requested-With\netag: W/\"5f1b9c0d3e\"\n"
+        "cache-control: max-age=0, private, must-revalidate\n"
+        "strict-transport-security: max-age=31536000; includeSubdomains; preload\n"
+        "x-frame-options: deny\nx-content-type-options: nosniff\nx-xss-protection: 0\n"
+        "referrer-policy: origin-when-cross-origin, strict-origin-when-cross-origin\n"
+        "accept-ranges: bytes\nx-github-request-id: D3A4:2B1F:1A2B3C:1F2E3D:68025A7B"
+    ),
+    "SCANBT": "Scanning ...\n" + "".join(f"\t{_mac()}\t{name}\n" for name in
+                                          ("n/a", "JBL Flip 5", "n/a", "Galaxy Buds2", "n/a")),
+    "WIFISCAN": "\n".join(
+        f"{_mac()}, 2025-04-17 23:06:{10 + i:02d}, 2025-04-17 23:06:{40 + i:02d}, 1, 130, WPA2, CCMP, PSK, "
+        f"-{40 + 3 * i}, {12 * i + 5}, 0, 0.  0.  0.  0, 11, ECE_SP25_53,"
+        for i in range(6)
+    ),
+    "RUN": "\n".join(
+        line for line in (
+            "total 48",
+            "drwxr-xr-x 5 pi pi 4096 Apr 17 22:58 .",
+            "drwxr-xr-x 9 pi pi 4096 Apr 10 18:11 ..",
+            "-rw-r--r-- 1 pi pi 5120 Apr 17 22:58 command_handler.py",
+            "-rw-r--r-- 1 pi pi 1843 Apr 17 22:58 file_sender.py",
+            "-rw-r--r-- 1 pi pi 2212 Apr 12 16:40 images.py",
+            "drwxr-xr-x 2 pi pi 4096 Apr 12 16:40 img",
+            "-rw-r--r-- 1 pi pi 1370 Apr 10 18:11 main.py",
+        )
+    ),
+    "HELP": ("Valid commands: MOVE, LED, STATUS, SCAN, STOP, JOBS, CANCEL, PING, DNS, NET, HELP, HISTORY, ECHO, "
+             "CONFIG, SCREENSHOT, CAMERA, RESEND, AIRTIME, STATS, SCANBT, WIFISETUP, WIFISCAN, WIFICRACK, LEDON, "
+             "LEDOFF, RUN"),
+    "AIRTIME": ("SF7 BW125kHz CR4/5: 226 ms per 128-byte frame\n"
+                "Last 60 min: 41.3s on air (no duty cycle limit)\n"
+                "SCREENSHOT: 152 pkts, 19264 B, 33.10s\nPING: 6 pkts, 402 B, 0.61s\nAIRTIME: 1 pkts, 96 B, 0.15s"),
+    "STATS": ("Up 3812s, CPU 4.2%, RSS 38.5 MiB, 7 threads\nradio.queue 0\n"
+              "PING: 3 runs (0 failed), 6 pkts, 402 B, 0 retries, p50 1000ms p90 5000ms max 4211ms\n"
+              "tx.ack_seconds: 158 x, p50 250.0ms p90 500.0ms max 812.4ms"),
+    "STATUS": "→ Rover is online and ready",
+    "ECHO": "[THROUGHPUT] 235.52 bytes/sec | [LATENCY] 0.5430 sec/packet",
+}
+
+
+def bytes_on_air(payload, packet_size):
+    """Frames and total bytes needed to send payload in frames of at most packet_size bytes."""
+    chunk = packet_size - HEADER_SIZE
+    frames = max(1, -(-len(payload) // chunk))
+    return frames, frames * HEADER_SIZE + len(payload)
+
+
+def plain_deflate(data):
+    compressor = zlib.compressobj(9, zlib.DEFLATED, -15)
+    return compressor.compress(data) + compressor.flush()
+
+
+def main():
+    packet_size = int(sys.argv[1]) if len(sys.argv) > 1 else 128
+    print(f"[BENCH] Bytes on air per response, {packet_size}-byte packets")
+    print(f"[BENCH] {'command':<9} {'text':>6} {'plain':>12} {'deflate':>12} {'dictionary':>12} {'saved':>7}")
+    total_plain = total_sent = 0
+    for command, text in SAMPLES.items():
+        data = text.encode("utf-8")
+        payload, compressed = maybe_compress(data)
+        assert decompress(compress(data)) == data, command
+        plain_frames, plain_bytes = bytes_on_air(data, packet_size)
+        deflate_frames, deflate_bytes = bytes_on_air(plain_deflate(data), packet_size)
+        sent_frames, sent_bytes = bytes_on_air(payload, packet_size)
+        total_plain += plain_bytes
+        total_sent += sent_bytes
+        print(f"[BENCH] {command:<9} {len(data):>6} {plain_bytes:>6} ({plain_frames:>2}f) "
+              f"{deflate_bytes:>6} ({deflate_frames:>2}f) {sent_bytes:>6} ({sent_frames:>2}f) "
+              f"{1 - sent_bytes / plain_bytes:>6.0%}{'' if compressed else '  (sent plain)'}")
+    print(f"[BENCH] all       {total_plain:>19} {total_sent:>27} {1 - total_sent / total_plain:>6.0%}")
+
+    data = SAMPLES["WIFISCAN"].encode("utf-8")
+    packed = compress(data)
+    for label, stmt in (("compress WIFISCAN", lambda: compress(data)),
+                        ("decompress WIFISCAN", lambda: decompress(packed))):
+        seconds = timeit.timeit(stmt, number=2000)
+        print(f"[BENCH] {label:<28} {seconds / 2000 * 1e6:8.2f} us/op")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+import os
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+'''
+Field test log parsing at scale: the old data_cleaner (readlines() of every
+file, two regex searches per [THROUGHPUT] line) against the chunked parser
+in collected_data/data_cleaner.py (a process pool, or inline with one
+worker), on copies of collected_data/logs repeated to the given size in MB
+per location. Each variant runs in its own process so its peak RSS is its
+own; both must find the same packets. Run from the repository root:
+
+    python benchmarks/bench_data_cleaner.py [MB per log] [workers ...]
+'''
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+LOGS = os.path.join(ROOT, "collected_data", "logs")
+sys.path.insert(0, os.path.join(ROOT, "collected_data"))
+
+
+def old_process_logs(directory):
+    """The old process_logs, reading .log as well so it sees the same files; returns the packet count."""
+    byte_groups = defaultdict(list)
+    for filename in os.listdir(directory):
+        with open(os.path.join(directory, filename), 'r') as file:
+            lines = file.readlines()
+        for i in range(1, len(lines)):
+            if '[THROUGHPUT]' in lines[i]:
+                size = re.search(r'\[(\d+) bytes\]', lines[i - 1])
+                throughput = re.search(r'\[THROUGHPUT\] ([\d.]+) bytes/sec', lines[i])
+                latency = re.search(r'\[LATENCY\] ([\d.]+) sec/packet', lines[i])
+                if size and throughput and latency:
+                    byte_groups[int(size.group(1))].append((float(throughput.group(1)), float(latency.group(1))))
+    return sum(len(metrics) for metrics in byte_groups.values())
+
+
+def run_variant(directory, variant, workdir):
+    start = time.perf_counter()
+    if variant == "old":
+        packets = old_process_logs(directory)
+    else:
+        import contextlib
+        import io
+        import data_cleaner
+        with contextlib.redirect_stdout(io.StringIO()):
+            totals = data_cleaner.process_logs(directory, os.path.join(workdir, "out.csv"),
+                                               os.path.join(workdir, "packets"), workers=int(variant))
+        packets = sum(total[0] for total in totals.values())
+    elapsed = time.perf_counter() - start
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    print(f"{packets} {elapsed} {peak}")
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "--variant":
+        run_variant(*sys.argv[2:5])
+        return
+    megabytes = float(sys.argv[1]) if len(sys.argv) > 1 else 50
+    variants = ["old"] + (sys.argv[2:] or [str(os.cpu_count() or 1)])
+    with tempfile.TemporaryDirectory() as workdir:
+        directory = os.path.join(workdir, "logs")
+        os.mkdir(directory)
+        for name in os.listdir(LOGS):
+            with open(os.path.join(LOGS, name), "rb") as f:
+                # The old parser drops the packets after a [SEND] ECHO line; leave those out so both count the same
+                text = b"".join(line for line in f if b"[SEND] ECHO" not in line)
+            with open(os.path.join(directory, name), "wb") as f:
+                for _ in range(int(megabytes * 1024 * 1024 / len(text)) + 1):
+                    f.write(text)
+        size = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+        print(f"[BENCH] {len(os.listdir(directory))} logs, {size / 1e6:.0f} MB, {os.cpu_count()} CPUs")
+        counts = set()
+        for variant in variants:
+            result = subprocess.run([sys.executable, __file__, "--variant", directory, variant, workdir],
+                                    capture_output=True, text=True, check=True)
+            packets, elapsed, peak = result.stdout.split()[-3:]
+            counts.add(int(packets))
+            label = "readlines()" if variant == "old" else f"chunked, {variant} workers"
+            print(f"[BENCH] {label:<18}: {float(elapsed):6.2f} s, {int(packets) / float(elapsed) / 1e3:6.0f}k packets/s, "
+                  f"peak RSS {int(peak) / 1024:5.0f} MB")
+        assert len(counts) == 1, f"variants found different packet counts: {counts}"
+
+
+if __name__ == "__main__":
+    main()
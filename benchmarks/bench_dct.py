@@ -0,0 +1,56 @@
+import os
+import sys
+import time
+import zlib
+
+'''
+Image quality per byte: the rate-controlled DCT codec (rover_code/dct_codec.py)
+at a range of byte budgets against the fixed-depth zlib images SCREENSHOT
+sends without one, as PSNR against the full greyscale image at the same
+size. Every DCT payload is decoded with the basestation's decode_dct().
+Run from the repository root:
+
+    python benchmarks/bench_dct.py
+'''
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "rover_code"))
+sys.path.insert(1, os.path.join(ROOT, "basestation_code"))
+
+import numpy as np
+from images import read_image_to_grayscale, resize_image, quantize_image, pack_pixels
+from dct_codec import encode_to_budget, psnr
+from image_decoder import decode_dct
+
+IMAGE = os.path.join(ROOT, "rover_code", "img", "img.png")
+SIZES = ((64, 64), (128, 128))
+BUDGETS = (400, 800, 1600, 3200)
+BIT_DEPTHS = (1, 2, 4)
+
+
+def main():
+    source, _, _ = read_image_to_grayscale(IMAGE)
+    for size in SIZES:
+        image = resize_image(source, size, "area")
+        for bit_depth in BIT_DEPTHS:
+            pixels = quantize_image(IMAGE, bit_depth, size, dithering=False, resample="area")
+            data = zlib.compress(pack_pixels(pixels, bit_depth))
+            scale = 255 // ((1 << bit_depth) - 1)
+            levels = np.array(pixels).reshape(size[1], size[0]) * scale
+            print(f"[BENCH] {size[0]}x{size[1]} zlib {bit_depth}bpp: {len(data):5d} bytes, PSNR {psnr(image, levels):5.1f} dB")
+        for budget in BUDGETS:
+            start = time.perf_counter()
+            try:
+                data, quality, quality_psnr = encode_to_budget(image, budget)
+            except ValueError as e:
+                print(f"[BENCH] {size[0]}x{size[1]} DCT <= {budget:4d}: {e}")
+                continue
+            elapsed = time.perf_counter() - start
+            decoded, _ = decode_dct(data, size[0], size[1])
+            assert abs(psnr(image, decoded) - quality_psnr) < 1e-9, "basestation decoded differently"
+            print(f"[BENCH] {size[0]}x{size[1]} DCT <= {budget:4d}: {len(data):5d} bytes, PSNR {quality_psnr:5.1f} dB "
+                  f"(quality {quality}, search {elapsed * 1000:.0f} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import os
+import random
+import sys
+import zlib
+
+'''
+Bytes per CAMERA update with whole frames vs. changed-tile deltas
+(rover_code/delta_image.py), for a stationary rover watching a scene with
+sensor noise and one small moving object. Every update is also decoded with
+the basestation's TileDecoder and checked against the rover's copy.
+Run from the repository root:
+
+    python benchmarks/bench_delta_image.py [updates]
+'''
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "rover_code"))
+sys.path.insert(1, os.path.join(ROOT, "basestation_code"))
+
+from images import quantize_image, pack_pixels
+from delta_image import TileEncoder
+from reconstructor import TileDecoder
+
+SIZE = (64, 64)
+BIT_DEPTH = 4
+NOISE = 0.02        # Share of pixels that flicker by one level per capture
+OBJECT = 6          # Side of the moving object (pixels)
+
+
+def capture(background, step, rng):
+    width, height = SIZE
+    max_val = (1 << BIT_DEPTH) - 1
+    pixels = list(background)
+    for _ in range(int(NOISE * width * height)):
+        i = rng.randrange(width * height)
+        pixels[i] = max(0, min(max_val, pixels[i] + rng.choice((-1, 1))))
+    x0 = (4 + 3 * step) % (width - OBJECT)
+    for y in range(20, 20 + OBJECT):
+        for x in range(x0, x0 + OBJECT):
+            pixels[y * width + x] = max_val
+    return pixels
+
+
+def main():
+    updates = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    background = quantize_image(os.path.join(ROOT, "rover_code", "img", "img.png"), BIT_DEPTH, SIZE, dithering=False)
+    rng = random.Random(1)
+    encoder = TileEncoder()
+    decoder = TileDecoder()
+    scale = 255 // ((1 << BIT_DEPTH) - 1)
+
+    full_bytes = delta_bytes = delta_only = deltas = 0
+    for step in range(updates):
+        pixels = capture(background, step, rng)
+        full = zlib.compress(pack_pixels(pixels, BIT_DEPTH))
+        data, keyframe, changed, tiles = encoder.encode(pixels, SIZE, BIT_DEPTH)
+        encoder.commit()
+        decoded, _, _ = decoder.apply(data, SIZE[0], SIZE[1], BIT_DEPTH)
+        assert decoded == [value * scale for value in encoder.reference], f"update {step} decoded differently"
+        full_bytes += len(full)
+        delta_bytes += len(data)
+        if not keyframe:
+            delta_only += len(data)
+            deltas += 1
+        kind = "key" if keyframe else f"{changed:2d}/{tiles}"
+        print(f"[BENCH] update {step + 1:3d}: full frame {len(full):5d} bytes, tiles {kind:>6} {len(data):5d} bytes")
+
+    print(f"[BENCH] {updates} updates: full frames {full_bytes} bytes, deltas {delta_bytes} bytes "
+          f"({full_bytes / delta_bytes:.1f}x less, keyframe every {encoder.keyframe_interval})")
+    if deltas:
+        print(f"[BENCH] Between keyframes: {delta_only / deltas:.0f} bytes per update "
+              f"({full_bytes / updates / (delta_only / deltas):.1f}x less than a full frame)")
+
+
+if __name__ == "__main__":
+    main()
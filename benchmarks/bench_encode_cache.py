@@ -0,0 +1,57 @@
+import contextlib
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+
+'''
+Time until a SCREENSHOT payload is ready to send: encoding the image from
+scratch, a hit in the in-memory EncodeCache (rover_code/encode_cache.py) and
+a hit after a restart, read back from the cache directory. Each hit is
+checked against the freshly encoded payload. Run from the repository root:
+
+    python benchmarks/bench_encode_cache.py
+'''
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "rover_code"))
+
+from images import convert_image
+from encode_cache import EncodeCache
+from framing import CODEC_ZLIB
+
+IMAGE = os.path.join(ROOT, "rover_code", "img", "img.png")
+SIZES = ((64, 64), (128, 128), (256, 256))
+BIT_DEPTH = 4
+REPEAT = 5
+
+
+def best(stmt):
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        return min(timeit.repeat(stmt, number=1, repeat=REPEAT))
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    try:
+        for size in SIZES:
+            encode = lambda: convert_image(IMAGE, bit_depth=BIT_DEPTH, size=size, dithering=False)
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                data = encode()
+            cache = EncodeCache(directory=directory)
+            key = cache.key(IMAGE, size, BIT_DEPTH, False, CODEC_ZLIB)
+            cache.put(key, data)
+
+            encode_time = best(encode)
+            memory_time = best(lambda: cache.get_or_encode(key, encode))
+            disk_time = best(lambda: EncodeCache(directory=directory).get_or_encode(key, encode))
+            assert cache.get(key) == data and EncodeCache(directory=directory).get(key) == data
+            print(f"[BENCH] {size[0]}x{size[1]} {BIT_DEPTH}bpp ({len(data)} bytes): encode {encode_time * 1000:7.2f} ms, "
+                  f"memory hit {memory_time * 1000:6.3f} ms, disk hit after restart {disk_time * 1000:6.3f} ms")
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
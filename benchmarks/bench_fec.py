@@ -0,0 +1,61 @@
+import os
+import random
+import sys
+import time
+
+'''
+Reed-Solomon FEC encode (rover) and decode (basestation) throughput.
+Run from the repository root:
+
+    python benchmarks/bench_fec.py
+'''
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "rover_code"))
+
+from fec import fec_encode, parity_for, FEC_BLOCK_SIZE
+from framing import fec_layout, HEADER_SIZE
+
+sys.path.remove(os.path.join(ROOT, "rover_code"))
+sys.modules.pop("fec")
+sys.path.insert(0, os.path.join(ROOT, "basestation_code"))
+
+from fec import fec_decode
+
+
+def drop_chunks(encoded, data_chunks, parity, rng):
+    """Loses as many chunks per block as FEC can repair, preferring data chunks."""
+    chunks = dict(enumerate(encoded))
+    for first, k, m in fec_layout(data_chunks, FEC_BLOCK_SIZE, parity):
+        for seq in rng.sample(range(first, first + k), min(m, k)):
+            del chunks[seq]
+    return chunks
+
+
+def main():
+    rng = random.Random(1)
+    for packet_size in (64, 128, 252):
+        for redundancy in (12, 25, 50):
+            chunk_size = packet_size - HEADER_SIZE
+            data = os.urandom(4200)
+            chunks = [data[i:i + chunk_size] for i in range(0, len(data), chunk_size)]
+            parity = parity_for(redundancy)
+
+            start = time.perf_counter()
+            encoded = fec_encode(chunks, chunk_size, parity)
+            encode_time = time.perf_counter() - start
+
+            received = drop_chunks(encoded, len(chunks), parity, rng)
+            start = time.perf_counter()
+            decoded = fec_decode(received, len(chunks), FEC_BLOCK_SIZE, parity, len(data))
+            decode_time = time.perf_counter() - start
+            assert decoded == data, "FEC round trip failed"
+
+            print(f"[BENCH] {packet_size:3d}-byte packets, {redundancy:2d}% parity: "
+                  f"{len(encoded) - len(chunks):2d} parity chunks, {len(encoded) - len(received):2d} lost | "
+                  f"encode {len(data) / encode_time / 1024:7.1f} KiB/s | "
+                  f"decode {len(data) / decode_time / 1024:7.1f} KiB/s")
+
+
+if __name__ == "__main__":
+    main()
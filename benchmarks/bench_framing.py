@@ -0,0 +1,45 @@
+import base64
+import os
+import sys
+import timeit
+
+'''
+Encode/decode timings for the binary frame format in rover_code/framing.py
+(its golden vectors are in checks/check_framing.py). Run from the
+repository root:
+
+    python benchmarks/bench_framing.py
+'''
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "rover_code"))
+
+import framing
+from framing import encode_frame, decode_frame
+
+
+def bench(label, stmt, number):
+    seconds = timeit.timeit(stmt, number=number)
+    print(f"[BENCH] {label:<28} {seconds / number * 1e6:8.2f} us/op")
+
+
+def main():
+    payload = os.urandom(framing.MAX_PAYLOAD_SIZE)
+    frame = encode_frame(framing.TYPE_FILE, payload, msg_id=1, seq=10, total=100)
+    bench("encode 242-byte frame", lambda: encode_frame(framing.TYPE_FILE, payload, 1, 10, 100), 20000)
+    bench("decode 242-byte frame", lambda: decode_frame(frame), 20000)
+    bench("crc16 242 bytes", lambda: framing.crc16(payload), 20000)
+
+    # Bytes on air for a typical compressed image: old base64 text vs raw frames
+    image = os.urandom(4200)
+    for packet_size in (64, 128, 252):
+        text = base64.b64encode(image)
+        old_bytes = len(text)
+        raw_chunk = packet_size - framing.HEADER_SIZE
+        frames = -(-len(image) // raw_chunk)
+        new_bytes = len(image) + frames * framing.HEADER_SIZE
+        print(f"[BENCH] {packet_size:3d}-byte packets: base64 text {old_bytes} bytes, "
+              f"binary frames {new_bytes} bytes ({100 * (1 - new_bytes / old_bytes):.1f}% less)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import timeit
+import zlib
+
+'''
+Timings for the software hot paths that run between the radios: response
+chunking on the rover, image conversion, image reconstruction, serial line
+splitting and log parsing on the basestation. Run from the repository root:
+
+    python benchmarks/bench_hotpaths.py                  # compare with the baseline
+    python benchmarks/bench_hotpaths.py --save-baseline  # after an intended change
+
+Results are written as JSON (--json) and compared against
+benchmarks/baseline_hotpaths.json; the script exits with status 1 when any
+benchmark got slower than the baseline by more than --threshold. Baselines are
+only comparable on the same machine, so re-save it when switching computers.
+
+The rover and basestation keep their own copies of fec.py, so each side is
+timed in a separate interpreter.
+'''
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline_hotpaths.json")
+IMAGE = os.path.join(ROOT, "rover_code", "img", "img.png")
+LOGS = os.path.join(ROOT, "collected_data", "logs")
+
+BIT_DEPTHS = (1, 2, 4, 6)
+SIZES = ((64, 64), (128, 128))
+THRESHOLD = 0.25        # Allowed slowdown before a benchmark counts as a regression
+REPEAT = 5
+
+
+def measure(results, name, stmt, number):
+    """Best of REPEAT runs, in microseconds per call. Output of stmt is discarded."""
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        times = timeit.repeat(stmt, number=number, repeat=REPEAT)
+    results[name] = {"us_per_op": min(times) / number * 1e6, "number": number, "repeat": REPEAT}
+    print(f"[BENCH] {name:<36} {results[name]['us_per_op']:12.1f} us/op")
+
+
+class SilentRadio:
+    """Accepts every packet immediately, so only the rover's own work is timed."""
+
+    def __init__(self):
+        self.node = 1
+        self.destination = 2
+        self.ack_retries = 5
+        self.ack_wait = 0.5
+        self.last_rssi = -60
+
+    def send(self, data, **kwargs):
+        return True
+
+    def send_with_ack(self, data):
+        return True
+
+    def receive(self, **kwargs):
+        return None
+
+
+def bench_rover(results):
+    sys.path.insert(0, os.path.join(ROOT, "rover_code"))
+    from command_handler import CommandHandler
+    from images import convert_image
+
+    handler = CommandHandler(SilentRadio())
+    text = "\n".join(f"64 bytes from 1.1.1.1: icmp_seq={i} ttl=57 time=14.{i % 10} ms" for i in range(60))
+    for packet_size in (64, 128, 252):
+        handler.max_packet_size = packet_size
+        for compressed in (False, True):
+            handler.compression_enabled = compressed
+            label = f"send_response {len(text)}B/{packet_size}{' zlib' if compressed else ''}"
+            measure(results, label, lambda: handler.send_response(text), 50)
+    handler.compression_enabled = False
+
+    for width, height in SIZES:
+        for bit_depth in BIT_DEPTHS:
+            measure(results, f"convert_image {width}x{height} {bit_depth}bpp",
+                    lambda: convert_image(IMAGE, bit_depth=bit_depth, size=(width, height), dithering=False), 1)
+        measure(results, f"convert_image {width}x{height} 4bpp dither",
+                lambda: convert_image(IMAGE, bit_depth=4, size=(width, height), dithering=True), 1)
+
+
+def bench_basestation(results):
+    sys.path.insert(0, os.path.join(ROOT, "basestation_code"))
+    sys.path.insert(0, os.path.join(ROOT, "rover_code"))
+    from images import convert_image
+    sys.path.pop(0)
+    sys.path.insert(0, os.path.join(ROOT, "collected_data"))
+    from reconstructor import unpack_pixels
+    from serial_utils.file_transfer import reconstruct_image_from_hex
+    from serial_utils.serial_interface import SerialInterface
+    from framing import encode_frame, serial_envelope, TYPE_TEXT
+    from data_cleaner import process_logs
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        images = {(size, bit_depth): convert_image(IMAGE, bit_depth=bit_depth, size=size, dithering=False)
+                  for size in SIZES for bit_depth in BIT_DEPTHS}
+
+    for (size, bit_depth), compressed in images.items():
+        width, height = size
+        raw = zlib.decompress(compressed)
+        measure(results, f"unpack_pixels {width}x{height} {bit_depth}bpp",
+                lambda: unpack_pixels(raw, bit_depth, width, height), 5)
+    for (size, bit_depth), compressed in images.items():
+        if bit_depth != 4:
+            continue
+        hex_data = compressed.hex()
+        measure(results, f"reconstruct_from_hex {size[0]}x{size[1]} 4bpp",
+                lambda: reconstruct_image_from_hex(hex_data, "reconstructed.png", 4, size), 3)
+
+    # A burst as the Feather prints it: status lines mixed with forwarded frames
+    interface = SerialInterface(port="bench")
+    stream = bytearray()
+    for i in range(100):
+        stream += f"[FEATHER] [RSSI] -{60 + i % 30} dBm after packet {i}\r\n".encode("utf-8")
+        stream += serial_envelope(encode_frame(TYPE_TEXT, bytes(100), msg_id=i % 256, seq=0, total=1), -70)
+    stream = bytes(stream)
+    measure(results, f"serial process_buffer {len(stream)}B", lambda: interface.process_buffer(stream), 10)
+
+    # Parse the field logs, repeated so the directory looks like a season of tests
+    os.mkdir("logs")
+    for copy in range(25):
+        for filename in os.listdir(LOGS):
+            shutil.copy(os.path.join(LOGS, filename), os.path.join("logs", f"{copy}_{filename}.txt"))
+    measure(results, "process_logs 100 files", lambda: process_logs("logs", "radio_data.csv", "packets"), 5)
+
+
+def run_side(side, output):
+    results = {}
+    # Modules write logs and images to the working directory; keep those out of the tree
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        if side == "rover":
+            bench_rover(results)
+        else:
+            bench_basestation(results)
+    with open(output, "w") as f:
+        json.dump(results, f)
+
+
+def compare(results, baseline, threshold):
+    """Prints the change against the baseline and returns the names that regressed."""
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            print(f"[BENCH] {name:<36} new (no baseline)")
+            continue
+        ratio = result["us_per_op"] / baseline[name]["us_per_op"]
+        status = "REGRESSION" if ratio > 1 + threshold else "ok"
+        print(f"[BENCH] {name:<36} {100 * (ratio - 1):+7.1f}%  {status}")
+        if status != "ok":
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hot path benchmarks with a stored baseline")
+    parser.add_argument("--json", metavar="PATH", help="Write the results to PATH")
+    parser.add_argument("--baseline", default=BASELINE, help="Baseline JSON to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD,
+                        help="Fractional slowdown that counts as a regression (default 0.25)")
+    parser.add_argument("--side", choices=("rover", "basestation"), help=argparse.SUPPRESS)
+    parser.add_argument("--output", help=argparse.SUPPRESS)
+    options = parser.parse_args()
+
+    if options.side:
+        run_side(options.side, options.output)
+        return 0
+
+    results = {}
+    for side in ("rover", "basestation"):
+        print(f"[BENCH] --- {side} ---")
+        with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+            output = f.name
+        try:
+            subprocess.run([sys.executable, os.path.abspath(__file__), "--side", side, "--output", output], check=True)
+            with open(output) as f:
+                results.update(json.load(f))
+        finally:
+            os.remove(output)
+
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    if options.json:
+        with open(options.json, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"[BENCH] Results written to {options.json}")
+
+    if options.save_baseline:
+        with open(options.baseline, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"[BENCH] Baseline saved to {options.baseline}")
+        return 0
+
+    if not os.path.exists(options.baseline):
+        print(f"[BENCH] No baseline at {options.baseline}; run with --save-baseline first")
+        return 0
+    with open(options.baseline) as f:
+        baseline = json.load(f)
+    print(f"[BENCH] --- against baseline (python {baseline.get('python')}, {baseline.get('machine')}) ---")
+    regressions = compare(results, baseline["results"], options.threshold)
+    if regressions:
+        print(f"[BENCH] {len(regressions)} benchmark(s) slower than the baseline by more than "
+              f"{100 * options.threshold:.0f}%")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
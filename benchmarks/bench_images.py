@@ -0,0 +1,61 @@
+import contextlib
+import os
+import sys
+import timeit
+
+'''
+The image pipeline in rover_code/images.py with numpy (and Pillow) against
+its pure-Python fallback, at the sizes SCREENSHOT and CAMERA use. Each case
+also checks that both paths produce the same packed bytes. Run from the
+repository root:
+
+    python benchmarks/bench_images.py
+'''
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "rover_code"))
+
+import images
+
+IMAGE = os.path.join(ROOT, "rover_code", "img", "img.png")
+SIZES = ((64, 64), (128, 128), (256, 256))
+BIT_DEPTH = 4
+REPEAT = 3
+
+
+def run(dithering, size, resample="nearest"):
+    pixels = images.quantize_image(IMAGE, BIT_DEPTH, size, dithering, resample)
+    return images.pack_pixels(pixels, BIT_DEPTH)
+
+
+def best(stmt):
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        return min(timeit.repeat(stmt, number=1, repeat=REPEAT))
+
+
+def main():
+    if images.np is None:
+        print("[BENCH] numpy is not installed; nothing to compare")
+        return
+    np, pil = images.np, images.Image
+    for size in SIZES:
+        for dithering in (False, True):
+            label = f"{size[0]}x{size[1]} {BIT_DEPTH}bpp{' dither' if dithering else ''}"
+            fast = run(dithering, size)
+            fast_time = best(lambda: run(dithering, size))
+            images.np, images.Image = None, None
+            try:
+                slow = run(dithering, size)
+                slow_time = best(lambda: run(dithering, size))
+            finally:
+                images.np, images.Image = np, pil
+            assert fast == slow, f"{label}: numpy and pure Python output differ"
+            print(f"[BENCH] {label:<22} pure Python {slow_time * 1000:8.1f} ms, numpy {fast_time * 1000:7.1f} ms "
+                  f"({slow_time / fast_time:.1f}x), identical output")
+        area_time = best(lambda: run(False, size, "area"))
+        label = f"{size[0]}x{size[1]} {BIT_DEPTH}bpp area"
+        print(f"[BENCH] {label:<22} {'':>24} numpy {area_time * 1000:7.1f} ms (area resize, numpy only)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+'''
+Per-message cost of basestation logging under a burst of lines, as the
+serial reader produces while a transfer streams in: the old log_to_file
+(open, append, close per line) against the queued, group-committed logger
+(basestation_code/logger.py). "caller" is the time the logging thread
+spends per line; "on disk" includes waiting for the writer to flush the
+whole burst. Both logs are checked to hold every line in order. Run from
+the repository root:
+
+    python benchmarks/bench_logger.py [lines]
+'''
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "basestation_code"))
+
+import logger
+
+
+def old_log_to_file(path, message):
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]}    {message}\n")
+
+
+def check(path, lines):
+    with open(path, encoding="utf-8") as f:
+        logged = [line.split("    ", 1)[1].rstrip("\n") for line in f]
+    assert logged == lines, f"{path} does not hold the burst in order"
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    lines = [f"[FEATHER] [FILE #{i + 1}/{count}] [128 bytes] RSSI -{60 + i % 30}" for i in range(count)]
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "old.log")
+        start = time.perf_counter()
+        for line in lines:
+            old_log_to_file(path, line)
+        old = time.perf_counter() - start
+        check(path, lines)
+        print(f"[BENCH] open/append/close: {old / count * 1e6:6.1f} us per line ({old * 1000:.0f} ms for {count})")
+
+        for fsync_interval, label in ((None, "no fsync"), (1.0, "fsync every 1s"), (0, "fsync every group")):
+            path = os.path.join(workdir, f"queued {label}.log")
+            log = logger.AsyncLog(path, fsync_interval=fsync_interval)
+            start = time.perf_counter()
+            for line in lines:
+                log.write(line)
+            queued = time.perf_counter() - start
+            log.flush(timeout=60)
+            flushed = time.perf_counter() - start
+            check(path, lines)
+            print(f"[BENCH] queued, {label:<17}: caller {queued / count * 1e6:5.1f} us per line, "
+                  f"on disk {flushed / count * 1e6:5.1f} us per line ({old / flushed:.1f}x faster end to end)")
+
+
+if __name__ == "__main__":
+    main()
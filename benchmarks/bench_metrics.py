@@ -0,0 +1,62 @@
+import os
+import sys
+import time
+
+'''
+What the rover's metrics (rover_code/metrics.py) add to every packet sent:
+AirtimeScheduler.transmit through a radio that returns at once, with and
+without a Metrics attached, for send and for send_with_ack (which also
+estimates retries and records the ACK round trip). Also times STATS
+building its packed snapshot. Run from the repository root:
+
+    python benchmarks/bench_metrics.py [packets]
+'''
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "rover_code"))
+
+from airtime import AirtimeScheduler
+from metrics import Metrics
+
+
+class NullRadio:
+    ack_retries = 5
+    ack_wait = 0.5
+
+    def send(self, data, **kwargs):
+        return True
+
+    def send_with_ack(self, data):
+        return True
+
+
+def per_packet(scheduler, method, packets, repeats=5):
+    radio = NullRadio()
+    data = bytes(120)
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(packets):
+            scheduler.transmit(radio, method, data)
+        elapsed = (time.perf_counter() - start) / packets
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    packets = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    for method in ("send", "send_with_ack"):
+        plain = per_packet(AirtimeScheduler(NullRadio()), method, packets)
+        metrics = Metrics()
+        scheduler = AirtimeScheduler(NullRadio(), metrics=metrics)
+        scheduler.command = "ECHO"
+        measured = per_packet(scheduler, method, packets)
+        print(f"[BENCH] {method:<14}: {plain * 1e6:5.2f} µs/packet without metrics, {measured * 1e6:5.2f} µs with "
+              f"(+{(measured - plain) * 1e6:.2f} µs)")
+    start = time.perf_counter()
+    snapshot = metrics.pack()
+    print(f"[BENCH] STATS snapshot: {len(snapshot)} bytes packed in {(time.perf_counter() - start) * 1e3:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+import os
+import sys
+import zlib
+
+'''
+How early a progressive SCREENSHOT (rover_code/progressive.py) gives the
+operator a usable picture: bytes and 128-byte packets until each Adam7 pass
+can be drawn, and what the per-pass flushes cost against the plain zlib
+image. Every pass is decoded with the basestation's ProgressiveDecoder and the
+final image is checked against the rover's pixels. Run from the repository root:
+
+    python benchmarks/bench_progressive.py [packet size]
+'''
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "rover_code"))
+sys.path.insert(1, os.path.join(ROOT, "basestation_code"))
+
+from images import quantize_image, pack_pixels
+from progressive import encode_progressive
+from framing import HEADER_SIZE
+from reconstructor import ProgressiveDecoder
+
+SIZES = ((64, 64), (128, 128))
+BIT_DEPTHS = (2, 4)
+
+
+def main():
+    packet_size = int(sys.argv[1]) if len(sys.argv) > 1 else 128
+    chunk = packet_size - HEADER_SIZE
+    image = os.path.join(ROOT, "rover_code", "img", "img.png")
+    for size in SIZES:
+        for bit_depth in BIT_DEPTHS:
+            pixels = quantize_image(image, bit_depth, size, dithering=False)
+            plain = zlib.compress(pack_pixels(pixels, bit_depth))
+            data, pass_ends = encode_progressive(pixels, size, bit_depth)
+            decoder = ProgressiveDecoder(size[0], size[1], bit_depth)
+            decoder.feed(data)
+            scale = 255 // ((1 << bit_depth) - 1)
+            assert decoder.render() == [value * scale for value in pixels], f"{size} {bit_depth}bpp decoded differently"
+
+            packets = -(-len(data) // chunk)
+            print(f"[BENCH] {size[0]}x{size[1]} {bit_depth}bpp: plain {len(plain)} bytes, progressive {len(data)} "
+                  f"bytes ({100 * (len(data) / len(plain) - 1):+.0f}%), {packets} packets")
+            for number, end in enumerate(pass_ends):
+                decoder = ProgressiveDecoder(size[0], size[1], bit_depth)
+                decoder.feed(data[:end])
+                print(f"[BENCH]   pass {number + 1}: {end:5d} bytes, packet {-(-end // chunk):3d}/{packets}, "
+                      f"{100 * decoder.coverage:5.1f}% of pixels")
+
+
+if __name__ == "__main__":
+    main()
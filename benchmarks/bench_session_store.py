@@ -0,0 +1,93 @@
+import os
+import random
+import sys
+import tempfile
+import time
+import zlib
+
+'''
+DISPLAY after a restart as the history grows: the old scan of config.log
+(read every line, search backwards for the last SCREENSHOT) against the
+session store (basestation_code/session_store.py), which looks the session
+up by index and reads back only its packets. Each history holds the given
+numbers of 128x128 SCREENSHOT sessions of 36 chunks. Run from the
+repository root:
+
+    python benchmarks/bench_session_store.py [sessions ...]
+'''
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "basestation_code"))
+
+from framing import encode_frame, decode_frame, IMAGE_INFO, TYPE_IMAGE_INFO, TYPE_FILE, TYPE_END, CODEC_ZLIB
+from session_store import SessionStore
+from serial_utils.serial_interface import SerialInterface
+
+SIZE = 128
+CHUNK = 128
+
+
+def session_frames(rng, msg_id):
+    data = zlib.compress(bytes(rng.getrandbits(8) for _ in range(SIZE * SIZE // 2)), 9)
+    chunks = [data[i:i + CHUNK] for i in range(0, len(data), CHUNK)]
+    frames = [encode_frame(TYPE_IMAGE_INFO, IMAGE_INFO.pack(SIZE, SIZE, 4, CODEC_ZLIB), msg_id)]
+    frames += [encode_frame(TYPE_FILE, chunk, msg_id, seq, len(chunks)) for seq, chunk in enumerate(chunks)]
+    frames.append(encode_frame(TYPE_END, b"", msg_id))
+    return frames
+
+
+def old_display_scan(path):
+    with open(path, "r", encoding="utf-8") as f:
+        lines = f.readlines()
+    end_idx = None
+    for i in reversed(range(len(lines))):
+        if "[RX] Final packet received" in lines[i]:
+            end_idx = i
+        elif "[SEND] SCREENSHOT" in lines[i] and end_idx is not None:
+            return lines[i:end_idx + 1]
+    return None
+
+
+def best_of(run, repeats=5):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        assert run() is not None
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    counts = [int(arg) for arg in sys.argv[1:]] or [100, 1000, 5000]
+    rng = random.Random(1)
+    frames = session_frames(rng, 1)
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        log_path = os.path.join(workdir, "config.log")
+        store = SessionStore(os.path.join(workdir, "sessions.db"))
+        interface = SerialInterface(port="bench", store=store)
+        written = 0
+        for count in counts:
+            with open(log_path, "a", encoding="utf-8") as log:
+                for _ in range(count - written):
+                    log.write("2026-01-01 00:00:00.000    [SEND] SCREENSHOT img.png\n")
+                    store.start_session("SCREENSHOT img.png")
+                    for seq, frame in enumerate(frames):
+                        log.write(f"2026-01-01 00:00:00.000    [FEATHER] [FILE #{seq}/{len(frames)}] [128 bytes] RSSI -60\n")
+                        store.record_frame(frame, decode_frame(frame), -60)
+                    log.write("2026-01-01 00:00:00.000    [FEATHER] [RX] Final packet received. End of message stream.\n")
+            written = count
+
+            scan = best_of(lambda: old_display_scan(log_path))
+            lookup = best_of(lambda: interface.image_from_packets(
+                store.packets(store.latest_session(("SCREENSHOT", "CAMERA")))))
+            print(f"[BENCH] {count:5d} sessions ({os.path.getsize(log_path) / 1e6:5.1f} MB log, "
+                  f"{os.path.getsize(store.path) / 1e6:5.1f} MB store): log scan {scan * 1000:7.1f} ms, "
+                  f"session store {lookup * 1000:5.2f} ms")
+        store.close()
+        os.chdir(ROOT)
+
+
+if __name__ == "__main__":
+    main()
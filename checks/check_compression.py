@@ -0,0 +1,94 @@
+import contextlib
+import filecmp
+import io
+import os
+import sys
+import tempfile
+
+'''
+Checks that the rover and basestation copies of compression.py are
+identical, that a stream round-trips and one made with another dictionary
+version is refused, and that the HELP and CONFIG HELP text the rover sends
+now is still in the preset dictionary (regenerate the samples and bump
+DICTIONARY_VERSION when a command or option is added). Exits with status 1
+on a mismatch:
+
+    python checks/check_compression.py
+'''
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "rover_code"))
+
+import compression
+
+
+class SilentRadio:
+    def send(self, data, **kwargs):
+        return True
+
+    def send_with_ack(self, data):
+        return True
+
+    def receive(self, **kwargs):
+        return None
+
+
+def check_copies():
+    assert filecmp.cmp(os.path.join(ROOT, "rover_code", "compression.py"),
+                       os.path.join(ROOT, "basestation_code", "compression.py"), shallow=False), \
+        "rover_code/compression.py and basestation_code/compression.py differ"
+
+
+def check_round_trip():
+    text = b"Valid commands: MOVE, LED, STATUS"
+    stream = compression.compress(text)
+    assert stream[0] == compression.DICTIONARY_VERSION, "stream does not start with DICTIONARY_VERSION"
+    assert compression.decompress(stream) == text, "round trip changed the text"
+    try:
+        compression.decompress(bytes([compression.DICTIONARY_VERSION - 1]) + stream[1:])
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("a stream with another dictionary version was accepted")
+
+
+def rover_texts():
+    """What HELP and CONFIG HELP send, from a CommandHandler with every command registered."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        from command_handler import CommandHandler
+        handler = CommandHandler(SilentRadio())
+    sent = []
+    handler.send_response = lambda response, *args, **kwargs: sent.append(response)
+    handler.send_final_token = lambda *args, **kwargs: None
+    handler.commands["HELP"].execute([], handler)
+    handler.commands["CONFIG"].execute(["HELP"], handler)
+    return sent
+
+
+def check_samples():
+    dictionary = compression.ZDICT.decode("utf-8")
+    for text in rover_texts():
+        assert text in dictionary, f"not in the preset dictionary, regenerate the samples: {text.splitlines()[0]}"
+
+
+def main():
+    check_copies()
+    check_round_trip()
+    # The handler writes its logs to the working directory
+    with tempfile.TemporaryDirectory() as workdir:
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            check_samples()
+        finally:
+            os.chdir(cwd)
+    print(f"[CHECK] compression.py copies identical; dictionary version {compression.DICTIONARY_VERSION} "
+          "covers HELP and CONFIG HELP")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except AssertionError as e:
+        print(f"[CHECK] FAILED: {e}")
+        sys.exit(1)
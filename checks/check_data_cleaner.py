@@ -0,0 +1,74 @@
+import contextlib
+import filecmp
+import io
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+'''
+Regenerates collected_data/long_range_radio_data.csv from collected_data/logs
+into a temporary directory and checks it matches the tracked file, then
+parses a log in the format the framed basestation writes
+(serial_interface.handle_frame: [RECEIVED #n/total] [frame bytes]) and
+checks the packet numbers and payload sizes. Exits with status 1 on a
+mismatch:
+
+    python checks/check_data_cleaner.py
+'''
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+DATA = os.path.join(ROOT, "collected_data")
+sys.path.insert(0, DATA)
+
+import data_cleaner
+
+# ECHO replies of 12 and 50 bytes, each followed by its [THROUGHPUT] line; sizes include the 10-byte frame header
+FRAMED_LOG = """\
+2026-05-02 14:03:10.120    [SEND] ECHO 1 hello world!
+2026-05-02 14:03:10.480    [FEATHER] [RECEIVED #1/1] [22 bytes]: hello world!
+2026-05-02 14:03:10.620    [FEATHER] [RECEIVED #1/1] [70 bytes]: [THROUGHPUT] 33.33 bytes/sec | [LATENCY] 0.3600 sec/packet
+2026-05-02 14:03:10.700    [FEATHER] [RX] Final packet received. End of message stream.
+2026-05-02 14:03:12.000    [SEND] ECHO 2 {payload}
+2026-05-02 14:03:12.510    [FEATHER] [RECEIVED #1/2] [60 bytes]: {payload}
+2026-05-02 14:03:12.990    [FEATHER] [RECEIVED #2/2] [60 bytes]: {payload}
+2026-05-02 14:03:13.150    [FEATHER] [RECEIVED #1/1] [71 bytes]: [THROUGHPUT] 104.17 bytes/sec | [LATENCY] 0.4800 sec/packet
+""".format(payload="x" * 50)
+FRAMED_RECORDS = [(1, 12), (2, 50)]  # (packet #, payload size)
+
+
+def check_csv(workdir):
+    csv_path = os.path.join(workdir, "long_range_radio_data.csv")
+    with contextlib.redirect_stdout(io.StringIO()):
+        data_cleaner.process_logs(os.path.join(DATA, "logs"), csv_path, os.path.join(workdir, "packets"))
+    assert filecmp.cmp(csv_path, os.path.join(DATA, "long_range_radio_data.csv"), shallow=False), \
+        "regenerated long_range_radio_data.csv differs from the tracked one"
+
+
+def check_framed(workdir):
+    logs = os.path.join(workdir, "framed_logs")
+    os.mkdir(logs)
+    with open(os.path.join(logs, "tests_in_parking_lot.log"), "w") as f:
+        f.write(FRAMED_LOG)
+    out = os.path.join(workdir, "framed_packets")
+    with contextlib.redirect_stdout(io.StringIO()):
+        data_cleaner.process_logs(logs, os.path.join(workdir, "framed.csv"), out)
+    records = list(zip(np.load(os.path.join(out, "packet.npy")).tolist(),
+                       np.load(os.path.join(out, "payload.npy")).tolist()))
+    assert records == FRAMED_RECORDS, f"framed log parsed as {records}, expected {FRAMED_RECORDS}"
+
+
+def main():
+    with tempfile.TemporaryDirectory() as workdir:
+        check_csv(workdir)
+        check_framed(workdir)
+    print("[CHECK] long_range_radio_data.csv regenerates unchanged; framed log records OK")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except AssertionError as e:
+        print(f"[CHECK] FAILED: {e}")
+        sys.exit(1)
@@ -0,0 +1,99 @@
+import filecmp
+import importlib.util
+import os
+import sys
+
+'''
+Golden vectors for the binary frame format, run against each copy of
+framing.py (rover, Feather, basestation), once with binascii.crc_hqx and
+once with the table CRC CircuitPython uses. Also checks that the copies of
+framing.py and payloads.py are identical. Run from anywhere; exits with
+status 1 on the first mismatch:
+
+    python checks/check_framing.py
+'''
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+COPIES = {
+    "framing.py": ("rover_code", "adafruit_feather_code", "basestation_code"),
+    "payloads.py": ("rover_code", "basestation_code"),
+}
+
+# (description, frame built by a framing module, expected hex). Any change here is a
+# wire format change: bump FRAME_VERSION and update every copy together.
+GOLDEN_VECTORS = [
+    ("end of stream",
+     lambda f: f.encode_frame(f.TYPE_END, msg_id=7),
+     "a1030007000000015f73"),
+    ("text chunk",
+     lambda f: f.encode_frame(f.TYPE_TEXT, b"Rover is online", msg_id=1, seq=0, total=1),
+     "a101000100000001b207526f766572206973206f6e6c696e65"),
+    ("polled file chunk",
+     lambda f: f.encode_frame(f.TYPE_FILE, bytes(range(16)), msg_id=0x42, seq=300, total=512, flags=f.FLAG_POLL),
+     "a1020142012c020051d6000102030405060708090a0b0c0d0e0f"),
+    ("image info",
+     lambda f: f.encode_frame(f.TYPE_IMAGE_INFO, f.IMAGE_INFO.pack(64, 64, 4, f.CODEC_ZLIB), msg_id=9),
+     "a1040009000000011fb0004000400400"),
+    ("command batch",
+     lambda f: f.encode_frame(f.TYPE_BATCH, f.pack_batch(["STATUS", "LED ON"])),
+     "a107000000000001d70b5354415455530a4c4544204f4e"),
+    ("batch status",
+     lambda f: f.encode_frame(f.TYPE_STATUS, bytes([f.STATUS_OK]) + b"LED ON", msg_id=3, seq=1, total=2),
+     "a108000300010002e2b1004c4544204f4e"),
+    ("serial envelope",
+     lambda f: f.serial_envelope(f.encode_frame(f.TYPE_END, msg_id=7), -87),
+     "fe0aa9a1030007000000015f73"),
+]
+
+
+def load(directory):
+    path = os.path.join(ROOT, directory, "framing.py")
+    spec = importlib.util.spec_from_file_location(f"framing_{directory}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def check_vectors(framing, label):
+    assert framing.crc16(b"123456789") == 0x29B1, f"{label}: CRC-16/CCITT-FALSE check value"
+    for description, build, expected in GOLDEN_VECTORS:
+        frame = build(framing)
+        assert frame.hex() == expected, f"{label}: {description}: {frame.hex()} != {expected}"
+        if description == "serial envelope":
+            continue
+        decoded = framing.decode_frame(frame)
+        assert framing.encode_frame(decoded.type, decoded.payload, decoded.msg_id, decoded.seq,
+                                    decoded.total, decoded.flags) == frame, f"{label}: {description} round trip"
+    corrupted = bytearray(GOLDEN_VECTORS[1][1](framing))
+    corrupted[-1] ^= 0x01
+    try:
+        framing.decode_frame(corrupted)
+    except framing.FrameError:
+        pass
+    else:
+        raise AssertionError(f"{label}: corrupted frame was accepted")
+
+
+def main():
+    for name, directories in COPIES.items():
+        first = os.path.join(ROOT, directories[0], name)
+        for directory in directories[1:]:
+            assert filecmp.cmp(first, os.path.join(ROOT, directory, name), shallow=False), \
+                f"{directory}/{name} differs from {directories[0]}/{name}"
+    for directory in COPIES["framing.py"]:
+        framing = load(directory)
+        check_vectors(framing, directory)
+        # The CircuitPython build has no crc_hqx and falls back to the table
+        framing.crc_hqx = None
+        framing._CRC_TABLE = framing._make_crc_table()
+        check_vectors(framing, f"{directory} (table CRC)")
+    print(f"[CHECK] framing.py and payloads.py copies identical; {len(GOLDEN_VECTORS)} golden vectors OK "
+          f"in {len(COPIES['framing.py'])} copies")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except AssertionError as e:
+        print(f"[CHECK] FAILED: {e}")
+        sys.exit(1)
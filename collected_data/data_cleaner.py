@@ -1,51 +1,314 @@
+import argparse
+import csv
 import os
 import re
-from collections import defaultdict
+import shutil
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+'''
+Turns the field test logs in logs/ (.log and .txt) into per-packet records
+and long_range_radio_data.csv.
+
+Every [THROUGHPUT] line and the [RECEIVED #n] [size bytes] (or [SEND] ECHO)
+line before it make one record; logs from the framed basestation write
+[RECEIVED #n/total] [size bytes] with the frame header in the size, which is
+taken off again. A record is: timestamp, packet #, payload size,
+throughput and latency, plus the location the file was recorded at. The
+logs are split into chunks of about CHUNK_BYTES at line boundaries and
+parsed by a process pool; each chunk comes back as NumPy columns and per
+payload size sums, which are appended to the column files in order as they
+arrive. At most two chunks per worker are in flight, so memory stays flat
+however large the logs are; with one worker, or less than INLINE_BYTES of
+logs, the chunks are parsed in this process instead. The records end up in
+packets/<column>.npy (np.load(..., mmap_mode="r") reads them without loading
+them) and the per location and payload averages in the CSV.
+
+    python data_cleaner.py [logs] [--workers 4] [--csv long_range_radio_data.csv] [--out packets]
+'''
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CHUNK_BYTES = 8 * 1024 * 1024
+INLINE_BYTES = CHUNK_BYTES  # Less than this in total is parsed in this process; a pool takes longer to start
+PREVIOUS_LINE_LIMIT = 4096  # A chunk's first [THROUGHPUT] line needs the line before the chunk
+FRAME_HEADER_SIZE = 10  # framing.HEADER_SIZE, counted in [RECEIVED #n/total] sizes
+
+# Log file name (tests_in_<key>.log) -> location as in the CSV, distance from the basestation (ft)
+LOCATIONS = {
+    "parking_lot": ("ECE Parking Lot", 250),
+    "weblin": ("Werblin Bus Stop", 850),
+    "athletic": ("Athletic Parking Lot", 1700),
+    "shi": ("SHI STADIUM", 3000),
+}
+
+COLUMNS = {
+    "timestamp": "datetime64[ms]",
+    "packet": np.int32,
+    "payload": np.int32,
+    "throughput": np.float64,
+    "latency": np.float64,
+    "location": np.int16,   # Index into locations.npy
+}
+
+METRICS = re.compile(rb'\[THROUGHPUT\] ([\d.]+) bytes/sec \| \[LATENCY\] ([\d.]+) sec/packet')
+RECEIVED = re.compile(rb'\[RECEIVED #(\d+)(/\d+)?\] \[(\d+) bytes\]')
+BYTE_SIZE = re.compile(rb'\[(\d+) bytes\]')
+ECHO = re.compile(rb'\[SEND\] ECHO \d+ (\S+)')  # The rover answers with the same payload
 
-def extract_metrics(line):
-    """Extracts throughput and latency values from a line."""
-    throughput_match = re.search(r'\[THROUGHPUT\] ([\d.]+) bytes/sec', line)
-    latency_match = re.search(r'\[LATENCY\] ([\d.]+) sec/packet', line)
-    if throughput_match and latency_match:
-        return float(throughput_match.group(1)), float(latency_match.group(1))
-    return None, None
 
 def extract_byte_size(line):
-    """Extracts the byte size from a line like: [128 bytes]"""
-    match = re.search(r'\[(\d+) bytes\]', line)
-    return int(match.group(1)) if match else None
+    """
+    Extracts the packet number and byte size from a line like
+    [RECEIVED #5] [128 bytes] or [RECEIVED #5/8] [138 bytes] (a frame), or
+    the size of an ECHO payload sent (packet -1).
+    """
+    match = RECEIVED.search(line)
+    if match:
+        return received_fields(match)
+    match = BYTE_SIZE.search(line)
+    if match:
+        return -1, int(match.group(1))
+    match = ECHO.search(line)
+    return (-1, len(match.group(1))) if match else (None, None)
+
+
+def received_fields(match):
+    """(packet #, payload size) of a RECEIVED match, without the frame header of framed logs."""
+    size = int(match.group(3))
+    if match.group(2):
+        size -= FRAME_HEADER_SIZE
+    return int(match.group(1)), size
+
+
+def location_of(path):
+    """(location, distance) of a log file; unknown files go by their name, without a distance."""
+    name = os.path.splitext(os.path.basename(path))[0]
+    key = name[len("tests_in_"):] if name.startswith("tests_in_") else name
+    return LOCATIONS.get(key, (name, None))
+
+
+def log_files(directory):
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                  if name.endswith((".log", ".txt")))
+
+
+def split_chunks(path, chunk_bytes=CHUNK_BYTES):
+    """(start, end) byte ranges of a file that start and end on line boundaries."""
+    size = os.path.getsize(path)
+    chunks = []
+    start = 0
+    with open(path, "rb") as f:
+        while start < size:
+            f.seek(min(start + chunk_bytes, size))
+            f.readline()  # Up to the end of the line the boundary falls in
+            end = min(f.tell(), size)
+            chunks.append((start, end))
+            start = end
+    return chunks
+
+
+def previous_line(f, start):
+    """The line that ends right before byte start, or b"" if it is too long to look for."""
+    if start == 0:
+        return b""
+    f.seek(max(0, start - PREVIOUS_LINE_LIMIT))
+    lines = f.read(start - f.tell()).splitlines()
+    return lines[-1] if lines else b""
+
+
+def parse_chunk(task):
+    """Parses one chunk of a log; returns its columns and per payload size sums."""
+    path, start, end, location = task
+    with open(path, "rb") as f:
+        data = previous_line(f, start) + b"\n"
+        f.seek(start)
+        data += f.read(end - start)
+
+    # The regex engine finds the [THROUGHPUT] lines; only those and the lines before them are looked at in Python
+    timestamps, packets, payloads, throughputs, latencies = [], [], [], [], []
+    rfind = data.rfind
+    received = RECEIVED.search
+    for match in METRICS.finditer(data):
+        line_start = rfind(b"\n", 0, match.start()) + 1
+        if line_start == 0:
+            continue  # The line before the chunk, already parsed with the chunk before
+        previous_start = rfind(b"\n", 0, line_start - 1) + 1
+        sizes = received(data, previous_start, line_start - 1)
+        if sizes:
+            packet, byte_size = received_fields(sizes)
+        else:
+            packet, byte_size = extract_byte_size(data[previous_start:line_start - 1])
+            if byte_size is None:
+                continue
+        throughput, latency = match.group(1, 2)
+        timestamps.append(data[line_start:line_start + 23])
+        packets.append(packet)
+        payloads.append(byte_size)
+        throughputs.append(float(throughput))
+        latencies.append(float(latency))
+
+    try:
+        stamps = np.array(timestamps, dtype="S23").astype("datetime64[ms]")
+    except ValueError:
+        stamps = np.array([parse_timestamp(stamp) for stamp in timestamps], dtype="datetime64[ms]")
+    columns = {
+        "timestamp": stamps,
+        "packet": np.array(packets, dtype=COLUMNS["packet"]),
+        "payload": np.array(payloads, dtype=COLUMNS["payload"]),
+        "throughput": np.array(throughputs, dtype=COLUMNS["throughput"]),
+        "latency": np.array(latencies, dtype=COLUMNS["latency"]),
+        "location": np.full(len(packets), location, dtype=COLUMNS["location"]),
+    }
+    return columns, aggregate(columns["payload"], columns["throughput"], columns["latency"])
+
+
+def parse_timestamp(stamp):
+    try:
+        return np.datetime64(stamp.decode("ascii"), "ms")
+    except (UnicodeDecodeError, ValueError):
+        return np.datetime64("NaT")
+
+
+def aggregate(payloads, throughputs, latencies):
+    """payload size -> [count, throughput sum, latency sum, max throughput, min latency], vectorized."""
+    if not len(payloads):
+        return {}
+    sizes, groups = np.unique(payloads, return_inverse=True)
+    counts = np.bincount(groups)
+    throughput_sums = np.bincount(groups, weights=throughputs)
+    latency_sums = np.bincount(groups, weights=latencies)
+    max_throughput = np.full(len(sizes), -np.inf)
+    np.maximum.at(max_throughput, groups, throughputs)
+    min_latency = np.full(len(sizes), np.inf)
+    np.minimum.at(min_latency, groups, latencies)
+    # As Python numbers: merge() and the CSV rows do scalar arithmetic on them, which is slow on NumPy scalars
+    return {size: list(sums) for size, *sums in zip(sizes.tolist(), counts.tolist(), throughput_sums.tolist(),
+                                                     latency_sums.tolist(), max_throughput.tolist(),
+                                                     min_latency.tolist())}
+
+
+def merge(totals, location, groups):
+    for size, (count, throughput, latency, highest, lowest) in groups.items():
+        total = totals.setdefault((location, size), [0, 0.0, 0.0, -np.inf, np.inf])
+        total[0] += count
+        total[1] += throughput
+        total[2] += latency
+        total[3] = max(total[3], highest)
+        total[4] = min(total[4], lowest)
+
+
+class ColumnWriter:
+    """Appends columns chunk by chunk to raw files and turns them into .npy files at the end."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.rows = 0
+        self.files = {name: open(os.path.join(directory, name + ".raw"), "wb") for name in COLUMNS}
+
+    def append(self, columns):
+        for name, values in columns.items():
+            self.files[name].write(values.tobytes())
+        self.rows += len(columns["packet"])
+
+    def finish(self, locations):
+        for name, raw in self.files.items():
+            raw.close()
+            with open(raw.name, "rb") as source, open(os.path.join(self.directory, name + ".npy"), "wb") as target:
+                header = {"descr": np.lib.format.dtype_to_descr(np.dtype(COLUMNS[name])), "fortran_order": False,
+                          "shape": (self.rows,)}
+                np.lib.format.write_array_header_2_0(target, header)
+                shutil.copyfileobj(source, target, 1024 * 1024)
+            os.remove(raw.name)
+        np.save(os.path.join(self.directory, "locations.npy"), np.array(locations))
+
+
+def process_logs(directory=os.path.join(HERE, "logs"), csv_path=os.path.join(HERE, "long_range_radio_data.csv"),
+                 out=os.path.join(HERE, "packets"), workers=None, chunk_bytes=CHUNK_BYTES):
+    files = log_files(directory)
+    places = [location_of(path) for path in files]
+    tasks = [(path, start, end, index) for index, path in enumerate(files)
+             for start, end in split_chunks(path, chunk_bytes)]
+
+    totals = {}  # (file index, payload size) -> [count, sums, extremes]
+    writer = ColumnWriter(out)
+    for task, (columns, groups) in parse_in_order(tasks, workers):
+        writer.append(columns)
+        merge(totals, task[3], groups)
+    writer.finish([name for name, _ in places])
+
+    rows = averages(places, totals)
+    write_csv(csv_path, rows)
+    for key, (location, _, size, throughput, latency, _, _) in zip(sorted_keys(places, totals), rows):
+        count = totals[key][0]
+        print(f"[{location}] [{size} bytes] → Avg Throughput: {throughput:.2f} bytes/sec | "
+              f"Avg Latency: {latency:.4f} sec/packet ({count} packets)")
+
+    if totals:
+        print("\n🔺 Highest Throughput:", f"{max(total[3] for total in totals.values()):.2f} bytes/sec")
+        print("🔻 Lowest Latency:", f"{min(total[4] for total in totals.values()):.4f} sec/packet")
+    print(f"\n{writer.rows} packets from {len(files)} logs in {len(tasks)} chunks → {out}/, {csv_path}")
+    return totals
+
+
+def parse_in_order(tasks, workers=None):
+    """Yields (task, parse_chunk(task)) in task order, keeping two chunks per worker in flight."""
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or sum(end - start for _, start, end, _ in tasks) < INLINE_BYTES:
+        for task in tasks:
+            yield task, parse_chunk(task)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        running = deque()
+        for task in tasks:
+            running.append((task, pool.submit(parse_chunk, task)))
+            if len(running) >= 2 * workers:
+                task, future = running.popleft()
+                yield task, future.result()
+        while running:
+            task, future = running.popleft()
+            yield task, future.result()
+
 
-def process_logs(directory='logs'):
-    byte_groups = defaultdict(list)
+def sorted_keys(places, totals):
+    """(file index, payload size) keys, nearest location first."""
+    return sorted(totals, key=lambda key: (places[key[0]][1] is None, places[key[0]][1] or 0, key[0], key[1]))
 
-    for filename in os.listdir(directory):
-        if filename.endswith(".txt"):
-            filepath = os.path.join(directory, filename)
 
-            with open(filepath, 'r') as file:
-                lines = file.readlines()
+def averages(places, totals):
+    """CSV rows of the per location and payload averages."""
+    rows = []
+    for index, size in sorted_keys(places, totals):
+        count, throughput_sum, latency_sum, _, _ = totals[(index, size)]
+        location, distance = places[index]
+        throughput = round(throughput_sum / count, 3)
+        latency = round(latency_sum / count, 3)
+        rows.append((location, distance if distance is not None else "", size, throughput, latency,
+                     throughput / size, latency / throughput))
+    return rows
 
-            for i in range(1, len(lines)):
-                if '[THROUGHPUT]' in lines[i]:
-                    byte_size = extract_byte_size(lines[i - 1])
-                    throughput, latency = extract_metrics(lines[i])
-                    if byte_size is not None and throughput is not None and latency is not None:
-                        byte_groups[byte_size].append((throughput, latency))
 
-    # Calculate averages and track max/min
-    highest_throughput = float('-inf')
-    lowest_latency = float('inf')
+def write_csv(path, rows):
+    with open(path, "w", newline="") as f:
+        out = csv.writer(f, lineterminator="\n")
+        out.writerow(["Location", "Distance", "Payload Size", "Throughput", "Latency", "Efficiency",
+                      "Latency_to_Throughput"])
+        out.writerows(rows)
 
-    for byte_size, metrics in byte_groups.items():
-        avg_throughput = sum(m[0] for m in metrics) / len(metrics)
-        avg_latency = sum(m[1] for m in metrics) / len(metrics)
-        print(f"[{byte_size} bytes] → Avg Throughput: {avg_throughput:.2f} bytes/sec | Avg Latency: {avg_latency:.4f} sec/packet")
 
-        highest_throughput = max(highest_throughput, *[m[0] for m in metrics])
-        lowest_latency = min(lowest_latency, *[m[1] for m in metrics])
+def main():
+    parser = argparse.ArgumentParser(description="Parse field test logs into per-packet records and averages")
+    parser.add_argument("directory", nargs="?", default=os.path.join(HERE, "logs"))
+    parser.add_argument("--csv", default=os.path.join(HERE, "long_range_radio_data.csv"))
+    parser.add_argument("--out", default=os.path.join(HERE, "packets"), help="Directory for the .npy columns")
+    parser.add_argument("--workers", type=int, default=None, help="Processes (default: one per CPU)")
+    parser.add_argument("--chunk-mb", type=float, default=CHUNK_BYTES / (1024 * 1024))
+    options = parser.parse_args()
+    process_logs(options.directory, options.csv, options.out, options.workers, int(options.chunk_mb * 1024 * 1024))
 
-    print("\n🔺 Highest Throughput:", f"{highest_throughput:.2f} bytes/sec")
-    print("🔻 Lowest Latency:", f"{lowest_latency:.4f} sec/packet")
 
 # Run the processing
-process_logs()
+if __name__ == "__main__":
+    main()
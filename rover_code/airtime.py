@@ -0,0 +1,322 @@
+import math
+import threading
+from functools import lru_cache
+import time
+from collections import deque
+from executor import current_job, CommandCancelled, PRIORITY_CONTROL, PRIORITY_NORMAL
+from framing import HEADER_SIZE
+from windowed_transfer import chunk_payload, ACK_BITMAP
+
+'''
+LoRa time-on-air accounting and a duty-cycle budget for everything the rover
+transmits.
+
+CommandHandler wraps its radio in a ScheduledRadio, so every send and
+send_with_ack a command makes (responses, final tokens, file frames, RESEND)
+is charged to an AirtimeScheduler. Under the executor it wraps the
+RadioProxy, so a command waiting for budget blocks its own worker, never the
+radio thread. The link ACKs the driver sends by itself for each command frame
+it receives do not pass through here, so the budget leaves them out (one
+5-byte packet, about 30 ms at SF7, per command).
+
+The scheduler computes each packet's time on air from the radio's spreading
+factor, bandwidth and coding rate and keeps the airtime of the last `window`
+seconds. The modem settings are read from the driver once, since each read is
+a register access, and again after one is set through the ScheduledRadio.
+With a duty cycle set (CONFIG DUTY_CYCLE), a transmission that would exceed
+the budget waits until enough old airtime has aged out. Control traffic
+(STOP, STATUS, ...) may use the whole budget; everything else leaves
+CONTROL_RESERVE of it free, and waits while a control packet is waiting, so
+STOP gets through even during a long transfer.
+
+estimate_transfer() predicts how long an image transfer will take; commands
+report it before sending and decline transfers longer than CONFIG MAX_ETA
+unless the operator adds FORCE.
+'''
+
+RH_HEADER_SIZE = 4          # RadioHead header (destination, node, identifier, flags)
+ACK_PAYLOAD = 1             # adafruit_rfm9x ACKs carry b"!" after the header
+DEFAULT_SF = 7
+DEFAULT_BW = 125000
+DEFAULT_CR = 5              # Coding rate denominator, 4/5
+PREAMBLE = 8
+MODEM_SETTINGS = ("spreading_factor", "signal_bandwidth", "coding_rate", "preamble_length")
+
+DUTY_WINDOW = 3600.0        # Rolling window of the duty-cycle budget (s)
+CONTROL_RESERVE = 0.1       # Share of the budget only control traffic may use
+WAIT_STEP = 0.5             # Longest sleep between budget checks while waiting (s)
+ACK_DELAY = 0.1             # Receiver ACK delay during stop-and-wait file transfers (file_sender.py)
+PACKET_GAP = 0.1            # Sleep between stop-and-wait file frames (file_sender.py)
+TURNAROUND = 0.05           # Radio mode switch and processing per ACK round trip (s)
+RETRY_COST = 2.0            # ack_waits an unanswered try costs: the wait, then a random back-off of 1-2 ack_wait
+
+
+@lru_cache(maxsize=1024)
+def time_on_air(payload_size, sf=DEFAULT_SF, bw=DEFAULT_BW, cr=DEFAULT_CR, preamble=PREAMBLE,
+                explicit_header=True, crc=True):
+    """Seconds on air for a LoRa packet of payload_size bytes (Semtech AN1200.13)."""
+    symbol = (2 ** sf) / bw
+    low_data_rate = 1 if symbol > 0.016 else 0
+    bits = 8 * payload_size - 4 * sf + 28 + (16 if crc else 0) - (0 if explicit_header else 20)
+    payload_symbols = 8 + max(math.ceil(bits / (4 * (sf - 2 * low_data_rate))) * cr, 0)
+    return (preamble + 4.25) * symbol + payload_symbols * symbol
+
+
+class _Context(threading.local):
+    command = None  # Set by the command setter; None means the current job's
+
+
+class AirtimeScheduler:
+    def __init__(self, rfm9x, duty_cycle=0.0, window=DUTY_WINDOW, metrics=None):
+        self.rfm9x = rfm9x
+        self.metrics = metrics          # metrics.Metrics fed with every transmission, if given
+        self.duty_cycle = duty_cycle    # Fraction of time the rover may transmit, 0 = no limit
+        self.window = window
+        self.history = deque()          # (end time, airtime) of recent transmissions
+        self.spent = 0.0                # Sum of the airtime in history
+        self.lock = threading.Lock()
+        self.control_waiting = 0
+        self.stats = {}                 # command -> {"packets", "bytes", "airtime", "waited"}
+        self._context = _Context()
+        self._modem = None              # Cached modem(), cleared by modem_changed()
+
+    @property
+    def command(self):
+        """Command the calling thread transmits for; defaults to the current job's."""
+        command = self._context.command
+        if command is None:
+            job = current_job()
+            command = job.name if job else "OTHER"
+        return command
+
+    @command.setter
+    def command(self, value):
+        self._context.command = value
+
+    def modem(self):
+        """(spreading factor, bandwidth, coding rate, preamble) the radio is set to."""
+        modem = self._modem
+        if modem is None:
+            modem = self._modem = (getattr(self.rfm9x, "spreading_factor", DEFAULT_SF),
+                                   getattr(self.rfm9x, "signal_bandwidth", DEFAULT_BW),
+                                   getattr(self.rfm9x, "coding_rate", DEFAULT_CR),
+                                   getattr(self.rfm9x, "preamble_length", PREAMBLE))
+        return modem
+
+    def modem_changed(self):
+        """Makes the next modem() read the settings from the radio again."""
+        self._modem = None
+
+    def packet_airtime(self, size):
+        """Time on air of one packet of size bytes as handed to rfm9x.send (RadioHead header added)."""
+        sf, bw, cr, preamble = self.modem()
+        return time_on_air(size + RH_HEADER_SIZE, sf, bw, cr, preamble)
+
+    def budget(self):
+        """Seconds of airtime allowed per window, or None without a duty-cycle limit."""
+        if not self.duty_cycle:
+            return None
+        return self.duty_cycle * self.window
+
+    def used(self, now=None):
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            self._expire(now)
+            return self.spent
+
+    def _expire(self, now):
+        """Drops transmissions that left the window. Call with the lock held."""
+        while self.history and self.history[0][0] <= now - self.window:
+            self.spent -= self.history.popleft()[1]
+        if not self.history:
+            self.spent = 0.0  # Drop accumulated rounding error
+
+    def available(self, priority=PRIORITY_NORMAL, now=None):
+        """Airtime that may be spent right now at priority, or None without a limit."""
+        budget = self.budget()
+        if budget is None:
+            return None
+        if priority != PRIORITY_CONTROL:
+            budget *= 1 - CONTROL_RESERVE
+        return max(0.0, budget - self.used(now))
+
+    def _delay(self, airtime, priority, now):
+        """Seconds until airtime fits the budget at priority."""
+        budget = self.budget()
+        if budget is None:
+            return 0.0
+        if priority != PRIORITY_CONTROL:
+            budget *= 1 - CONTROL_RESERVE
+        if airtime > budget:
+            return 0.0  # Could never fit; send rather than stall forever
+        with self.lock:
+            used = self.spent
+            if used + airtime <= budget:
+                return 0.0
+            # Wait until enough of the oldest airtime has aged out of the window
+            for end, spent in self.history:
+                used -= spent
+                if used + airtime <= budget:
+                    return max(end + self.window - now, 0.0)
+        return self.window
+
+    def acquire(self, airtime, priority=None):
+        """Blocks until airtime fits the duty-cycle budget. Returns the seconds waited."""
+        job = current_job()
+        if priority is None:
+            priority = job.priority if job else PRIORITY_NORMAL
+        waited = 0.0
+        announced = False
+        control = priority == PRIORITY_CONTROL
+        if control:
+            with self.lock:
+                self.control_waiting += 1
+        try:
+            while True:
+                now = time.monotonic()
+                self.used(now)
+                if not control and self.control_waiting:
+                    delay = WAIT_STEP  # A control packet is waiting for budget; it goes first
+                else:
+                    delay = self._delay(airtime, priority, now)
+                    if delay <= 0:
+                        return waited
+                    if not announced:
+                        print(f"[AIRTIME] Duty cycle budget used up; waiting {delay:.1f}s")
+                        announced = True
+                if job is not None and job.cancel.is_set():
+                    raise CommandCancelled("waiting for airtime")
+                step = min(delay, WAIT_STEP)
+                time.sleep(step)
+                waited += step
+        finally:
+            if control:
+                with self.lock:
+                    self.control_waiting -= 1
+
+    def record(self, size, airtime, waited=0.0, packets=1, command=None):
+        """Charges packets sends of size bytes to the budget and to command (default: the calling thread's)."""
+        command = command or self.command
+        airtime *= packets
+        now = time.monotonic()
+        with self.lock:
+            self._expire(now)
+            self.history.append((now, airtime))
+            self.spent += airtime
+            entry = self.stats.get(command)
+            if entry is None:
+                entry = self.stats[command] = {"packets": 0, "bytes": 0, "airtime": 0.0, "waited": 0.0}
+            entry["packets"] += packets
+            entry["bytes"] += size * packets
+            entry["airtime"] += airtime
+            entry["waited"] += waited
+
+    def transmit(self, radio, method, data, **kwargs):
+        """Sends data with radio.send or radio.send_with_ack once the budget allows it."""
+        size = len(data)
+        airtime = self.packet_airtime(size)
+        # Without a duty-cycle limit nothing ever waits
+        waited = self.acquire(airtime) if self.duty_cycle else 0.0
+        start = time.monotonic()
+        ok = getattr(radio, method)(data, **kwargs)
+        elapsed = time.monotonic() - start
+        # An unacknowledged packet went out once per retry
+        repeats = 1
+        if method == "send_with_ack" and not ok:
+            repeats = max(1, getattr(radio, "ack_retries", 1))
+        command = self.command
+        self.record(size, airtime, waited, repeats, command)
+        if self.metrics is not None:
+            self.record_metrics(radio, method, size, ok, elapsed, command)
+        return ok
+
+    def record_metrics(self, radio, method, size, ok, elapsed, command=None):
+        """
+        Counts a transmission for command (default: the calling thread's). The
+        driver does not report how many tries send_with_ack took, so retries are
+        estimated from how long it took, less any time queued behind other jobs'
+        packets.
+        """
+        counts = [("tx.packets", 1), ("tx.bytes", size)]
+        if method != "send_with_ack":
+            self.metrics.record(command or self.command, counts, "tx.seconds", elapsed)
+            return
+        queue_wait = getattr(radio, "queue_wait", None)
+        if queue_wait is not None:
+            elapsed = max(0.0, elapsed - queue_wait())
+        tries = max(1, getattr(radio, "ack_retries", 1))
+        if ok:
+            retries = min(tries - 1, int(elapsed / (RETRY_COST * getattr(radio, "ack_wait", 0.5))))
+        else:
+            retries = tries - 1
+            counts.append(("tx.failures", 1))
+        if retries:
+            counts.append(("tx.retries", retries))
+        self.metrics.record(command or self.command, counts, "tx.ack_seconds", elapsed)
+
+    def estimate_transfer(self, size, packet_size, window=1, fec_redundancy=0):
+        """
+        Seconds an image or file transfer of size bytes should take on a clean
+        link, including waiting for the duty-cycle budget.
+        """
+        chunks = len(chunk_payload(bytes(size), packet_size))
+        if fec_redundancy:
+            chunks += math.ceil(chunks * fec_redundancy / 100)
+        frame = self.packet_airtime(packet_size)
+        ack = self.packet_airtime(ACK_PAYLOAD)
+        tx_airtime = chunks * frame
+        if window > 1:
+            bursts = math.ceil(chunks / window)
+            poll_ack = self.packet_airtime(HEADER_SIZE + ACK_BITMAP.size + 2)
+            link_time = tx_airtime + bursts * (poll_ack + TURNAROUND) + frame + ack
+        else:
+            link_time = tx_airtime + chunks * (ack + ACK_DELAY + PACKET_GAP + TURNAROUND)
+
+        available = self.available(PRIORITY_NORMAL)
+        if available is not None and tx_airtime > available:
+            # Past the budget, every second on air costs 1 / duty cycle seconds
+            budget_rate = self.duty_cycle * (1 - CONTROL_RESERVE)
+            link_time = max(link_time, available / tx_airtime * link_time + (tx_airtime - available) / budget_rate)
+        return link_time
+
+    def summary(self):
+        sf, bw, cr, _ = self.modem()
+        lines = [f"SF{sf} BW{bw / 1000:g}kHz CR4/{cr}: {self.packet_airtime(128) * 1000:.0f} ms "
+                 f"per 128-byte frame"]
+        used = self.used()
+        budget = self.budget()
+        if budget is None:
+            lines.append(f"Last {self.window / 60:.0f} min: {used:.1f}s on air (no duty cycle limit)")
+        else:
+            lines.append(f"Last {self.window / 60:.0f} min: {used:.1f}s of {budget:.1f}s on air "
+                         f"(duty cycle {100 * self.duty_cycle:g}%)")
+        with self.lock:
+            entries = sorted(self.stats.items(), key=lambda item: -item[1]["airtime"])
+            for command, entry in entries:
+                line = f"{command}: {entry['packets']} pkts, {entry['bytes']} B, {entry['airtime']:.2f}s"
+                if entry["waited"]:
+                    line += f", waited {entry['waited']:.1f}s"
+                lines.append(line)
+        return "\n".join(lines)
+
+
+class ScheduledRadio:
+    """Looks like the rfm9x; every transmission is charged to the AirtimeScheduler."""
+
+    def __init__(self, rfm9x, scheduler):
+        object.__setattr__(self, "_rfm9x", rfm9x)
+        object.__setattr__(self, "_scheduler", scheduler)
+
+    def send(self, data, **kwargs):
+        return self._scheduler.transmit(self._rfm9x, "send", data, **kwargs)
+
+    def send_with_ack(self, data):
+        return self._scheduler.transmit(self._rfm9x, "send_with_ack", data)
+
+    def __getattr__(self, name):
+        return getattr(self._rfm9x, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._rfm9x, name, value)
+        if name in MODEM_SETTINGS:
+            self._scheduler.modem_changed()
@@ -5,8 +5,170 @@ except ImportError:
     cv2 = None
     print("Warning: OpenCV (cv2) is not installed. Some features may not work.")
 
+import threading
 import time
 
+'''
+Camera access for CAMERA. CameraSession keeps the device open while it is in
+use: a background thread grabs frames continuously, so a capture hands the
+newest frame (a BGR array, as OpenCV returns it) straight to the image
+encoder, without opening the device, waiting for it to settle or going
+through a PNG on disk. After idle_timeout seconds without a request the
+device is released, and the next request opens it again.
+
+capture_photo() is the old one-shot capture to a PNG file.
+'''
+
+CAMERA_DEVICE = 1
+IDLE_TIMEOUT = 30.0     # Seconds without a request before the camera is released
+WARMUP = 0.2            # Seconds of frames dropped after opening, while exposure settles
+MAX_FAILURES = 5        # Failed reads in a row before the device is reopened
+
+
+class CameraSession:
+    """
+    The camera, opened on the first get_frame() and grabbed from by a
+    background thread until it goes idle or close() is called.
+
+    source is a callable returning an opened capture with the
+    cv2.VideoCapture interface (isOpened, read, release); pass a fake one to
+    run without a camera.
+    """
+
+    def __init__(self, device=CAMERA_DEVICE, source=None, idle_timeout=IDLE_TIMEOUT, warmup=WARMUP):
+        if source is None and cv2 is not None:
+            source = lambda: cv2.VideoCapture(device)
+        self.source = source
+        self.idle_timeout = idle_timeout
+        self.warmup = warmup
+        self.frame = None           # Newest frame; never modified once stored
+        self.frame_time = 0.0
+        self.frames = 0             # Grabbed since the device was opened
+        self.error = None           # Why the last attempt to open or read failed
+        self.last_request = 0.0
+        self.thread = None          # Grabber thread while the device is open
+        self.stopping = threading.Event()
+        self.ready = threading.Condition()
+
+    @property
+    def running(self):
+        with self.ready:
+            return self.thread is not None
+
+    def start(self):
+        """Opens the camera in the background if it is not open yet."""
+        with self.ready:
+            self.last_request = time.monotonic()
+            if self.thread is not None:
+                return
+            self.stopping.clear()
+            self.error = None
+            self.thread = threading.Thread(target=self._grab_loop, name="camera", daemon=True)
+            self.thread.start()
+
+    def get_frame(self, timeout=5.0, max_age=0.5):
+        """
+        The newest frame, grabbed at most max_age seconds ago, or None if the
+        camera gives none within timeout (see self.error).
+        """
+        self.start()
+        deadline = time.monotonic() + timeout
+        with self.ready:
+            while self.frame is None or time.monotonic() - self.frame_time > max_age:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self.thread is None:
+                    if self.error is None:
+                        self.error = f"No frame within {timeout:g}s"
+                    return None
+                self.ready.wait(remaining)
+            self.last_request = time.monotonic()
+            return self.frame
+
+    def close(self):
+        """Releases the camera now; the next get_frame() opens it again."""
+        with self.ready:
+            thread = self.thread
+        if thread is not None:
+            self.stopping.set()
+            thread.join()
+
+    def describe(self):
+        with self.ready:
+            if self.thread is None:
+                return f"camera off{f' ({self.error})' if self.error else ''}"
+            idle = time.monotonic() - self.last_request
+            return f"camera on, {self.frames} frames grabbed, idle {idle:.0f}/{self.idle_timeout:g}s"
+
+    def _open(self):
+        if self.source is None:
+            self.error = "OpenCV (cv2) is not installed"
+            return None
+        cap = self.source()
+        if not cap.isOpened():
+            cap.release()
+            self.error = "Camera not found"
+            return None
+        return cap
+
+    def _grab_loop(self):
+        cap = None
+        try:
+            cap = self._open()
+            if cap is None:
+                print(f"[CAMERA] {self.error}")
+                return
+            print("[CAMERA] Opened")
+            opened = time.monotonic()
+            failures = 0
+            while not self.stopping.is_set():
+                with self.ready:
+                    # Decided under the lock so a request arriving now starts a new grabber
+                    if time.monotonic() - self.last_request > self.idle_timeout:
+                        print(f"[CAMERA] Idle for {self.idle_timeout:g}s, powering down")
+                        self._power_down(cap)
+                        cap = None
+                        return
+                ret, frame = cap.read()
+                if not ret:
+                    failures += 1
+                    if failures >= MAX_FAILURES:
+                        # Some USB cameras only recover from a stall by being reopened
+                        print(f"[CAMERA] {failures} failed reads, reopening")
+                        cap.release()
+                        cap = self._open()
+                        if cap is None:
+                            print(f"[CAMERA] {self.error}")
+                            return
+                        opened = time.monotonic()
+                        failures = 0
+                    self.stopping.wait(0.1)
+                    continue
+                failures = 0
+                now = time.monotonic()
+                if now - opened < self.warmup:
+                    continue
+                with self.ready:
+                    self.frame = frame
+                    self.frame_time = now
+                    self.frames += 1
+                    self.ready.notify_all()
+        except Exception as e:
+            self.error = str(e)
+            print(f"[CAMERA] Grabber failed: {e}")
+        finally:
+            if cap is not None or self.thread is threading.current_thread():
+                with self.ready:
+                    self._power_down(cap)
+
+    def _power_down(self, cap):
+        if cap is not None:
+            cap.release()
+        self.thread = None
+        self.frame = None
+        self.frames = 0
+        self.ready.notify_all()
+
+
 def capture_photo(save_directory="img", filename="photo.png"):
     # Create the directory if it does not exist
     if not os.path.exists(save_directory):
@@ -5,16 +5,81 @@ import time
 from datetime import datetime
 from network_tests import ping_host, check_dns, check_internet_connectivity
 from motor_controller import move_forward, move_backward, turn_left, turn_right, stop
-from images import convert_image
+from images import (convert_image, quantize_image, quantize_frame, read_image_to_grayscale, resize_image,
+                    frame_to_grayscale)
+from dct_codec import dct_available, encode_to_budget
+from delta_image import TileEncoder
+from progressive import encode_progressive
 from file_sender import send_file
+from windowed_transfer import DEFAULT_WINDOW, MAX_WINDOW
+from fec import fec_available
+from packet_history import PacketHistory, parse_seq_ranges
+from link_controller import LinkController
+from compression import maybe_compress
+from executor import current_job, run_cancellable, stream_lines, CommandCancelled
+from response_writer import ResponseWriter
+from airtime import AirtimeScheduler, ScheduledRadio
+from metrics import Metrics
+from framing import (encode_frame, HEADER_SIZE, MAX_PACKET_SIZE, IMAGE_INFO, CODEC_ZLIB, CODEC_TILES,
+                     CODEC_PROGRESSIVE, CODEC_DCT, TYPE_TEXT, TYPE_END, TYPE_IMAGE_INFO, TYPE_STATUS, TYPE_STATS,
+                     FLAG_COMPRESSED, STATUS_OK, STATUS_ERROR, STATUS_UNKNOWN)
 import math
 import zlib
-from camera import capture_photo
+import base64
+from camera import CameraSession
+from encode_cache import EncodeCache
 import csv
 import threading
 import requests
 
-MAX_HISTORY = 500  # Number of sent packets to retain in memory
+TIMESTAMP_PREFIX_LEN = len("HH:MM:SS ")  # Sequence numbers travel in the frame header
+ENCODE_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "encode_cache")
+MAX_IMAGE_SIDE = 512
+
+
+def parse_image_options(args, size):
+    """
+    Takes SIZE=<W>x<H>, BYTES=<n> and SECONDS=<s> out of an image command's
+    arguments. Returns (other args, size, byte budget, airtime budget); the
+    budgets are None unless given.
+    """
+    rest, max_bytes, seconds = [], None, None
+    for arg in args:
+        name, _, value = arg.partition("=")
+        name = name.upper()
+        if name == "SIZE" and value:
+            width, _, height = value.lower().partition("x")
+            size = (int(width), int(height or width))
+            if not all(1 <= side <= MAX_IMAGE_SIDE for side in size):
+                raise ValueError(f"SIZE must be 1-{MAX_IMAGE_SIDE} pixels a side")
+        elif name == "BYTES" and value:
+            max_bytes = int(value)
+            if max_bytes <= 0:
+                raise ValueError("BYTES must be positive")
+        elif name == "SECONDS" and value:
+            seconds = float(value)
+            if seconds <= 0:
+                raise ValueError("SECONDS must be positive")
+        else:
+            rest.append(arg)
+    return rest, size, max_bytes, seconds
+
+
+def encode_within_budget(handler, image, max_bytes, seconds, packet_size=None):
+    """
+    CODEC_DCT payload of greyscale rows at the best quality that fits BYTES
+    and the bytes SECONDS of transfer can carry. Returns (payload, quality
+    and PSNR for the operator).
+    """
+    if not dct_available():
+        raise ValueError("BYTES and SECONDS need numpy on the rover")
+    budget = max_bytes
+    if seconds:
+        fits = handler.bytes_within(seconds, packet_size)
+        budget = min(budget, fits) if budget else fits
+    data, quality, psnr = encode_to_budget(image, budget)
+    print(f"[DCT] {len(data)}/{budget} bytes at quality {quality}, PSNR {psnr:.1f} dB")
+    return data, f"quality {quality}, PSNR {psnr:.1f} dB"
 
 # Base command class
 class Command:
@@ -41,18 +106,20 @@ class MoveCommand(Command):
             return            
 
         response = ""
+        cancel = handler.cancel_event()  # Set by STOP or a newer MOVE
+        completed = True
 
         if direction == "FORWARD":
-            move_forward(duration, speed)
+            completed = move_forward(duration, speed, cancel)
             response = f"→ Moving forward for {duration} seconds"
         elif direction == "BACKWARD":
-            move_backward(duration, speed)
+            completed = move_backward(duration, speed, cancel)
             response = f"→ Moving backward for {duration} seconds"
         elif direction == "LEFT":
-            turn_left(duration, speed)
+            completed = turn_left(duration, speed, cancel)
             response = f"→ Turning left for {duration} seconds"
         elif direction == "RIGHT":
-            turn_right(duration, speed)
+            completed = turn_right(duration, speed, cancel)
             response = f"→ Turning right for {duration} seconds"
         elif direction == "STOP":
             stop()
@@ -61,6 +128,8 @@ class MoveCommand(Command):
             stop()
             response = f"→ Unknown direction: {direction}"
 
+        if completed is False:
+            response += " (stopped early)"
         handler.send_response(response)
         handler.send_final_token()
 
@@ -101,7 +170,44 @@ class StopCommand(Command):
     name = "STOP"
 
     def execute(self, args, handler):
+        # The executor already cancelled every job before STOP started; list the ones still winding down.
+        cancelled = handler.executor.cancel_all() if handler.executor else []
+        try:
+            stop()
+        except Exception as e:
+            print(f"[WARNING] Could not stop motors: {e}")
         response = "→ Stopping all activity"
+        if cancelled:
+            response += f" (cancelled {', '.join(f'#{job.job_id} {job.name}' for job in cancelled)})"
+        handler.send_response(response)
+        handler.send_final_token()
+
+
+class JobsCommand(Command):
+    name = "JOBS"
+
+    def execute(self, args, handler):
+        if handler.executor is None:
+            response = "→ Commands run one at a time"
+        else:
+            jobs = handler.executor.describe_jobs()
+            response = "\n".join(jobs) if jobs else "→ No other jobs running"
+        handler.send_response(response)
+        handler.send_final_token()
+
+
+class CancelCommand(Command):
+    name = "CANCEL"
+
+    def execute(self, args, handler):
+        if handler.executor is None:
+            response = "→ Commands run one at a time; nothing to cancel"
+        elif not args or not args[0].lstrip("#").isdigit():
+            response = "Usage: CANCEL <job number> (see JOBS)"
+        elif handler.executor.cancel(int(args[0].lstrip("#"))):
+            response = f"→ Cancelling job #{args[0].lstrip('#')}"
+        else:
+            response = f"→ No job #{args[0].lstrip('#')}"
         handler.send_response(response)
         handler.send_final_token()
 
@@ -111,9 +217,9 @@ class PingCommand(Command):
 
     def execute(self, args, handler):
         target = args[0] if len(args) > 0 else "8.8.8.8"
-        response = ping_host(host=target)
-        handler.send_response(response)
-        time.sleep(0.2)
+        count = int(args[1]) if len(args) > 1 and args[1].isdigit() else 1
+        with ResponseWriter(handler) as out:
+            ping_host(host=target, count=count, out=out, cancel=handler.cancel_event())
         handler.send_final_token()
 
 
@@ -122,8 +228,8 @@ class DnsCommand(Command):
 
     def execute(self, args, handler):
         domain = args[0] if len(args) > 0 else "google.com"
-        response = check_dns(domain=domain)
-        handler.send_response(response)
+        with ResponseWriter(handler) as out:
+            check_dns(domain=domain, out=out, cancel=handler.cancel_event())
         handler.send_final_token()
 
 
@@ -131,8 +237,8 @@ class NetCommand(Command):
     name = "NET"
 
     def execute(self, args, handler):
-        response = check_internet_connectivity()
-        handler.send_response(response)
+        with ResponseWriter(handler) as out:
+            check_internet_connectivity(out=out, cancel=handler.cancel_event())
         handler.send_final_token()
 
 
@@ -151,14 +257,34 @@ class HistoryCommand(Command):
     name = "HISTORY"
 
     def execute(self, args, handler):
+        """
+        HISTORY            -> report which sequence numbers are still held
+        HISTORY <count>    -> resend the newest <count> packets
+        HISTORY <a>-<b>    -> resend packets a through b
+        """
         try:
-            if len(args) == 0:
-                return handler.send_response("Usage: HISTORY (# of packets)", handler.rfm9x)
-            count = int(args[0])
             history = handler.packet_history
-            to_resend = history[-count:] if count <= len(history) else history
-            handler.send_response(f"→ Resending last {len(to_resend)} packets", handler.rfm9x)
-            for packet in to_resend:
+            if len(args) == 0:
+                with handler.history_lock:
+                    if len(history) == 0:
+                        response = "→ History is empty"
+                    else:
+                        response = (f"→ History holds seq {history.first_seq}-{history.last_seq} "
+                                    f"({len(history)} packets, {history.bytes_used} bytes)")
+                handler.send_response(response)
+                handler.send_final_token()
+                return
+            with handler.history_lock:
+                if len(args) == 1 and args[0].isdigit():
+                    to_resend = history.last(int(args[0]))
+                else:
+                    to_resend = [entry for start, end in parse_seq_ranges(args) for entry in history.range(start, end)]
+            if to_resend:
+                handler.send_response(f"→ Resending {len(to_resend)} packets "
+                                      f"(seq {to_resend[0][0]}-{to_resend[-1][0]})", handler.rfm9x)
+            else:
+                handler.send_response("→ No packets in that range", handler.rfm9x)
+            for seq, packet in to_resend:
                 handler.rfm9x.send(packet)
             handler.send_final_token()
         except Exception as e:
@@ -209,7 +335,9 @@ class EchoCommand(Command):
             for i in range(times):
                 bytes_sent = handler.send_response(message, handler.rfm9x)
                 total_bytes_sent += bytes_sent
-                time.sleep(0.1)  # simulate delay between packets
+                if handler.wait(0.1):  # simulate delay between packets
+                    times = i + 1
+                    break
 
             end_time = time.time()
             elapsed_time = end_time - start_time
@@ -238,7 +366,15 @@ class ConfigCommand(Command):
                     "- OUTPUT_LENGTH <32-252>\n"
                     "- LOGGING <true|false>\n"
                     "- TIMESTAMP <true|false>\n"
-                    "- CHUNKING <true|false>"
+                    "- CHUNKING <true|false>\n"
+                    f"- WINDOW <1-{MAX_WINDOW}> (1 = stop-and-wait)\n"
+                    "- FEC <0-100> (% parity for windowed transfers, 0 = off)\n"
+                    "- ADAPTIVE <true|false> (packet size and pacing follow the link)\n"
+                    "- COMPRESSION <true|false> (dictionary-compress text responses)\n"
+                    "- DUTY_CYCLE <0-100> (% of each hour the rover may transmit, 0 = no limit)\n"
+                    "- MAX_ETA <seconds> (image transfers estimated longer need FORCE, 0 = no limit)\n"
+                    "- PROGRESSIVE <true|false> (SCREENSHOT sends a coarse preview first, STOP once it looks good)\n"
+                    "- CAMERA_IDLE <seconds> (camera is powered down after this long unused)"
                 )
             elif len(args) < 2:
                 raise ValueError("Usage: CONFIG <PARAM> <VALUE>")
@@ -250,6 +386,8 @@ class ConfigCommand(Command):
                     new_size = int(value)
                     if 32 <= new_size <= 252:
                         handler.max_packet_size = new_size
+                        if handler.link:
+                            handler.link.reset(new_size)
                         response = f"Set OUTPUT_LENGTH to {new_size} bytes"
                     else:
                         response = f"Invalid OUTPUT_LENGTH: {new_size} (must be 32-252)"
@@ -266,6 +404,67 @@ class ConfigCommand(Command):
                     handler.chunking_enabled = value in ["true", "1", "on"]
                     response = f"{'Enabled' if handler.chunking_enabled else 'Disabled'} CHUNKING"
 
+                elif param == "WINDOW":
+                    new_window = int(value)
+                    if 1 <= new_window <= MAX_WINDOW:
+                        handler.window_size = new_window
+                        response = f"Set WINDOW to {new_window} packets"
+                    else:
+                        response = f"Invalid WINDOW: {new_window} (must be 1-{MAX_WINDOW})"
+
+                elif param == "FEC":
+                    redundancy = int(value)
+                    if not 0 <= redundancy <= 100:
+                        response = f"Invalid FEC: {redundancy} (must be 0-100)"
+                    elif redundancy and not fec_available():
+                        response = "FEC unavailable: reedsolo is not installed"
+                    else:
+                        handler.fec_redundancy = redundancy
+                        response = f"Set FEC to {redundancy}% parity" if redundancy else "Disabled FEC"
+
+                elif param == "COMPRESSION":
+                    handler.compression_enabled = value in ["true", "1", "on"]
+                    response = f"{'Enabled' if handler.compression_enabled else 'Disabled'} COMPRESSION"
+
+                elif param == "DUTY_CYCLE":
+                    percent = float(value)
+                    if 0 <= percent <= 100:
+                        handler.airtime.duty_cycle = percent / 100
+                        response = f"Set DUTY_CYCLE to {percent:g}%" if percent else "Disabled DUTY_CYCLE limit"
+                    else:
+                        response = f"Invalid DUTY_CYCLE: {percent:g} (must be 0-100)"
+
+                elif param == "MAX_ETA":
+                    seconds = int(value)
+                    if seconds >= 0:
+                        handler.max_eta = seconds
+                        response = f"Set MAX_ETA to {seconds}s" if seconds else "Disabled MAX_ETA"
+                    else:
+                        response = f"Invalid MAX_ETA: {seconds} (must be 0 or more)"
+
+                elif param == "PROGRESSIVE":
+                    handler.progressive_images = value in ["true", "1", "on"]
+                    response = f"{'Enabled' if handler.progressive_images else 'Disabled'} PROGRESSIVE"
+
+                elif param == "CAMERA_IDLE":
+                    seconds = float(value)
+                    if seconds > 0:
+                        handler.camera.idle_timeout = seconds
+                        response = f"Set CAMERA_IDLE to {seconds:g}s"
+                    else:
+                        response = f"Invalid CAMERA_IDLE: {seconds:g} (must be more than 0)"
+
+                elif param == "ADAPTIVE":
+                    if value in ["true", "1", "on"]:
+                        handler.link = handler.link or LinkController(ack_wait=getattr(handler.rfm9x, "ack_wait", 0.5))
+                        handler.max_packet_size = handler.link.packet_size
+                        response = f"Enabled ADAPTIVE ({handler.link.summary()})"
+                    else:
+                        if handler.link:
+                            print(f"[LINK] Disabled at {handler.link.summary()}")
+                        handler.link = None
+                        response = f"Disabled ADAPTIVE (OUTPUT_LENGTH {handler.max_packet_size})"
+
                 else:
                     response = f"Unknown CONFIG parameter: {param}"
 
@@ -283,54 +482,91 @@ class ScreenshotCommand(Command):
             # Set image parameters – adjust as needed.
             bit_depth = 4
             size = (128, 128)
-            
-            # Save the original max packet size or default to 128
-            original_max_packet_size = getattr(handler, "max_packet_size", 128)
-            max_packet_size = original_max_packet_size
 
-            # If a second argument is provided, try to use it as the new packet size
+            # FORCE sends even if the transfer is estimated to exceed MAX_ETA;
+            # PROGRESSIVE sends coarse-to-fine passes (default: CONFIG PROGRESSIVE);
+            # BYTES=<n> / SECONDS=<s> send the best lossy image that fits instead
+            args, size, max_bytes, seconds = parse_image_options(args, size)
+            budgeted = bool(max_bytes or seconds)
+            force = any(arg.upper() == "FORCE" for arg in args)
+            progressive = not budgeted and (handler.progressive_images or any(arg.upper() == "PROGRESSIVE" for arg in args))
+            args = [arg for arg in args if arg.upper() not in ("FORCE", "PROGRESSIVE")]
+            packet_size = None  # CONFIG OUTPUT_LENGTH
+
+            # If a second argument is provided, try to use it as the packet size of this transfer
             if len(args) > 1:
                 try:
-                    max_packet_size = int(args[1])
+                    packet_size = int(args[1])
                 except ValueError:
-                    handler.send_response("Invalid packet size. Must be an integer.", handler.rfm9x)
+                    packet_size = 0
+                if packet_size <= HEADER_SIZE:
+                    handler.send_response(f"Invalid packet size. Must be an integer above {HEADER_SIZE}.",
+                                          handler.rfm9x)
                     handler.send_final_token()
                     return
-
-            # Temporarily override handler.max_packet_size
-            handler.max_packet_size = max_packet_size
+                packet_size = min(packet_size, MAX_PACKET_SIZE)
 
             # Determine the image path
             script_dir = os.path.dirname(os.path.abspath(__file__))
             image_path = os.path.join(script_dir, "img", args[0])
             
-            # Load, dither, and pack image bits (returns a bytearray)
-            hex_data = convert_image(image_path, bit_depth=bit_depth, size=size, dithering=False)
-            if not hex_data:
-                handler.send_response("Image conversion failed", handler.rfm9x)
-                return
+            details = ""
+            if budgeted:
+                image, _, _ = read_image_to_grayscale(image_path)
+                image_data, details = encode_within_budget(handler, resize_image(image, size, "area"), max_bytes, seconds,
+                                                           packet_size)
+                codec, bit_depth, cache_key = CODEC_DCT, 8, None
+                details = f", {len(image_data)} bytes, {details},"
+
+            # Load, dither, and pack image bits (returns the zlib stream)
+            def encode():
+                if progressive:
+                    pixels = quantize_image(image_path, bit_depth=bit_depth, size=size, dithering=False)
+                    data, pass_ends = encode_progressive(pixels, size, bit_depth)
+                    print(f"[SCREENSHOT] Progressive passes end at {pass_ends} bytes")
+                    return data
+                return convert_image(image_path, bit_depth=bit_depth, size=size, dithering=False)
+
+            # The same image with the same settings comes from the cache and starts sending at once
+            if not budgeted:
+                codec = CODEC_PROGRESSIVE if progressive else CODEC_ZLIB
+                cache_key = handler.encode_cache.key(image_path, size, bit_depth, False, codec)
+                image_data, cached = handler.encode_cache.get_or_encode(cache_key, encode)
+                if not image_data:
+                    handler.send_response("Image conversion failed", handler.rfm9x)
+                    handler.send_final_token()
+                    return
+                if cached:
+                    print(f"[SCREENSHOT] {args[0]} from the encode cache ({handler.encode_cache.summary()})")
             
-            # Optionally write to terminal log
-            with open("terminal.txt", "w") as f:
-                f.write(hex_data)
+            # Optionally write to terminal log (base64 so reconstructor.py can read it)
+            if codec == CODEC_ZLIB and handler.terminal_image != cache_key:
+                with open("terminal.txt", "w") as f:
+                    f.write(base64.b64encode(image_data).decode('ascii'))
+                handler.terminal_image = cache_key
             
-            handler.send_response(f"Sending an {size} {bit_depth}bpp image in {max_packet_size}-byte chunks")
+            eta = handler.check_transfer(len(image_data), force, packet_size)
+            if eta is None:
+                handler.send_final_token()
+                return
+
+            kind = "DCT" if budgeted else f"{bit_depth}bpp {'progressive ' if progressive else ''}"
+            handler.send_response(f"Sending an {size} {kind} image{details} "
+                                  f"in {handler.transfer_settings(packet_size)[0]}-byte chunks (ETA ~{eta:.0f}s)")
+            handler.send_image_info(size, bit_depth, codec)
 
             # Send the image data
-            if send_file(hex_data, handler):
+            if send_file(image_data, handler, packet_size):
                 # handler.send_response("SCREENSHOT SENT", handler.rfm9x)
                 handler.send_final_token()
+            elif progressive:
+                handler.send_response("Screenshot stopped early; the basestation keeps the preview", handler.rfm9x)
+                handler.send_final_token()
             else:
                 handler.send_response("Failed to send screenshot", handler.rfm9x)
                 handler.send_final_token()
-
-            # Restore the original packet size
-            handler.max_packet_size = original_max_packet_size
-            # handler.send_final_token()
                 
         except Exception as e:
-            # Restore even if there's an error
-            handler.max_packet_size = original_max_packet_size
             handler.send_response(f"[SCREENSHOT ERROR] {e}", handler.rfm9x)
             handler.send_final_token()
 
@@ -339,34 +575,51 @@ class CameraCommand(Command):
     
     def execute(self, args, handler):
         try:
-            
-            import time
-
-            while True:
-                image_path = capture_photo()
-                if image_path:
-                    break  
-                print("Retrying capture...")
-                time.sleep(1)  
+            if args and args[0].upper() == "OFF":
+                handler.camera.close()
+                handler.send_response(f"Camera powered down ({handler.camera.describe()})")
+                return
 
-            image_path = capture_photo()
+            # The newest frame from the open camera, no PNG in between
+            frame = handler.camera.get_frame()
+            if frame is None:
+                handler.send_response(f"[CAMERA ERROR] {handler.camera.error}")
+                return
             
             # Set image parameters – adjust as needed.
             bit_depth = 4
             size = (64, 64)
+            # SIZE=<W>x<H> sets the resolution; BYTES=<n> / SECONDS=<s> send the best lossy frame that fits
+            args, size, max_bytes, seconds = parse_image_options(args, size)
+            force = any(arg.upper() == "FORCE" for arg in args)
+            # KEY sends the whole frame even if the basestation could be patched
+            keyframe = any(arg.upper() == "KEY" for arg in args)
             
-            # Load, dither, and pack image bits (returns a bytearray)
-            hex_data = convert_image(image_path, bit_depth=bit_depth, size=size, dithering=False)
-            if not hex_data:
-                handler.send_response("Image conversion failed", handler.rfm9x)
-                return
-            
-            with open("terminal.txt", "w") as f:
-                f.write(hex_data)
+            encoder = handler.camera_tiles
+            if max_bytes or seconds:
+                # A standalone frame; the tile reference at the basestation stays as it was
+                image = resize_image(frame_to_grayscale(frame), size, "area")
+                image_data, kind = encode_within_budget(handler, image, max_bytes, seconds)
+                bit_depth, codec, encoder = 8, CODEC_DCT, None
+                kind = f"DCT, {kind}"
+            else:
+                # Quantize, then encode only the tiles that changed since the last capture
+                pixels = quantize_frame(frame, bit_depth=bit_depth, size=size, dithering=False)
+                image_data, keyframe, changed, tiles = encoder.encode(pixels, size, bit_depth, keyframe)
+                codec = CODEC_TILES
+                kind = f"{bit_depth}bpp, " + ("keyframe" if keyframe else f"{changed}/{tiles} changed tiles")
             
-            handler.send_response(f"Sending an {size} {bit_depth}bpp image")
+            eta = handler.check_transfer(len(image_data), force)
+            if eta is None:
+                return
+
+            handler.send_response(f"Sending an {size} image, {kind}, "
+                                  f"{len(image_data)} bytes (ETA ~{eta:.0f}s)")
+            handler.send_image_info(size, bit_depth, codec)
             # # Send the file using file_sender's send_file function
-            if send_file(hex_data, handler):
+            if send_file(image_data, handler):
+                if encoder:
+                    encoder.commit()
                 handler.send_response("SCREENSHOT SENT", handler.rfm9x)
             else:
                 handler.send_response("Failed to send screenshot", handler.rfm9x)
@@ -379,41 +632,65 @@ class ResendCommand(Command):
     
     def execute(self, args, handler):
         """
-        Resends specific packets based on a comma-separated list of packet sequence numbers.
-        Example command: RESEND 0,2,5
+        Resends packets by history sequence number (see HISTORY).
+        Example command: RESEND 120-125,130
         """
         if not args:
-            handler.send_response("Usage: RESEND <packet numbers, comma separated>", handler.rfm9x)
+            handler.send_response("Usage: RESEND <seq or seq range, comma separated>", handler.rfm9x)
+            handler.send_final_token()
             return
         try:
-            # Combine all arguments into one string in case spaces are used.
-            indices_str = " ".join(args).replace(":", "").strip()
-            # Split by commas (and spaces) to extract packet indices.
-            indices = []
-            for part in indices_str.split(","):
-                for token in part.split():
-                    token = token.strip()
-                    if token.isdigit():
-                        indices.append(int(token))
-            if not indices:
-                handler.send_response("No valid packet indices provided for RESEND.", handler.rfm9x)
-                return
+            ranges = parse_seq_ranges(args)
             history = handler.packet_history
-            for i in indices:
-                try:
-                    packet = history[i]
+            for start, end in ranges:
+                for seq in range(start, end + 1):
+                    with handler.history_lock:
+                        packet = history.get(seq)
+                    if packet is None:
+                        handler.send_response(f"Packet {seq} not found in history "
+                                              f"(holding {history.first_seq}-{history.last_seq}).", handler.rfm9x)
+                        break
                     handler.rfm9x.send(packet)
-                    print(f"Resent packet {i}")
-                except IndexError:
-                    handler.send_response(f"Packet {i} not found in history.", handler.rfm9x)
+                    print(f"Resent packet {seq}")
         except Exception as e:
             handler.send_response(f"[RESEND ERROR] {e}", handler.rfm9x)
+        handler.send_final_token()
+
+class AirtimeCommand(Command):
+    name = "AIRTIME"
+
+    def execute(self, args, handler):
+        handler.send_response(handler.airtime.summary())
+        handler.send_final_token()
 
-# Bluetooth scanning subprocess
-def bluetoothScanProcess():
+
+class StatsCommand(Command):
+    name = "STATS"
+
+    def execute(self, args, handler):
+        """
+        STATS        -> packed snapshot in TYPE_STATS frames (payloads.STATS_HEADER, STATS_COMMAND)
+        STATS TEXT   -> the same as readable text, with the radio histograms
+        STATS RESET  -> start counting again
+        """
+        option = args[0].upper() if args else ""
+        if option == "RESET":
+            handler.metrics.reset()
+            handler.send_response("→ Metrics reset")
+        elif option == "TEXT":
+            handler.send_response(handler.metrics.text())
+        elif option:
+            handler.send_response("Usage: STATS [TEXT|RESET]")
+        else:
+            handler.send_response(handler.metrics.pack(), frame_type=TYPE_STATS)
+        handler.send_final_token()
+
+# Bluetooth scanning subprocess; devices are written to out as they are found
+def bluetoothScanProcess(out, cancel=None):
     scanCmd = ["sudo", "hcitool", "scan", "--length", "6"]
-    result = subprocess.run(scanCmd, stderr=STDOUT, stdout=subprocess.PIPE, text=True, universal_newlines=True)
-    return result.stdout
+    for line in stream_lines(scanCmd, cancel):
+        if line.strip():
+            out.write(line)
 
 # Bluetooth scanning command
 class ScanBluetoothCommand(Command):
@@ -422,8 +699,8 @@ class ScanBluetoothCommand(Command):
     def execute(self, args, handler):
         response = "→ Scanning Bluetooth devices..."
         handler.send_response(response, handler.rfm9x)
-        result = bluetoothScanProcess()
-        handler.send_response(result, handler.rfm9x)
+        with ResponseWriter(handler) as out:
+            bluetoothScanProcess(out, handler.cancel_event())
         handler.send_final_token()
 
 class WiFiSetupCommand(Command):
@@ -446,13 +723,16 @@ class WiFiScanCommand(Command):
         #response = "→ Scanning Wi-Fi devices..."
         timeoutPeriod = 30 # Timeout process after a specified period (s)
         airodumpCmd = ["sudo", "airodump-ng", "--essid", "ECE_SP25_53", "--channel", "1", "--write", "handshk", "wlan1mon"]
-        subprocess.run(airodumpCmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, timeout=timeoutPeriod)
+        try:
+            run_cancellable(airodumpCmd, handler.cancel_event(), timeout=timeoutPeriod)
+        except subprocess.TimeoutExpired:
+            pass  # airodump runs until stopped; the timeout is the scan length
         
         # Open captured CSV file
-        with open('handshk-01.csv', newline='') as csvfile:
+        with open('handshk-01.csv', newline='') as csvfile, ResponseWriter(handler) as out:
             reader = csv.reader(csvfile, delimiter=' ', quotechar='|')
             for row in reader:
-                handler.send_response(row)
+                out.write(str(row))
         handler.send_final_token()
 
         # Cleanup scan files afterwards
@@ -468,11 +748,13 @@ class WiFiCrackCommand(Command):
     def execute(self, args, handler):
         # Run the aircrack-ng command to crack the precaptured handshake
         aircrackCmd = ["sudo", "aircrack-ng", "-b", "b0:b2:1c:a9:29:ad", "precaptured-handshake.cap", "-w", "/usr/share/wordlists/rockyou.txt"]
-        crack_text = subprocess.run(aircrackCmd, check=True, capture_output=True)
-        #print(crack_text.stdout)
+        returncode, crack_text = run_cancellable(aircrackCmd, handler.cancel_event())
+        if returncode:
+            raise subprocess.CalledProcessError(returncode, aircrackCmd, output=crack_text)
+        #print(crack_text)
 
-        # Decode the output and split it into lines
-        crack_lines = crack_text.stdout.decode("utf-8").splitlines()
+        # Split the output into lines
+        crack_lines = crack_text.splitlines()
         response = ""
         for line in crack_lines:
             if 'FOUND!' in line:
@@ -519,25 +801,15 @@ class RunCommand(Command):
             shell_cmd = " ".join(args)
             handler.send_response(f"→ Executing: {shell_cmd}")
 
-            # Use Popen to stream output line-by-line
-            process = subprocess.Popen(
-                shell_cmd,
-                shell=True,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                universal_newlines=True,
-                bufsize=1
-            )
-
-            # Read lines from stdout as they come
-            for line in iter(process.stdout.readline, ''):
-                line = line.strip()
-                if line:
-                    handler.send_response(line)
-
-            process.stdout.close()
-            process.wait()
+            # Stream output as it comes, packed into full frames
+            with ResponseWriter(handler) as out:
+                for line in stream_lines(shell_cmd, handler.cancel_event(), shell=True):
+                    line = line.strip()
+                    if line:
+                        out.write(line)
 
+        except CommandCancelled:
+            handler.send_response(f"[CANCELLED] {shell_cmd}")
         except subprocess.TimeoutExpired:
             handler.send_response("[ERROR] Command timed out.")
         except Exception as e:
@@ -548,15 +820,32 @@ class RunCommand(Command):
 
 class CommandHandler:
     def __init__(self, rfm9x):
-        self.rfm9x = rfm9x
+        self.metrics = Metrics()  # Command and radio counters and latencies, for STATS
+        self.airtime = AirtimeScheduler(rfm9x, metrics=self.metrics)  # Time on air and duty cycle of everything sent
+        self.rfm9x = ScheduledRadio(rfm9x, self.airtime)
         self.rfm9x.ack_delay = 0.01
         self.rfm9x.node = 1
         self.rfm9x.destination = 2
-        self.packet_history = []
+        self.packet_history = PacketHistory()  # Sent packets by sequence number, for HISTORY/RESEND
         self.max_packet_size = 128
         self.logging_enabled = False
         self.timestamp_enabled = False
         self.chunking_enabled = True
+        self.compression_enabled = True  # Compressed only when it saves bytes
+        self.window_size = DEFAULT_WINDOW  # Packets in flight for bulk transfers (1 = stop-and-wait)
+        self.fec_redundancy = 0  # Percent of Reed-Solomon parity added to windowed transfers
+        self.link = None  # LinkController while CONFIG ADAPTIVE is on
+        self.max_eta = 0  # Seconds; longer image transfers need FORCE (0 = no limit)
+        self.progressive_images = False  # SCREENSHOT sends Adam7 passes, coarse to fine
+        self.encode_cache = EncodeCache(directory=ENCODE_CACHE_DIR)  # SCREENSHOT payloads by file and settings
+        self.terminal_image = None  # Cache key of the image last written to terminal.txt
+        self.camera = CameraSession()  # Opened by CAMERA, released after CONFIG CAMERA_IDLE seconds unused
+        self.camera_tiles = TileEncoder()  # Last CAMERA frame the basestation holds, for delta updates
+        self.executor = None  # CommandExecutor when commands run concurrently (main.py)
+        self._context = threading.local()  # Message state of the command each thread is running
+        self._msg_lock = threading.Lock()
+        self._last_msg_id = 0
+        self.history_lock = threading.Lock()
         self.commands = {}
         self.register_commands([
             MoveCommand(),
@@ -564,6 +853,8 @@ class CommandHandler:
             StatusCommand(),
             ScanCommand(),
             StopCommand(),
+            JobsCommand(),
+            CancelCommand(),
             PingCommand(),
             DnsCommand(),
             NetCommand(),
@@ -573,7 +864,9 @@ class CommandHandler:
             ConfigCommand(),
             ScreenshotCommand(),
             CameraCommand(),
-            ResendCommand(), 
+            ResendCommand(),
+            AirtimeCommand(),
+            StatsCommand(),
             ScanBluetoothCommand(),
             WiFiSetupCommand(),
             WiFiScanCommand(),
@@ -588,19 +881,86 @@ class CommandHandler:
         for command in command_list:
             self.commands[command.name] = command
 
+    def use_radio(self, radio):
+        """Sends through radio (e.g. the executor's RadioProxy) from now on, still via the airtime scheduler."""
+        self.rfm9x = ScheduledRadio(radio, self.airtime)
+
+    @property
+    def msg_id(self):
+        """Frame message id of the command the calling thread is handling."""
+        return getattr(self._context, "msg_id", 0)
+
+    @msg_id.setter
+    def msg_id(self, value):
+        self._context.msg_id = value
+
+    @property
+    def batch_active(self):
+        """True while handle_batch runs; commands' own final tokens become STATUS frames."""
+        return getattr(self._context, "batch_active", False)
 
-    def send_response(self, response, rfm9x=None):
-        from datetime import datetime  # just in case it's not at the top
+    @batch_active.setter
+    def batch_active(self, value):
+        self._context.batch_active = value
 
+    @property
+    def final_sent(self):
+        """True once the current message's final token went out."""
+        return getattr(self._context, "final_sent", False)
+
+    @final_sent.setter
+    def final_sent(self, value):
+        self._context.final_sent = value
+
+    def cancel_event(self):
+        """The cancel Event of the job being run by the calling thread, if any."""
+        job = current_job()
+        return job.cancel if job else None
+
+    def cancelled(self):
+        cancel = self.cancel_event()
+        return cancel is not None and cancel.is_set()
+
+    def wait(self, seconds):
+        """time.sleep() that returns True early if the current job is cancelled."""
+        cancel = self.cancel_event()
+        if cancel is None:
+            time.sleep(seconds)
+            return False
+        return cancel.wait(seconds)
+
+    def record_packet(self, packet):
+        with self.history_lock:
+            return self.packet_history.append(packet)
+
+
+    def send_response(self, response, rfm9x=None, frame_type=TYPE_TEXT):
         rfm9x = rfm9x or self.rfm9x
-        encoded_response = response.encode('utf-8')
+        if isinstance(response, (bytes, bytearray)):
+            encoded_response = bytes(response)
+        else:
+            encoded_response = str(response).encode('utf-8')
 
-        # Determine prefix length for timestamp/logging
+        # Chunk index and count travel in the frame header; only the
+        # optional timestamp still takes room in the payload.
         prefix_len = 0
-        if self.logging_enabled and self.timestamp_enabled:
-            prefix_len = 30
-
-        max_data_len = self.max_packet_size - prefix_len
+        if self.logging_enabled and self.timestamp_enabled and frame_type == TYPE_TEXT:
+            prefix_len = TIMESTAMP_PREFIX_LEN
+
+        # A compressed response is one stream split across the frames, so the
+        # timestamp goes in once, ahead of the text, before compressing.
+        flags = 0
+        if self.compression_enabled:
+            stamped = encoded_response
+            if prefix_len:
+                stamped = datetime.now().strftime("%H:%M:%S ").encode('utf-8') + encoded_response
+            stamped, compressed = maybe_compress(stamped)
+            if compressed:
+                encoded_response = stamped
+                flags = FLAG_COMPRESSED
+                prefix_len = 0
+
+        max_data_len = min(self.max_packet_size, MAX_PACKET_SIZE) - HEADER_SIZE - prefix_len
 
         # Chunk the response
         if self.chunking_enabled:
@@ -614,46 +974,160 @@ class CommandHandler:
         total = len(chunks)
         total_bytes_sent = 0  # <--- Track actual bytes sent
 
-        for idx, chunk in enumerate(chunks, start=1):
-            if self.logging_enabled:
-                if self.timestamp_enabled:
-                    timestamp = datetime.now().strftime("%H:%M:%S")
-                    prefix = f"[{timestamp} {idx}/{total}] "
-                else:
-                    prefix = f"[{idx}/{total}] "
-                payload = prefix.encode('utf-8') + chunk
-            else:
-                payload = chunk
+        for seq, chunk in enumerate(chunks):
+            if prefix_len:
+                chunk = datetime.now().strftime("%H:%M:%S ").encode('utf-8') + chunk
+            payload = encode_frame(frame_type, chunk, msg_id=self.msg_id, seq=seq, total=total, flags=flags)
 
             print("[DEBUG] Sending payload:", payload)
-            rfm9x.send_with_ack(payload)
-            self.packet_history.append(payload)
+            self.send_packet(payload, rfm9x)
+            self.record_packet(payload)
 
             total_bytes_sent += len(payload)  # <--- Add actual payload length
 
-            if len(self.packet_history) > MAX_HISTORY:
-                self.packet_history.pop(0)
-
         return total_bytes_sent  # <--- Return byte count
 
 
 
+    def send_packet(self, packet, rfm9x=None):
+        """send_with_ack that, with CONFIG ADAPTIVE on, also paces and adapts the packet size."""
+        rfm9x = rfm9x or self.rfm9x
+        if self.link is None:
+            return rfm9x.send_with_ack(packet)
+        ok = self.link.send_with_ack(rfm9x, packet)
+        self.max_packet_size = self.link.packet_size
+        return ok
+
+    def on_transfer(self, stats):
+        """Hands windowed transfer stats to the link controller."""
+        if self.link is not None:
+            self.link.on_transfer(stats)
+            self.max_packet_size = self.link.packet_size
+
+    def transfer_settings(self, packet_size=None):
+        """(packet size, window, FEC redundancy) the next bulk transfer will use, or one sent with packet_size."""
+        window = self.window_size
+        redundancy = self.fec_redundancy if window > 1 and fec_available() else 0
+        return min(packet_size or self.max_packet_size, MAX_PACKET_SIZE), window, redundancy
+
+    def bytes_within(self, seconds, packet_size=None):
+        """The largest transfer estimated to take at most seconds with the current settings."""
+        low, high = 0, 0xFFFF
+        while low < high:
+            size = (low + high + 1) // 2
+            if self.airtime.estimate_transfer(size, *self.transfer_settings(packet_size)) <= seconds:
+                low = size
+            else:
+                high = size - 1
+        return low
+
+    def check_transfer(self, size, force=False, packet_size=None):
+        """
+        Estimated seconds to send size bytes with the current settings, or None
+        (after telling the operator) if that exceeds CONFIG MAX_ETA without FORCE.
+        """
+        eta = self.airtime.estimate_transfer(size, *self.transfer_settings(packet_size))
+        print(f"[AIRTIME] {size}-byte transfer estimated at {eta:.1f}s")
+        if self.max_eta and eta > self.max_eta and not force:
+            self.send_response(f"Declined: sending {size} bytes would take ~{eta:.0f}s (MAX_ETA {self.max_eta}s). "
+                               f"Repeat with FORCE to send anyway.")
+            return None
+        return eta
+
+    def send_image_info(self, size, bit_depth, codec=CODEC_ZLIB, rfm9x=None):
+        """Tells the basestation how to decode the image transfer that follows."""
+        rfm9x = rfm9x or self.rfm9x
+        width, height = size
+        info = IMAGE_INFO.pack(width, height, bit_depth, codec)
+        rfm9x.send_with_ack(encode_frame(TYPE_IMAGE_INFO, info, msg_id=self.msg_id))
+
+    def begin_message(self):
+        """Starts a new response stream; every frame until the final token shares its id."""
+        with self._msg_lock:
+            self._last_msg_id = (self._last_msg_id + 1) & 0xFF
+            self.msg_id = self._last_msg_id
+        self.final_sent = False
+        return self.msg_id
+
+    def record_run(self, cmd, started, outcome=None):
+        """Counts a run of cmd and its duration; outcome is "errors" or "cancelled" if it did not finish."""
+        self.metrics.observe("command.seconds", time.monotonic() - started, cmd)
+        self.metrics.count("command.runs", cmd)
+        if outcome:
+            self.metrics.count("command." + outcome, cmd)
+
     def handle_command(self, command, args):
+        self.begin_message()
+        cmd = command.upper()
+        self.airtime.command = cmd
+        started = time.monotonic()
         try:
-            cmd = command.upper()
             if cmd in self.commands:
                 self.commands[cmd].execute(args, self)
+                self.record_run(cmd, started)
             else:
                 self.send_response(f"[UNIMPLEMENTED COMMAND] {cmd}")
+        except CommandCancelled as e:
+            self.record_run(cmd, started, "cancelled")
+            self.send_response(f"[CANCELLED] {e}")
         except Exception as e:
+            self.record_run(cmd, started, "errors")
             self.send_response(f"[ERROR] Command handling failed: {e}")
+        finally:
+            self.airtime.command = None
+
+    def handle_batch(self, lines):
+        """
+        Runs several commands received in one TYPE_BATCH frame, in order.
+        Each command gets its own message id and ends with a STATUS frame
+        instead of a final token; one final token closes the whole batch.
+        """
+        total = len(lines)
+        self.batch_active = True
+        try:
+            for index, line in enumerate(lines):
+                parts = line.split()
+                cmd = parts[0].upper()
+                self.begin_message()
+                self.airtime.command = cmd
+                print(f"[BATCH] {index + 1}/{total}: {line}")
+                status = STATUS_OK
+                started = time.monotonic()
+                try:
+                    if cmd in self.commands:
+                        self.commands[cmd].execute(parts[1:], self)
+                        self.record_run(cmd, started)
+                    else:
+                        status = STATUS_UNKNOWN
+                        self.send_response(f"[IGNORED] Unknown command: {parts[0]}")
+                except CommandCancelled as e:
+                    status = STATUS_ERROR
+                    self.record_run(cmd, started, "cancelled")
+                    self.send_response(f"[CANCELLED] {e}")
+                except Exception as e:
+                    status = STATUS_ERROR
+                    self.record_run(cmd, started, "errors")
+                    self.send_response(f"[ERROR] Command handling failed: {e}")
+                self.send_status(index, total, status, line)
+        finally:
+            self.batch_active = False
+            self.airtime.command = None
+        self.send_final_token()
+
+    def send_status(self, index, total, status, line, rfm9x=None):
+        """Marks the end of one command in a batch."""
+        rfm9x = rfm9x or self.rfm9x
+        payload = bytes([status]) + line.encode('utf-8')[:MAX_PACKET_SIZE - HEADER_SIZE - 1]
+        packet = encode_frame(TYPE_STATUS, payload, msg_id=self.msg_id, seq=index, total=total)
+        self.send_packet(packet, rfm9x)
+        self.record_packet(packet)
 
     def send_final_token(self, rfm9x=None):
+        if self.batch_active:
+            return  # handle_batch sends a STATUS frame instead
         rfm9x = rfm9x or self.rfm9x
-        FINAL_TOKEN = "END_OF_STREAM"  # Make sure this token does not appear in regular messages.
-        final_packet = FINAL_TOKEN.encode('utf-8')
+        final_packet = encode_frame(TYPE_END, msg_id=self.msg_id)
         print("[DEBUG] Sending final token:", final_packet)
-        rfm9x.send_with_ack(final_packet)
-        self.packet_history.append(final_packet)
-        if len(self.packet_history) > MAX_HISTORY:
-            self.packet_history.pop(0)
+        self.send_packet(final_packet, rfm9x)
+        self.record_packet(final_packet)
+        self.final_sent = True
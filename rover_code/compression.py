@@ -0,0 +1,103 @@
+import zlib
+
+'''
+Preset-dictionary compression for text responses.
+Keep the copies in rover_code/ and basestation_code/ identical: both ends must
+use the same dictionary. Raw deflate carries no dictionary id, so every stream
+starts with a DICTIONARY_VERSION byte and decompress() refuses any other
+version; bump it with every change to _DICTIONARY_SAMPLES.
+checks/check_compression.py compares the copies and checks the HELP and
+CONFIG samples still match what the rover sends.
+
+A whole response is compressed as one raw deflate stream (no zlib header or
+checksum; the frame CRC covers integrity), then chunked into TEXT frames that
+all carry FLAG_COMPRESSED. The dictionary holds phrases that recur in command
+output (ping, nslookup, curl, hcitool, airodump rows, HELP, CONFIG, JOBS,
+AIRTIME and STATS text), so even a one-packet reply compresses well.
+'''
+
+WBITS = -15             # Raw deflate, 32 KiB window
+LEVEL = 9
+MIN_SAVING = 8          # Bytes a compressed response must save to be sent compressed
+DICTIONARY_VERSION = 2  # First byte of every compressed stream
+
+# Deflate prefers matches close to the data, so the most common phrases go last.
+_DICTIONARY_SAMPLES = (
+    "BSSID, First time seen, Last time seen, channel, Speed, Privacy, Cipher, Authentication, Power, "
+    "# beacons, # IV, LAN IP, ID-length, ESSID, Key\r\n"
+    "Station MAC, First time seen, Last time seen, Power, # packets, BSSID, Probed ESSIDs\r\n"
+    "WPA2, CCMP, PSK, WPA2 WPA, CCMP TKIP, OPN, WEP, MGT, SAE, 0.  0.  0.  0, (not associated) ",
+    "HTTP/2 200\nserver: GitHub.com\ncontent-type: text/html; charset=utf-8\nvary: X-PJAX, X-PJAX-Container, "
+    "Turbo-Visit, Turbo-Frame, Accept-Encoding, Accept, X-Requested-With\ncache-control: max-age=0, private, "
+    "must-revalidate\nstrict-transport-security: max-age=31536000; includeSubdomains; preload\n"
+    "x-frame-options: deny\nx-content-type-options: nosniff\nx-xss-protection: 0\n"
+    "referrer-policy: origin-when-cross-origin, strict-origin-when-cross-origin\ncontent-security-policy: "
+    "default-src 'none'; base-uri 'self'\ndate: Thu, 17 Apr 2025 23:06:10 GMT\nset-cookie: _gh_sess=; "
+    "path=/; secure; HttpOnly; SameSite=Lax\naccept-ranges: bytes\nx-github-request-id: ",
+    "Server:\t\t127.0.0.53\nAddress:\t127.0.0.53#53\n\nNon-authoritative answer:\nName:\tgoogle.com\n"
+    "Address: 142.250.80.46\nName:\tgoogle.com\nAddress: 2607:f8b0:4006:80b::200e\n"
+    "** server can't find : NXDOMAIN\n;; connection timed out; no servers could be reached\n",
+    "Scanning ...\n\t00:1A:7D:DA:71:13\tn/a\n\t",
+    "SF7 BW125kHz CR4/5:  ms per 128-byte frame\nLast 60 min: s on air (no duty cycle limit)\n"
+    "s of s on air (duty cycle %)\n pkts,  B, s, waited s\n"
+    "Up s, CPU %, RSS  MiB,  threads\nradio.queue  runs (0 failed),  retries, p50 ms p90 ms max ms\n"
+    "radio.queue_seconds:  x, tx.ack_seconds:  x, tx.seconds:  x, → Metrics reset\n"
+    "Usage: STATS [TEXT|RESET]\n#1  (queued) → No other jobs running\n"
+    "→ Commands run one at a time; nothing to cancel\nUsage: CANCEL <job number> (see JOBS)\n"
+    "→ Cancelling job #→ No job #",
+    "CONFIG OPTIONS:\n- OUTPUT_LENGTH <32-252>\n- LOGGING <true|false>\n- TIMESTAMP <true|false>\n"
+    "- CHUNKING <true|false>\n- WINDOW <1-32> (1 = stop-and-wait)\n"
+    "- FEC <0-100> (% parity for windowed transfers, 0 = off)\n"
+    "- ADAPTIVE <true|false> (packet size and pacing follow the link)\n"
+    "- COMPRESSION <true|false> (dictionary-compress text responses)\n"
+    "- DUTY_CYCLE <0-100> (% of each hour the rover may transmit, 0 = no limit)\n"
+    "- MAX_ETA <seconds> (image transfers estimated longer need FORCE, 0 = no limit)\n"
+    "- PROGRESSIVE <true|false> (SCREENSHOT sends a coarse preview first, STOP once it looks good)\n"
+    "- CAMERA_IDLE <seconds> (camera is powered down after this long unused)\n"
+    "Set OUTPUT_LENGTH to  bytes\nEnabled Disabled LOGGING TIMESTAMP CHUNKING ADAPTIVE COMPRESSION PROGRESSIVE "
+    "Set WINDOW to  packets Set FEC to % parity Set DUTY_CYCLE to % Set MAX_ETA to s Set CAMERA_IDLE to s",
+    "Valid commands: MOVE, LED, STATUS, SCAN, STOP, JOBS, CANCEL, PING, DNS, NET, HELP, HISTORY, ECHO, CONFIG, "
+    "SCREENSHOT, CAMERA, RESEND, AIRTIME, STATS, SCANBT, WIFISETUP, WIFISCAN, WIFICRACK, LEDON, LEDOFF, RUN",
+    "[ERROR] Command timed out. [ERROR] Failed to execute: [REQUEST ERROR] Invalid argument: "
+    "[UNIMPLEMENTED COMMAND] [IGNORED] Unknown command: Usage: → Executing: "
+    "→ Rover is online and ready → Stopping all activity → Scanning Bluetooth devices... "
+    "→ Moving forward for  seconds → Moving backward for  seconds → Turning left for  seconds "
+    "→ Turning right for  seconds",
+    "[THROUGHPUT]  bytes/sec | [LATENCY]  sec/packet\n",
+    "PING 8.8.8.8 (8.8.8.8) 56(84) bytes of data.\n64 bytes from 8.8.8.8: icmp_seq=1 ttl=117 time=12.3 ms\n\n"
+    "--- 8.8.8.8 ping statistics ---\n1 packets transmitted, 1 received, 0% packet loss, time 0ms\n"
+    "rtt min/avg/max/mdev = 12.345/12.345/12.345/0.000 ms\n"
+    "1 packets transmitted, 0 received, 100% packet loss, time 0ms\n"
+    "ping: connect: Network is unreachable\nping: google.com: Temporary failure in name resolution\n",
+)
+ZDICT = "\n".join(_DICTIONARY_SAMPLES).encode("utf-8")
+
+
+def compress(data):
+    """Returns DICTIONARY_VERSION and the raw deflate stream of data using the shared dictionary."""
+    compressor = zlib.compressobj(LEVEL, zlib.DEFLATED, WBITS, 9, zlib.Z_DEFAULT_STRATEGY, ZDICT)
+    return bytes([DICTIONARY_VERSION]) + compressor.compress(data) + compressor.flush()
+
+
+def maybe_compress(data, min_saving=MIN_SAVING):
+    """Returns (payload, True) if compressing saves at least min_saving bytes, else (data, False)."""
+    if len(data) <= min_saving:
+        return data, False
+    compressed = compress(data)
+    if len(data) - len(compressed) < min_saving:
+        return data, False
+    return compressed, True
+
+
+def decompress(data):
+    """
+    Inflates a stream produced by compress(). A truncated stream (chunks lost
+    on air) yields whatever prefix can be decoded instead of raising; a
+    stream made with another dictionary raises ValueError.
+    """
+    if not data:
+        return b""
+    if data[0] != DICTIONARY_VERSION:
+        raise ValueError(f"compressed with dictionary version {data[0]}, this end has {DICTIONARY_VERSION}")
+    decompressor = zlib.decompressobj(WBITS, ZDICT)
+    return decompressor.decompress(data[1:]) + decompressor.flush()
@@ -0,0 +1,134 @@
+import math
+import zlib
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from payloads import DCT_HEADER, DCT_BLOCK, DCT_QUANT, DCT_ZIGZAG
+
+'''
+Lossy, rate-controlled image coding ("send this image in at most N bytes").
+
+The greyscale image (0-255, any size) is cut into 8x8 blocks like a JPEG,
+each block is DCT transformed and its coefficients are divided by the JPEG
+luminance table scaled for a quality of 1-100. encode_to_budget() searches
+for the highest quality whose payload fits the byte budget and reports the
+PSNR of the result against the image it was given.
+
+Payload (sent with CODEC_DCT, bit depth 8):
+
+    DCT_HEADER    quality
+    zlib stream   the quantized coefficients, band by band in zigzag order
+                  (every block's DC term, then every block's first AC term,
+                  ...), DC terms as differences from the previous block's,
+                  each value zigzag-mapped to unsigned 16 bits; first all
+                  high bytes, then all low bytes
+
+Grouping bands puts the many zero high-frequency terms into long runs that
+zlib squeezes to almost nothing. The basestation side is decode_dct() in
+basestation_code/reconstructor.py; decode() here is the same and only used
+to measure the PSNR.
+'''
+
+MIN_QUALITY = 1
+MAX_QUALITY = 100
+
+
+def dct_available():
+    return np is not None
+
+
+def _dct_matrix():
+    n = DCT_BLOCK
+    matrix = np.array([[math.cos((2 * x + 1) * u * math.pi / (2 * n)) for x in range(n)] for u in range(n)])
+    matrix[0] /= math.sqrt(2)
+    return matrix * math.sqrt(2 / n)
+
+
+def quant_table(quality):
+    """The 8x8 quantizer for quality 1-100 (IJG scaling of the JPEG luminance table)."""
+    quality = max(MIN_QUALITY, min(MAX_QUALITY, quality))
+    scale = 5000 // quality if quality < 50 else 200 - 2 * quality
+    table = (np.array(DCT_QUANT, dtype=np.int64) * scale + 50) // 100
+    return np.clip(table, 1, 255).reshape(DCT_BLOCK, DCT_BLOCK)
+
+
+def _blocks(image):
+    """The image level-shifted and cut into (rows, cols, 8, 8) blocks, edges padded by repetition."""
+    height, width = image.shape
+    pad_h, pad_w = -height % DCT_BLOCK, -width % DCT_BLOCK
+    padded = np.pad(np.asarray(image, dtype=np.float64) - 128, ((0, pad_h), (0, pad_w)), mode="edge")
+    rows, cols = padded.shape[0] // DCT_BLOCK, padded.shape[1] // DCT_BLOCK
+    return padded.reshape(rows, DCT_BLOCK, cols, DCT_BLOCK).swapaxes(1, 2)
+
+
+def transform(image):
+    """DCT coefficients of every block, shape (blocks, 64) in zigzag order."""
+    matrix = _dct_matrix()
+    coefficients = matrix @ _blocks(image) @ matrix.T
+    return coefficients.reshape(-1, DCT_BLOCK * DCT_BLOCK)[:, list(DCT_ZIGZAG)]
+
+
+def encode_coefficients(coefficients, quality):
+    """Payload for coefficients from transform() quantized at quality."""
+    table = quant_table(quality).ravel()[list(DCT_ZIGZAG)]
+    levels = np.round(coefficients / table).astype(np.int64)
+    levels[1:, 0] -= levels[:-1, 0].copy()
+    bands = np.clip(levels.T.ravel(), -32768, 32767)
+    mapped = ((bands << 1) ^ (bands >> 63)).astype(np.uint16)
+    body = (mapped >> 8).astype(np.uint8).tobytes() + (mapped & 0xFF).astype(np.uint8).tobytes()
+    return DCT_HEADER.pack(quality) + zlib.compress(body, 9)
+
+
+def decode(data, width, height):
+    """0-255 greyscale pixels, a (height, width) uint8 array."""
+    (quality,) = DCT_HEADER.unpack_from(data)
+    body = zlib.decompress(data[DCT_HEADER.size:])
+    rows, cols = -(-height // DCT_BLOCK), -(-width // DCT_BLOCK)
+    count = rows * cols * DCT_BLOCK * DCT_BLOCK
+    if len(body) != 2 * count:
+        raise ValueError(f"DCT payload holds {len(body) // 2} coefficients, a {width}x{height} image has {count}")
+    mapped = (np.frombuffer(body[:count], dtype=np.uint8).astype(np.int64) << 8) | np.frombuffer(body[count:], dtype=np.uint8)
+    levels = ((mapped >> 1) ^ -(mapped & 1)).reshape(DCT_BLOCK * DCT_BLOCK, -1).T.copy()
+    levels[:, 0] = np.cumsum(levels[:, 0])
+
+    coefficients = np.zeros_like(levels, dtype=np.float64)
+    coefficients[:, list(DCT_ZIGZAG)] = levels * quant_table(quality).ravel()[list(DCT_ZIGZAG)]
+    matrix = _dct_matrix()
+    blocks = matrix.T @ coefficients.reshape(rows, cols, DCT_BLOCK, DCT_BLOCK) @ matrix
+    image = blocks.swapaxes(1, 2).reshape(rows * DCT_BLOCK, cols * DCT_BLOCK)[:height, :width]
+    return np.clip(np.round(image + 128), 0, 255).astype(np.uint8)
+
+
+def psnr(original, decoded):
+    error = np.mean((np.asarray(original, dtype=np.float64) - decoded) ** 2)
+    return float("inf") if error == 0 else 10 * math.log10(255 * 255 / error)
+
+
+def encode_to_budget(image, budget):
+    """
+    Encodes greyscale rows at the highest quality that fits budget bytes.
+    Returns (payload, quality, PSNR in dB); raises ValueError if even the
+    lowest quality does not fit.
+    """
+    image = np.asarray(image)
+    coefficients = transform(image)
+    # Payload size grows with quality, so binary search for the last quality that fits
+    low, high, best = MIN_QUALITY, MAX_QUALITY, None
+    while low <= high:
+        quality = (low + high) // 2
+        data = encode_coefficients(coefficients, quality)
+        if len(data) <= budget:
+            best = (data, quality)
+            low = quality + 1
+        else:
+            high = quality - 1
+    if best is None:
+        smallest = len(encode_coefficients(coefficients, MIN_QUALITY))
+        raise ValueError(f"a {image.shape[1]}x{image.shape[0]} image needs at least {smallest} bytes; "
+                         f"raise the budget or lower the size")
+    data, quality = best
+    height, width = image.shape
+    return data, quality, psnr(image, decode(data, width, height))
@@ -0,0 +1,112 @@
+import zlib
+from images import pack_pixels
+from payloads import TILE_HEADER, TILE_KEYFRAME, TILE_DELTA
+
+'''
+Changed-tile ("delta") encoding for repeated CAMERA captures.
+
+The encoder remembers the frame the basestation holds, splits each new frame
+into tile x tile squares and sends only the tiles whose mean difference from
+the stored copy exceeds `threshold` quantization levels. Every
+`keyframe_interval` updates (and whenever the size or bit depth changes) the
+whole frame goes out instead, so a basestation that missed an update recovers.
+
+Payload (zlib compressed, sent with CODEC_TILES):
+
+    TILE_HEADER   kind, tile size, frame id, base frame id, changed tile count
+    bitmap        delta only: one bit per tile, row-major, MSB first
+    pixels        the changed tiles (all tiles for a keyframe), each tile
+                  row by row, packed at the bit depth like convert_image()
+
+The stored frame is updated with the tiles that were sent, not with the new
+capture, so small changes below the threshold never add up unseen. The
+basestation side is TileDecoder in basestation_code/reconstructor.py.
+'''
+
+DEFAULT_TILE = 8
+DEFAULT_THRESHOLD = 0.5         # Mean level difference for a tile to count as changed
+DEFAULT_KEYFRAME_INTERVAL = 10  # Updates between keyframes
+
+
+def tile_boxes(width, height, tile):
+    """(x, y, w, h) of every tile, row-major; edge tiles are clipped to the image."""
+    return [(x, y, min(tile, width - x), min(tile, height - y))
+            for y in range(0, height, tile) for x in range(0, width, tile)]
+
+
+def tile_pixels(pixels, width, box):
+    x, y, w, h = box
+    values = []
+    for row in range(y, y + h):
+        values.extend(pixels[row * width + x:row * width + x + w])
+    return values
+
+
+class TileEncoder:
+    def __init__(self, tile=DEFAULT_TILE, threshold=DEFAULT_THRESHOLD, keyframe_interval=DEFAULT_KEYFRAME_INTERVAL):
+        self.tile = tile
+        self.threshold = threshold
+        self.keyframe_interval = keyframe_interval
+        self.reset()
+
+    def reset(self):
+        """Forgets the stored frame; the next update is a keyframe."""
+        self.reference = None   # Levels the basestation holds, row-major
+        self.shape = None       # (width, height, bit depth) of the reference
+        self.frame_id = 0
+        self.since_keyframe = 0
+        self.pending = None     # State after the last encoded update, until commit()
+
+    def encode(self, pixels, size, bit_depth, keyframe=False):
+        """
+        Encodes quantized pixels (see images.quantize_image) against the stored
+        frame. Returns (payload, is keyframe, changed tiles, total tiles). The
+        stored frame only changes on commit(), so a failed send can be dropped.
+        """
+        width, height = size
+        boxes = tile_boxes(width, height, self.tile)
+        base_id = self.frame_id
+        keyframe = (keyframe or self.reference is None or self.shape != (width, height, bit_depth)
+                    or self.since_keyframe + 1 >= self.keyframe_interval)
+
+        if keyframe:
+            changed = list(range(len(boxes)))
+        else:
+            changed = []
+            for index, box in enumerate(boxes):
+                new = tile_pixels(pixels, width, box)
+                old = tile_pixels(self.reference, width, box)
+                difference = sum(abs(a - b) for a, b in zip(new, old)) / len(new)
+                if difference > self.threshold:
+                    changed.append(index)
+
+        frame_id = (base_id + 1) & 0xFF
+        body = bytearray(TILE_HEADER.pack(TILE_KEYFRAME if keyframe else TILE_DELTA, self.tile,
+                                          frame_id, base_id, len(changed)))
+        if not keyframe:
+            bitmap = bytearray((len(boxes) + 7) // 8)
+            for index in changed:
+                bitmap[index // 8] |= 0x80 >> (index % 8)
+            body += bitmap
+
+        values = []
+        reference = list(pixels) if keyframe else list(self.reference)
+        for index in changed:
+            box = boxes[index]
+            tile_values = tile_pixels(pixels, width, box)
+            values.extend(tile_values)
+            if not keyframe:
+                x, y, w, h = box
+                for row in range(h):
+                    start = (y + row) * width + x
+                    reference[start:start + w] = tile_values[row * w:(row + 1) * w]
+        body += pack_pixels(values, bit_depth)
+
+        self.pending = (reference, (width, height, bit_depth), frame_id, 0 if keyframe else self.since_keyframe + 1)
+        return zlib.compress(body), keyframe, len(changed), len(boxes)
+
+    def commit(self):
+        """Call once the last encoded update was delivered; later deltas are based on it."""
+        if self.pending is not None:
+            self.reference, self.shape, self.frame_id, self.since_keyframe = self.pending
+            self.pending = None
@@ -0,0 +1,129 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+'''
+Cache of encoded SCREENSHOT payloads, so asking for the same image again
+(or re-sending a whole image the basestation lost) starts transmitting at
+once instead of decoding, resizing, quantizing and compressing it again.
+
+Entries are keyed by the source file (path, modification time and size, so
+an edited image misses) and the encode parameters: size, bit depth,
+dithering and codec. The payloads are held in memory and evicted least
+recently used first once they exceed the byte budget. With a directory, each
+payload is also written there and found again after a restart; the oldest
+files are deleted once the directory exceeds its own budget.
+'''
+
+MAX_CACHE_BYTES = 1024 * 1024       # Payloads kept in memory
+MAX_DISK_BYTES = 8 * 1024 * 1024    # Payloads kept in the cache directory
+
+
+class EncodeCache:
+    def __init__(self, byte_budget=MAX_CACHE_BYTES, directory=None, disk_budget=MAX_DISK_BYTES):
+        self.byte_budget = byte_budget
+        self.directory = directory
+        self.disk_budget = disk_budget
+        self.entries = OrderedDict()    # key -> payload, least recently used first
+        self.used = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(path, size, bit_depth, dithering, codec):
+        """Cache key of path encoded with these parameters; raises OSError if it does not exist."""
+        info = os.stat(path)
+        return (os.path.abspath(path), info.st_mtime_ns, info.st_size, tuple(size), bit_depth, bool(dithering), codec)
+
+    def get(self, key):
+        """The cached payload for key, or None."""
+        with self.lock:
+            data = self.entries.get(key)
+            if data is not None:
+                self.entries.move_to_end(key)
+        if data is None:
+            data = self._load(key)
+            if data is not None:
+                self._remember(key, data)
+        with self.lock:
+            if data is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return data
+
+    def put(self, key, data):
+        data = bytes(data)
+        self._remember(key, data)
+        self._save(key, data)
+
+    def get_or_encode(self, key, encode):
+        """Returns (payload, True) from the cache, or (encode(), False) after caching it."""
+        data = self.get(key)
+        if data is not None:
+            return data, True
+        data = encode()
+        if data:
+            self.put(key, data)
+        return data, False
+
+    def summary(self):
+        with self.lock:
+            return (f"{len(self.entries)} images, {self.used}/{self.byte_budget} bytes, "
+                    f"{self.hits} hits, {self.misses} misses")
+
+    def _remember(self, key, data):
+        if len(data) > self.byte_budget:
+            return
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.used -= len(old)
+            self.entries[key] = data
+            self.used += len(data)
+            while self.used > self.byte_budget:
+                _, evicted = self.entries.popitem(last=False)
+                self.used -= len(evicted)
+
+    def _file(self, key):
+        return os.path.join(self.directory, hashlib.sha1(repr(key).encode()).hexdigest() + ".bin")
+
+    def _load(self, key):
+        if not self.directory:
+            return None
+        path = self._file(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)  # Pruning goes by modification time, so this keeps it least recently used
+            return data
+        except OSError:
+            return None
+
+    def _save(self, key, data):
+        if not self.directory:
+            return
+        path = self._file(key)
+        try:
+            # Written under a temporary name so a crash never leaves half a payload
+            temp = f"{path}.{threading.get_ident()}.tmp"
+            with open(temp, "wb") as f:
+                f.write(data)
+            os.replace(temp, path)
+            self._prune()
+        except OSError as e:
+            print(f"[CACHE] Could not save {path}: {e}")
+
+    def _prune(self):
+        files = [os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith(".bin")]
+        files.sort(key=os.path.getmtime)
+        total = sum(os.path.getsize(path) for path in files)
+        for path in files:
+            if total <= self.disk_budget:
+                break
+            total -= os.path.getsize(path)
+            os.remove(path)
@@ -0,0 +1,463 @@
+import itertools
+import os
+import signal
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from framing import is_frame, decode_frame, unpack_batch, FrameError, split_batch, TYPE_BATCH
+
+'''
+Runs rover commands concurrently so the radio keeps listening while a
+command is busy (MOVE, WIFISCAN, WIFICRACK, image transfers).
+
+    radio thread   owns the rfm9x. It alternates short receives with
+                   transmitting queued packets, highest priority first, and
+                   hands received commands to the dispatcher.
+    workers        run one command each (a Job). They talk to the radio through
+                   RadioProxy, which looks like an rfm9x but queues every send
+                   for the radio thread and blocks until it went out. A windowed
+                   transfer takes the radio exclusively for its duration.
+
+STOP preempts: every running job is cancelled before STOP itself runs, and a
+new MOVE cancels the motion in progress. Commands check handler.cancelled() or
+wait with handler.wait() so they notice cancellation between steps.
+'''
+
+MAX_WORKERS = 4
+RADIO_POLL = 0.1            # Receive timeout of the radio thread between transmissions (s)
+
+PRIORITY_CONTROL = 0        # STOP, STATUS, JOBS, CANCEL, AIRTIME, STATS
+PRIORITY_NORMAL = 1
+PRIORITY_BULK = 2           # Image transfers
+
+IMMEDIATE_COMMANDS = {"STOP", "STATUS", "JOBS", "CANCEL", "AIRTIME", "STATS"}  # Never wait for a free worker
+MOTION_COMMANDS = {"MOVE"}
+BULK_COMMANDS = {"SCREENSHOT", "CAMERA"}
+
+class _JobLocal(threading.local):
+    job = None  # Class default, so threads that never ran a job read None without an exception
+
+
+_local = _JobLocal()
+
+
+def current_job():
+    """The Job the calling thread is running, or None outside a worker."""
+    return _local.job
+
+
+def bind_job(job):
+    """Makes job the current job of a helper thread that works on its behalf."""
+    _local.job = job
+
+
+class CommandCancelled(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, job_id, lines, priority):
+        self.job_id = job_id
+        self.lines = lines          # One command, or several for a batch
+        self.priority = priority
+        self.cancel = threading.Event()
+        self.started = None
+
+    @property
+    def name(self):
+        return self.lines[0].split()[0].upper()
+
+    def describe(self):
+        text = "; ".join(self.lines)
+        if self.started is None:
+            return f"#{self.job_id} {text} (queued)"
+        return f"#{self.job_id} {text} ({time.time() - self.started:.0f}s)"
+
+
+class TxRequest:
+    def __init__(self, method, packet, job):
+        self.method = method
+        self.packet = packet
+        self.job = job
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+        self.queued = time.monotonic()
+        self.started = None         # When the radio thread took it
+
+
+class RadioLink:
+    def __init__(self, rfm9x, on_packet, poll_timeout=RADIO_POLL, metrics=None):
+        self.rfm9x = rfm9x
+        self.on_packet = on_packet
+        self.poll_timeout = poll_timeout
+        self.metrics = metrics
+        self.local = threading.local()  # queue_wait of each sending thread's last packet
+        self.pending = []           # (priority, order, TxRequest)
+        self.order = itertools.count()
+        self.condition = threading.Condition()
+        self.owner = None           # Job driving the radio itself (windowed transfer)
+        self.depth = 0              # Nesting of exclusive() by the owner
+        self.parked = False         # Radio thread is idle while owner is set
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="radio", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        with self.condition:
+            self.condition.notify_all()
+        if self.thread:
+            self.thread.join()
+
+    def holds_radio(self):
+        job = current_job()
+        return job is not None and self.owner is job
+
+    def submit(self, method, packet):
+        """Queues a transmission and blocks until the radio thread has sent it."""
+        job = current_job()
+        request = TxRequest(method, packet, job)
+        priority = job.priority if job else PRIORITY_NORMAL
+        with self.condition:
+            self.pending.append((priority, next(self.order), request))
+        request.done.wait()
+        self.local.queue_wait = wait = request.started - request.queued
+        if self.metrics is not None:
+            self.metrics.observe("radio.queue_seconds", wait)
+        if request.error:
+            raise request.error
+        return request.result
+
+    def _next_request(self):
+        with self.condition:
+            if not self.pending:
+                return None
+            item = min(self.pending, key=lambda item: item[:2])
+            self.pending.remove(item)
+            return item[2]
+
+    def _park(self):
+        """Stays off the radio while a job holds it exclusively."""
+        with self.condition:
+            if self.owner is None:
+                return
+            self.parked = True
+            self.condition.notify_all()
+            while self.owner is not None and not self.stop_event.is_set():
+                self.condition.wait()
+            self.parked = False
+
+    def run(self):
+        while not self.stop_event.is_set():
+            self._park()
+            request = self._next_request()
+            if request is not None:
+                request.started = time.monotonic()
+                try:
+                    request.result = getattr(self.rfm9x, request.method)(request.packet)
+                except Exception as e:
+                    request.error = e
+                request.done.set()
+                continue
+
+            try:
+                packet = self.rfm9x.receive(timeout=self.poll_timeout, with_ack=True)
+            except Exception as e:
+                print(f"[RADIO] Receive failed: {e}")
+                time.sleep(self.poll_timeout)
+                continue
+            if packet is None:
+                continue
+            try:
+                self.on_packet(packet)
+            except Exception as e:
+                print(f"[ERROR] Packet processing failed: {e}")
+
+    @contextmanager
+    def exclusive(self):
+        """
+        Hands the radio to the calling job: the radio thread parks and the job's
+        sends and receives go straight to the rfm9x, so a windowed transfer gets
+        its ACK frames and no per-packet handoff. Other jobs' packets wait.
+        """
+        job = current_job()
+        with self.condition:
+            while self.owner is not None and self.owner is not job:
+                self.condition.wait()
+            self.owner = job
+            self.depth += 1
+            while not self.parked and self.thread is not None and self.thread.is_alive():
+                self.condition.wait()
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.depth -= 1
+                if self.depth == 0:
+                    self.owner = None
+                    self.condition.notify_all()
+
+
+class RadioProxy:
+    """Stands in for the rfm9x inside worker threads."""
+
+    def __init__(self, link):
+        object.__setattr__(self, "_link", link)
+
+    def send(self, data, **kwargs):
+        if self._link.holds_radio():
+            self._link.local.queue_wait = 0.0
+            return self._link.rfm9x.send(data, **kwargs)
+        return self._link.submit("send", data)
+
+    def send_with_ack(self, data):
+        if self._link.holds_radio():
+            self._link.local.queue_wait = 0.0
+            return self._link.rfm9x.send_with_ack(data)
+        return self._link.submit("send_with_ack", data)
+
+    def queue_wait(self):
+        """Seconds the calling thread's last packet waited for the radio thread."""
+        return getattr(self._link.local, "queue_wait", 0.0)
+
+    def receive(self, **kwargs):
+        with self._link.exclusive():
+            return self._link.rfm9x.receive(**kwargs)
+
+    def exclusive(self):
+        return self._link.exclusive()
+
+    def __getattr__(self, name):
+        return getattr(self._link.rfm9x, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._link.rfm9x, name, value)
+
+
+def parse_packet(packet):
+    """Returns the command lines in a received packet: one plain text command or a TYPE_BATCH frame."""
+    if is_frame(packet):
+        try:
+            frame = decode_frame(packet)
+        except FrameError as e:
+            print(f"[ERROR] Dropped corrupt frame: {e}")
+            return []
+        if frame.type != TYPE_BATCH:
+            print(f"[IGNORED] Unexpected frame type {frame.type}")
+            return []
+        lines = unpack_batch(frame.payload)
+        print(f"[RECEIVED] Batch of {len(lines)} commands")
+        return lines
+    message = bytes(packet).decode("utf-8").strip()
+    print(f"[RECEIVED] {message}")
+    return [message] if message else []
+
+
+def run_lines(handler, lines):
+    """Runs one command or a batch on the calling thread and makes sure the final token goes out."""
+    if len(lines) > 1:
+        handler.handle_batch(lines)
+    else:
+        parts = lines[0].split()
+        if parts[0].upper() in handler.commands:
+            handler.handle_command(parts[0], parts[1:])
+        else:
+            handler.begin_message()
+            handler.send_response(f"[IGNORED] Unknown command: {parts[0]}")
+            handler.send_final_token()
+    # The Feather waits for one final token per command; make sure it gets it.
+    if not handler.final_sent:
+        handler.send_final_token()
+
+
+class CommandExecutor:
+    def __init__(self, handler, rfm9x, workers=MAX_WORKERS):
+        self.handler = handler
+        self.radio = RadioLink(rfm9x, self.dispatch, metrics=handler.metrics)
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self.jobs = {}              # job id -> Job, queued or running
+        self.job_ids = itertools.count(1)
+        self.lock = threading.Lock()
+        handler.use_radio(RadioProxy(self.radio))
+        handler.executor = self
+        handler.metrics.gauge("radio.queue", lambda: len(self.radio.pending))
+        handler.metrics.gauge("jobs", lambda: len(self.jobs))
+
+    def start(self):
+        self.radio.start()
+
+    def shutdown(self):
+        self.cancel_all()
+        self.pool.shutdown(wait=True)
+        self.radio.stop()
+        self.handler.camera.close()
+
+    def run_forever(self):
+        self.start()
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            print("\n[CTRL+C] Shutting down.")
+        finally:
+            self.shutdown()
+
+    def dispatch(self, packet):
+        """Called on the radio thread for every received command packet; must not block."""
+        lines = parse_packet(packet)
+        if lines:
+            self.submit(lines)
+
+    def submit(self, lines):
+        """Starts a job for one command (or a batch). Returns the Job."""
+        if isinstance(lines, str):
+            lines = split_batch(lines)
+        names = {line.split()[0].upper() for line in lines}
+        if names <= IMMEDIATE_COMMANDS:
+            priority = PRIORITY_CONTROL
+        elif names & BULK_COMMANDS:
+            priority = PRIORITY_BULK
+        else:
+            priority = PRIORITY_NORMAL
+
+        job = Job(next(self.job_ids), lines, priority)
+        if "STOP" in names:
+            self.cancel_all()
+        elif names & MOTION_COMMANDS:
+            self.cancel_all(MOTION_COMMANDS)
+        with self.lock:
+            self.jobs[job.job_id] = job
+
+        if priority == PRIORITY_CONTROL:
+            threading.Thread(target=self._run, args=(job,), name=f"job-{job.job_id}", daemon=True).start()
+        else:
+            self.pool.submit(self._run, job)
+        return job
+
+    def _run(self, job):
+        _local.job = job
+        job.started = time.time()
+        handler = self.handler
+        try:
+            if job.cancel.is_set():
+                handler.begin_message()
+                handler.send_response(f"→ Job #{job.job_id} cancelled before it started")
+                handler.send_final_token()
+            else:
+                run_lines(handler, job.lines)
+        except CommandCancelled as e:
+            # Even the cancellation notice could not go out (e.g. no airtime left)
+            print(f"[JOBS] Job #{job.job_id} cancelled: {e}")
+        except Exception as e:
+            print(f"[ERROR] Job #{job.job_id} failed: {e}")
+        finally:
+            with self.lock:
+                self.jobs.pop(job.job_id, None)
+            _local.job = None
+
+    def cancel(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+        if job is None:
+            return False
+        job.cancel.set()
+        print(f"[JOBS] Cancelled {job.describe()}")
+        return True
+
+    def cancel_all(self, names=None):
+        """
+        Cancels every job (or those whose command is in names) except the caller's
+        own. Quick control commands (STATUS, JOBS...) are left to finish.
+        """
+        own = current_job()
+        with self.lock:
+            jobs = list(self.jobs.values())
+        cancelled = []
+        for job in jobs:
+            if job is own or job.name in IMMEDIATE_COMMANDS or (names is not None and job.name not in names):
+                continue
+            if not job.cancel.is_set():
+                job.cancel.set()
+                print(f"[JOBS] Cancelled {job.describe()}")
+            cancelled.append(job)
+        return cancelled
+
+    def describe_jobs(self):
+        own = current_job()
+        with self.lock:
+            return [job.describe() for job in self.jobs.values() if job is not own]
+
+
+def kill_process(process):
+    """Kills a process started with start_new_session=True together with its children (sudo, shell pipelines)."""
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError, AttributeError):
+        process.kill()
+
+
+def run_cancellable(args, cancel=None, timeout=None, **kwargs):
+    """
+    subprocess.run() replacement that kills the process when cancel is set.
+    Returns (return code, combined stdout/stderr text). Raises CommandCancelled
+    on cancellation and subprocess.TimeoutExpired (with the output so far) on timeout.
+    """
+    process = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+                               start_new_session=True, **kwargs)
+    deadline = time.time() + timeout if timeout else None
+    while True:
+        try:
+            output, _ = process.communicate(timeout=0.2)
+            return process.returncode, output
+        except subprocess.TimeoutExpired:
+            if cancel is not None and cancel.is_set():
+                kill_process(process)
+                process.communicate()
+                raise CommandCancelled(f"{args[0] if isinstance(args, list) else args} was cancelled")
+            if deadline and time.time() > deadline:
+                kill_process(process)
+                output, _ = process.communicate()
+                raise subprocess.TimeoutExpired(args, timeout, output=output)
+
+
+def stream_lines(args, cancel=None, timeout=None, **kwargs):
+    """
+    Runs a process and yields its output (stderr included) line by line as it
+    is printed. Kills it like run_cancellable: raises CommandCancelled or
+    subprocess.TimeoutExpired once the output ends.
+    """
+    process = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1,
+                               start_new_session=True, **kwargs)
+    timed_out = threading.Event()
+
+    def watch():
+        deadline = time.time() + timeout if timeout else None
+        while process.poll() is None:
+            if cancel is not None and cancel.is_set():
+                kill_process(process)
+                return
+            if deadline and time.time() > deadline:
+                timed_out.set()
+                kill_process(process)
+                return
+            time.sleep(0.2)
+
+    threading.Thread(target=watch, daemon=True).start()
+    try:
+        for line in iter(process.stdout.readline, ''):
+            yield line.rstrip("\n")
+    finally:
+        if process.poll() is None:
+            kill_process(process)  # The caller stopped reading early
+        process.stdout.close()
+        process.wait()
+    if cancel is not None and cancel.is_set():
+        raise CommandCancelled(f"{args[0] if isinstance(args, list) else args} was cancelled")
+    if timed_out.is_set():
+        raise subprocess.TimeoutExpired(args, timeout)
@@ -0,0 +1,123 @@
+import argparse
+import os
+import queue
+import threading
+import tty
+import lora_sim
+
+'''
+A fake Feather on a pseudo-terminal, to run the basestation without hardware:
+
+    python fake_feather.py --distance 300 --loss 0.05 --window 8
+    [FAKE] Feather on /dev/pts/4
+    cd ../basestation_code && python main.py --port /dev/pts/4
+
+Every line the basestation writes to the port is run as a command over the
+simulated link (lora_sim.py), in real time, between the rover's
+CommandHandler and the Feather's code.py. What the Feather prints and the
+frames it forwards go back over the port byte for byte as the board sends
+them, so the basestation's reader, framing and decoders handle a real serial
+stream. A line typed during a transfer (STOP) reaches the Feather as it
+would on the board.
+'''
+
+
+class PtyPort:
+    """The Feather's end of a pty; the basestation opens the other end as its serial port."""
+
+    def __init__(self):
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)  # No echo or newline translation, like the Feather's USB serial
+        self.name = os.ttyname(self.slave)
+        self.lines = queue.Queue()
+        self.bytes = 0
+        self.writes = 0
+        self.lock = threading.Lock()
+        threading.Thread(target=self._read_lines, name="pty", daemon=True).start()
+
+    def write(self, data):
+        with self.lock:
+            view = memoryview(bytes(data))
+            while view:
+                view = view[os.write(self.master, view):]
+            self.bytes += len(data)
+            self.writes += 1
+        return len(data)
+
+    def print(self, *args, sep=" ", end="\n", **kwargs):
+        """The Feather's print(); the CircuitPython console ends lines with CRLF."""
+        text = sep.join(str(arg) for arg in args) + end
+        self.write(text.replace("\n", "\r\n").encode("utf-8"))
+
+    def read_command(self):
+        """A line the basestation sent, or None; the Feather's read_serial_command()."""
+        try:
+            return self.lines.get_nowait()
+        except queue.Empty:
+            return None
+
+    def commands(self):
+        """Every line the basestation sends, as it arrives."""
+        while True:
+            line = self.lines.get()
+            if line is None:
+                return
+            yield line
+
+    def _read_lines(self):
+        pending = bytearray()
+        while True:
+            try:
+                data = os.read(self.master, 1024)
+            except OSError:
+                data = b""
+            if not data:
+                self.lines.put(None)
+                return
+            pending += data
+            *lines, rest = pending.split(b"\n")
+            pending = bytearray(rest)
+            for line in lines:
+                line = line.decode("utf-8", errors="replace").strip()
+                if line:
+                    print(f"[FAKE] Basestation sent: {line}")
+                    self.lines.put(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Feather on a pty, backed by the simulated LoRa link")
+    parser.add_argument("--distance", type=float, default=100.0, help="Rover to basestation distance (m)")
+    parser.add_argument("--sf", type=int, default=lora_sim.DEFAULT_SF, choices=sorted(lora_sim.SENSITIVITY))
+    parser.add_argument("--loss", default="none", help="none, a probability for Bernoulli loss, or ge for bursts")
+    parser.add_argument("--window", type=int, default=1, help="Window size for file transfers")
+    parser.add_argument("--packet-size", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--time-scale", type=float, default=1.0,
+                        help="Wall time per second on air (0.1 = ten times faster than real)")
+    options = parser.parse_args()
+
+    if options.loss == "none":
+        loss = None
+    elif options.loss == "ge":
+        loss = lora_sim.GilbertElliottLoss()
+    else:
+        loss = lora_sim.BernoulliLoss(float(options.loss))
+    # Real time: the basestation types commands whenever it likes, which virtual time cannot wait for
+    channel = lora_sim.SimChannel(options.distance, options.sf, loss=loss, clock=lora_sim.RealClock(options.time_scale),
+                                  seed=options.seed)
+
+    port = PtyPort()
+    feather = lora_sim.load_feather()
+    feather.print = port.print
+    feather.read_serial_command = port.read_command
+    print(f"[FAKE] Feather on {port.name}")
+    print(f"[FAKE] Start the basestation with: python main.py --port {port.name}")
+    try:
+        lora_sim.run_session(port.commands(), channel, options.window, options.packet_size, feather=feather,
+                             serial_out=port)
+    except KeyboardInterrupt:
+        print("\n[CTRL+C] Fake Feather stopped.")
+
+
+if __name__ == "__main__":
+    main()
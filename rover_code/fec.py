@@ -0,0 +1,53 @@
+try:
+    from reedsolo import RSCodec
+except ImportError:
+    RSCodec = None
+    print("Warning: reedsolo is not installed. FEC transfers are disabled.")
+
+from framing import fec_layout
+
+'''
+Reed-Solomon erasure coding across transfer chunks.
+
+Chunks are grouped into blocks of up to FEC_BLOCK_SIZE data chunks. For every
+byte column j of a block, (data chunk 0..k-1)[j] is an RS(k+m, k) message whose
+m parity symbols become byte j of the block's parity chunks. The basestation
+can rebuild a block from any k of its k+m chunks (basestation_code/fec.py).
+'''
+
+FEC_BLOCK_SIZE = 16     # Data chunks per block
+
+
+def fec_available():
+    return RSCodec is not None
+
+
+def parity_for(redundancy_percent, block_size=FEC_BLOCK_SIZE):
+    """Parity chunks per full block for a redundancy percentage."""
+    return max(1, (block_size * redundancy_percent + 99) // 100)
+
+
+def fec_encode(chunks, chunk_size, parity, block_size=FEC_BLOCK_SIZE):
+    """
+    Pads chunks to chunk_size and returns them interleaved with parity chunks
+    in the order given by framing.fec_layout().
+    """
+    if RSCodec is None:
+        raise RuntimeError("reedsolo is not installed")
+
+    padded = [bytes(chunk) + bytes(chunk_size - len(chunk)) for chunk in chunks]
+    encoded = []
+    codecs = {}
+    index = 0
+    for _, k, m in fec_layout(len(padded), block_size, parity):
+        block = padded[index:index + k]
+        index += k
+        codec = codecs.get(m) or codecs.setdefault(m, RSCodec(m))
+        parity_chunks = [bytearray(chunk_size) for _ in range(m)]
+        for column in range(chunk_size):
+            codeword = codec.encode(bytes(chunk[column] for chunk in block))
+            for p in range(m):
+                parity_chunks[p][column] = codeword[k + p]
+        encoded.extend(block)
+        encoded.extend(bytes(chunk) for chunk in parity_chunks)
+    return encoded
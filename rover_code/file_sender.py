@@ -1,24 +1,76 @@
 import time
 import math
+from contextlib import nullcontext
+from framing import encode_frame, HEADER_SIZE, MAX_PACKET_SIZE, TYPE_FILE
+from windowed_transfer import WindowedSender, chunk_payload
+from fec import fec_available, fec_encode, parity_for, FEC_BLOCK_SIZE
 
-def send_file(hex_data, handler):
+def send_file(data, handler, packet_size=None):
     """
-    Sends a base16 (hex) encoded string over LoRa using the provided handler.
-    Each packet contains handler.max_packet_size bytes = max_packet_size hex characters.
+    Sends raw bytes over LoRa using the provided handler as TYPE_FILE frames
+    tagged with the handler's current message id.
+    Each frame is at most packet_size (default handler.max_packet_size) bytes
+    including the frame header, and never more than MAX_PACKET_SIZE.
+    With a window size above 1 the data goes out as a windowed selective-repeat
+    transfer instead of one send_with_ack per packet, optionally with
+    Reed-Solomon parity chunks (handler.fec_redundancy percent).
+    With CONFIG ADAPTIVE on, handler.link sets the packet size and pacing.
+    Under the CommandExecutor a windowed transfer holds the radio for its
+    duration, and a cancelled job stops between packets or bursts.
     """
-    packet_list = [hex_data[i:i + handler.max_packet_size] for i in range(0, len(hex_data), handler.max_packet_size)]
-    
-    print(f"Total packets to send: {len(packet_list)}")
+    if isinstance(data, str):
+        data = data.encode('ascii')
+    packet_size = min(packet_size or handler.max_packet_size, MAX_PACKET_SIZE)
+    chunks = chunk_payload(data, packet_size)
 
-    # set delay before sending ACK
-    handler.rfm9x.ack_delay = 0.1
     # set node addresses
     handler.rfm9x.node = 1
     handler.rfm9x.destination = 2
 
-    for packet in packet_list:
-        print(packet.encode('ascii'))
-        handler.rfm9x.send_with_ack(packet.encode('ascii'))
-        time.sleep(0.1)
+    cancel = handler.cancel_event() if hasattr(handler, "cancel_event") else None
+    if getattr(handler, "window_size", 1) > 1:
+        exclusive = getattr(handler.rfm9x, "exclusive", nullcontext)
+        with exclusive():
+            return _send_windowed(data, chunks, handler, cancel, packet_size)
+
+    print(f"Total packets to send: {len(chunks)}")
+
+    # set delay before sending ACK
+    handler.rfm9x.ack_delay = 0.1
+
+    adaptive = getattr(handler, "link", None) is not None
+    total = len(chunks)
+    for seq, chunk in enumerate(chunks):
+        if cancel is not None and cancel.is_set():
+            print(f"[CANCELLED] File transfer stopped at packet {seq} of {total}")
+            return False
+        frame = encode_frame(TYPE_FILE, chunk, msg_id=handler.msg_id, seq=seq, total=total)
+        if adaptive:
+            # The controller paces the packets itself
+            ok = handler.send_packet(frame)
+        else:
+            ok = handler.rfm9x.send_with_ack(frame)
+            time.sleep(0.1)
+        if not ok:
+            print(f"[ERROR] Packet {seq} of {total} was not acknowledged")
+
+    return True
+
 
-    return True
\ No newline at end of file
+def _send_windowed(data, chunks, handler, cancel, packet_size):
+    sender = WindowedSender(handler.rfm9x, window=handler.window_size, cancel=cancel)
+    redundancy = getattr(handler, "fec_redundancy", 0)
+    if redundancy > 0 and fec_available():
+        chunk_size = packet_size - HEADER_SIZE
+        parity = parity_for(redundancy)
+        encoded = fec_encode(chunks, chunk_size, parity)
+        print(f"Total packets to send: {len(encoded)} ({len(chunks)} data + {len(encoded) - len(chunks)} parity, "
+              f"window {handler.window_size}, transfer {handler.msg_id})")
+        ok = sender.send(encoded, handler.msg_id, fec_block=FEC_BLOCK_SIZE, fec_parity=parity,
+                         data_chunks=len(chunks), data_length=len(data))
+    else:
+        print(f"Total packets to send: {len(chunks)} (window {handler.window_size}, transfer {handler.msg_id})")
+        ok = sender.send(chunks, handler.msg_id)
+    if hasattr(handler, "on_transfer"):
+        handler.on_transfer(sender.stats)
+    return ok
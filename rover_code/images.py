@@ -2,14 +2,62 @@ import os
 import math
 import zlib
 import png
-import base64
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+    print("Warning: numpy is not installed. Images are converted pixel by pixel (slow).")
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None  # PNGs are decoded with pypng
+
+'''
+PNG to packed greyscale levels for SCREENSHOT and CAMERA: decode, convert to
+greyscale, resize, optionally Floyd-Steinberg dither, quantize and pack.
+
+With numpy every step except the dithering runs on whole arrays (and Pillow,
+if installed, decodes 8-bit PNGs); without it the per-pixel code runs. Both
+give the same bytes for the same settings.
+'''
 
 
 def clip(value):
     return int(max(0, min(255, round(value))))
 
 
+def _decode_png(image_path):
+    """(width, height, samples as a 2-D array, greyscale, channels) using Pillow if it can decode losslessly."""
+    reader = png.Reader(image_path)
+    if Image is not None:
+        reader.preamble()  # Header only; Pillow decodes 8-bit PNGs far faster than pypng
+        modes = {"L": 1, "LA": 2, "RGB": 3, "RGBA": 4}
+        if reader.bitdepth == 8:
+            with Image.open(image_path) as picture:
+                if picture.mode in modes:
+                    samples = np.asarray(picture).reshape(picture.height, -1)
+                    return picture.width, picture.height, samples, picture.mode in ("L", "LA"), modes[picture.mode]
+        reader = png.Reader(image_path)
+    width, height, rows, info = reader.read()
+    samples = np.array([list(row) for row in rows])
+    return width, height, samples, info.get('greyscale', False), info.get('planes', 3)
+
+
 def read_image_to_grayscale(image_path):
+    """
+    Returns the image as rows of greyscale values (a 2-D array with numpy,
+    a list of lists without), its width and its height.
+    """
+    if np is not None:
+        width, height, samples, greyscale, channels = _decode_png(image_path)
+        if greyscale:
+            return samples, width, height
+        pixels = samples.reshape(height, -1, channels).astype(np.float64)
+        gray = 0.299 * pixels[:, :, 0] + 0.587 * pixels[:, :, 1] + 0.114 * pixels[:, :, 2]
+        return np.round(gray).astype(np.int64), width, height
+
     reader = png.Reader(image_path)
     width, height, rows, info = reader.read()
     rows = list(rows)
@@ -34,10 +82,26 @@ def read_image_to_grayscale(image_path):
     return image, width, height
 
 
-def resize_image(image, new_size):
+def resize_image(image, new_size, method="nearest"):
+    """
+    Nearest-neighbour resize, or with method "area" (numpy only) the mean of
+    the source pixels each new pixel covers, which keeps detail when shrinking
+    a camera frame.
+    """
     new_width, new_height = new_size
     orig_height = len(image)
     orig_width = len(image[0])
+
+    if np is not None:
+        image = np.asarray(image)
+        if method == "area":
+            return _resize_area(image, new_width, new_height)
+        rows = (np.arange(new_height) * orig_height / new_height).astype(np.int64)
+        cols = (np.arange(new_width) * orig_width / new_width).astype(np.int64)
+        return image[np.ix_(rows, cols)]
+    if method == "area":
+        print("[IMAGE] Area resize needs numpy; using nearest neighbour")
+
     new_image = []
 
     for j in range(new_height):
@@ -51,31 +115,93 @@ def resize_image(image, new_size):
     return new_image
 
 
-def convert_image(image_path, bit_depth=4, size=(256, 256), dithering=True):
-    assert 1 <= bit_depth <= 7, "bit_depth must be between 1 and 7"
+def _resize_area(image, new_width, new_height):
+    orig_height, orig_width = image.shape
+    # Integral image: the sum over any source box is four lookups
+    sums = np.zeros((orig_height + 1, orig_width + 1), dtype=np.int64)
+    sums[1:, 1:] = image.cumsum(axis=0).cumsum(axis=1)
+    y0 = np.arange(new_height) * orig_height // new_height
+    y1 = np.maximum((np.arange(1, new_height + 1) * orig_height) // new_height, y0 + 1)
+    x0 = np.arange(new_width) * orig_width // new_width
+    x1 = np.maximum((np.arange(1, new_width + 1) * orig_width) // new_width, x0 + 1)
+    total = (sums[np.ix_(y1, x1)] - sums[np.ix_(y0, x1)] - sums[np.ix_(y1, x0)] + sums[np.ix_(y0, x0)])
+    area = np.outer(y1 - y0, x1 - x0)
+    return np.round(total / area).astype(np.int64)
+
+
+def floyd_steinberg(rows, max_val):
+    """
+    Dithers rows of 0-255 values in place to max_val + 1 levels (still on the
+    0-255 scale). The error has to travel along each row pixel by pixel, so
+    this stays a Python loop; it works on plain lists with the quantized
+    values looked up, and does the same arithmetic as clip().
+    """
+    height = len(rows)
+    width = len(rows[0])
+    step = 255 // max_val
+    peak = max(256, max(max(row) for row in rows) + 1)
+    levels = [int(round(value * max_val / 255) * step) for value in range(peak)]
+
+    for y in range(height):
+        row = rows[y]
+        below = rows[y + 1] if y + 1 < height else None
+        for x in range(width):
+            old = row[x]
+            new = levels[old]
+            row[x] = new
+            error = old - new
+
+            if x + 1 < width:
+                value = round(row[x + 1] + error * 7 / 16)
+                row[x + 1] = 0 if value < 0 else 255 if value > 255 else value
+            if below is not None:
+                if x:
+                    value = round(below[x - 1] + error * 3 / 16)
+                    below[x - 1] = 0 if value < 0 else 255 if value > 255 else value
+                value = round(below[x] + error * 5 / 16)
+                below[x] = 0 if value < 0 else 255 if value > 255 else value
+                if x + 1 < width:
+                    value = round(below[x + 1] + error * 1 / 16)
+                    below[x + 1] = 0 if value < 0 else 255 if value > 255 else value
+    return rows
+
+
+def frame_to_grayscale(frame):
+    """Greyscale rows of a camera frame (OpenCV's BGR or BGRA order, or already greyscale)."""
+    frame = np.asarray(frame)
+    if frame.ndim == 2:
+        return frame.astype(np.int64)
+    pixels = frame.astype(np.float64)
+    # Same weights and rounding as read_image_to_grayscale, so a frame saved as PNG quantizes alike
+    gray = 0.299 * pixels[:, :, 2] + 0.587 * pixels[:, :, 1] + 0.114 * pixels[:, :, 0]
+    return np.round(gray).astype(np.int64)
 
+
+def quantize_image(image_path, bit_depth=4, size=(256, 256), dithering=True, resample="nearest"):
+    """Loads an image and returns its pixels, row by row, as bit_depth levels."""
     image, _, _ = read_image_to_grayscale(image_path)
-    image = resize_image(image, size)
-    width, height = size
+    return quantize_pixels(image, bit_depth, size, dithering, resample)
+
+
+def quantize_frame(frame, bit_depth=4, size=(64, 64), dithering=False, resample="nearest"):
+    """quantize_image() for a frame held in memory (camera.CameraSession); needs numpy, as OpenCV does."""
+    return quantize_pixels(frame_to_grayscale(frame), bit_depth, size, dithering, resample)
+
+
+def quantize_pixels(image, bit_depth, size, dithering, resample):
+    """Resizes greyscale rows, optionally dithers them, and returns them flat as bit_depth levels."""
+    assert 1 <= bit_depth <= 7, "bit_depth must be between 1 and 7"
+
+    image = resize_image(image, size, resample)
     max_val = (1 << bit_depth) - 1
 
-    if dithering:
-        for y in range(height):
-            for x in range(width):
-                old_pixel = image[y][x]
-                new_pixel_val = round(old_pixel * max_val / 255)
-                new_pixel = int(new_pixel_val * (255 // max_val))
-                image[y][x] = new_pixel
-                error = old_pixel - new_pixel
+    if np is not None:
+        if dithering:
+            image = np.array(floyd_steinberg(image.tolist(), max_val))
+        return (image.astype(np.int64) * max_val // 255).ravel().tolist()
 
-                if x + 1 < width:
-                    image[y][x + 1] = clip(image[y][x + 1] + error * 7 / 16)
-                if x - 1 >= 0 and y + 1 < height:
-                    image[y + 1][x - 1] = clip(image[y + 1][x - 1] + error * 3 / 16)
-                if y + 1 < height:
-                    image[y + 1][x] = clip(image[y + 1][x] + error * 5 / 16)
-                if x + 1 < width and y + 1 < height:
-                    image[y + 1][x + 1] = clip(image[y + 1][x + 1] + error * 1 / 16)
+    if dithering:
+        floyd_steinberg(image, max_val)
 
     # Flatten image
     flat_pixels = []
@@ -84,7 +210,18 @@ def convert_image(image_path, bit_depth=4, size=(256, 256), dithering=True):
             quantized = pixel * max_val // 255
             flat_pixels.append(quantized)
 
-    # Pack into bytes
+    return flat_pixels
+
+
+def pack_pixels(flat_pixels, bit_depth):
+    """Packs bit_depth-bit values MSB first, padding the last byte with zeros."""
+    if np is not None:
+        values = np.asarray(flat_pixels, dtype=np.uint8)
+        # One row of bits per value, most significant first, then eight bits to a byte
+        shifts = np.arange(bit_depth - 1, -1, -1, dtype=np.uint8)
+        bits = (values[:, None] >> shifts) & 1
+        return bytearray(np.packbits(bits.ravel()).tobytes())
+
     packed_bytes = bytearray()
     buffer = 0
     bits_filled = 0
@@ -101,12 +238,17 @@ def convert_image(image_path, bit_depth=4, size=(256, 256), dithering=True):
         buffer = buffer << (8 - bits_filled)
         packed_bytes.append(buffer & 0xFF)
 
-    compressed = zlib.compress(packed_bytes)
+    return packed_bytes
+
+
+def convert_image(image_path, bit_depth=4, size=(256, 256), dithering=True):
+    flat_pixels = quantize_image(image_path, bit_depth, size, dithering)
+    compressed = zlib.compress(pack_pixels(flat_pixels, bit_depth))
 
     # hex_output = compressed.hex()
     # print(f"Image converted successfully. Total hex length: {len(hex_output)}")
     # return hex_output
 
-    b64_output = base64.b64encode(compressed).decode('ascii')
-    print(f"Image converted successfully. Total base64 length: {len(b64_output)}")
-    return b64_output
+    # Frames carry raw bytes, so the zlib stream is sent as-is (no base64 inflation)
+    print(f"Image converted successfully. Total compressed length: {len(compressed)}")
+    return compressed
@@ -0,0 +1,180 @@
+import csv
+import os
+import time
+from framing import MAX_PACKET_SIZE, HEADER_SIZE
+
+'''
+Adapts packet size and inter-packet delay to the link (CONFIG ADAPTIVE).
+
+Every send_with_ack is timed. A send that took ack_wait longer than the
+latency estimate needed a retry; the smoothed retry rate at the current size
+gives a bit error estimate, and from that the packet size with the best
+expected goodput (payload per second including retries). Every INCREASE_AFTER
+sends the size moves towards that target: up by SIZE_STEP bytes, down by
+RETRY_FACTOR. A send that is never ACKed halves the packet and adds DELAY_STEP
+to the inter-packet delay; clean sends take it away again. Windowed transfers
+report their retransmission rate afterwards. The starting size is the
+best-throughput payload size from the range tests in
+collected_data/long_range_radio_data.csv.
+'''
+
+LINK_DATA_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "collected_data", "long_range_radio_data.csv")
+
+MIN_PACKET_SIZE = 32
+DEFAULT_PACKET_SIZE = 128
+SIZE_STEP = 16              # Additive increase (bytes)
+FAIL_FACTOR = 0.5           # Multiplicative decrease after a failed send
+RETRY_FACTOR = 0.75         # Multiplicative decrease towards a smaller target
+INCREASE_AFTER = 4          # Sends between size adjustments
+DEFAULT_DELAY = 0.05        # Inter-packet delay (seconds)
+DELAY_STEP = 0.05
+MAX_DELAY = 1.0
+LATENCY_PER_BYTE = 0.0024   # Slope of latency vs. payload size in the range tests (s/byte)
+BASE_RTT = 0.25             # Initial per-packet latency estimate excluding payload bytes (s)
+RTT_ALPHA = 0.125           # Smoothing factor for the latency estimate
+LOSS_ALPHA = 0.1            # Smoothing factor for the retry rate
+RETRY_MARGIN = 0.75         # Fraction of ack_wait over the estimate that counts as a retry
+LOSS_THRESHOLD = 0.1        # Windowed retransmission rate that counts as a lossy link
+
+
+def best_payload_size(path=LINK_DATA_CSV, location=None, default=DEFAULT_PACKET_SIZE):
+    """
+    Payload size with the highest mean throughput in the range test CSV,
+    optionally for one location only. Falls back to default if the file is missing.
+    """
+    totals = {}
+    try:
+        with open(path, newline='') as f:
+            for row in csv.DictReader(f):
+                if location and row["Location"].strip().lower() != location.lower():
+                    continue
+                size = int(row["Payload Size"])
+                throughput, count = totals.get(size, (0.0, 0))
+                totals[size] = (throughput + float(row["Throughput"]), count + 1)
+    except (OSError, KeyError, ValueError) as e:
+        print(f"[LINK] Could not read range test data: {e}")
+        return default
+    if not totals:
+        return default
+    return max(totals, key=lambda size: totals[size][0] / totals[size][1])
+
+
+class LinkController:
+    def __init__(self, packet_size=None, delay=DEFAULT_DELAY, min_size=MIN_PACKET_SIZE,
+                 max_size=MAX_PACKET_SIZE, ack_wait=0.5, clock=time.monotonic, sleep=time.sleep):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.ack_wait = ack_wait
+        self.clock = clock
+        self.sleep = sleep
+        self.initial_delay = delay
+        self.reset(packet_size)
+
+    def reset(self, packet_size=None):
+        """Starts over from packet_size, or from the range test data if not given."""
+        if packet_size is None:
+            packet_size = best_payload_size()
+        self.packet_size = max(self.min_size, min(self.max_size, int(packet_size)))
+        self.delay = self.initial_delay
+        self.base_rtt = BASE_RTT
+        self.loss = 0.0
+        self.loss_size = float(self.packet_size)  # Mean packet size the retry rate was measured at
+        self.clean = 0
+        self.sends = 0
+        self.stats = {"sends": 0, "failures": 0, "retries": 0, "increases": 0, "decreases": 0}
+        print(f"[LINK] Starting at {self.packet_size} bytes, {self.delay:.2f}s between packets")
+
+    def expected_rtt(self, size):
+        return self.base_rtt + LATENCY_PER_BYTE * size
+
+    def send_with_ack(self, rfm9x, packet):
+        """rfm9x.send_with_ack that records the outcome and then waits the current delay."""
+        start = self.clock()
+        ok = rfm9x.send_with_ack(packet)
+        self.on_send(ok, self.clock() - start, len(packet))
+        if self.delay > 0:
+            self.sleep(self.delay)
+        return ok
+
+    def on_send(self, success, elapsed, size):
+        self.stats["sends"] += 1
+        expected = self.expected_rtt(size)
+        retried = not success or elapsed > expected + self.ack_wait * RETRY_MARGIN
+        self.loss += LOSS_ALPHA * ((1.0 if retried else 0.0) - self.loss)
+        self.loss_size += LOSS_ALPHA * (size - self.loss_size)
+        if not success:
+            self.stats["failures"] += 1
+            self.sends = 0
+            self._decrease(FAIL_FACTOR, self.delay + DELAY_STEP, "no ACK")
+            return
+        if retried:
+            self.stats["retries"] += 1
+            self.clean = 0
+        else:
+            self.base_rtt += RTT_ALPHA * ((elapsed - LATENCY_PER_BYTE * size) - self.base_rtt)
+            self.clean += 1
+            if self.clean >= INCREASE_AFTER and self.delay > 0:
+                self._apply(self.packet_size, max(0.0, self.delay - DELAY_STEP), f"{self.clean} clean sends")
+                self.clean = 0
+
+        self.sends += 1
+        if self.sends >= INCREASE_AFTER:
+            self.sends = 0
+            target = self.best_size()
+            if target > self.packet_size:
+                self._increase(target, f"{self.loss:.0%} retries, target {target} bytes")
+            elif target < self.packet_size:
+                self._decrease(max(target / self.packet_size, RETRY_FACTOR), self.delay,
+                               f"{self.loss:.0%} retries, target {target} bytes")
+
+    def goodput(self, size, bit_error_rate):
+        """Expected payload bytes per second at this packet size, counting retries."""
+        delivered = (1 - bit_error_rate) ** (8 * size)
+        if delivered <= 0:
+            return 0.0
+        retry_cost = self.expected_rtt(size) + self.ack_wait
+        seconds = self.expected_rtt(size) + (1 / delivered - 1) * retry_cost + self.delay
+        return (size - HEADER_SIZE) / seconds
+
+    def best_size(self):
+        """Packet size with the best expected goodput for the current retry rate."""
+        if self.loss <= 0:
+            return self.max_size
+        bit_error_rate = 1 - (1 - min(self.loss, 0.99)) ** (1 / (8 * self.loss_size))
+        sizes = list(range(self.min_size, self.max_size, SIZE_STEP)) + [self.max_size]
+        return max(sizes, key=lambda size: self.goodput(size, bit_error_rate))
+
+    def on_transfer(self, stats):
+        """Feeds back the stats of a finished WindowedSender transfer."""
+        sent = stats.get("sent", 0)
+        if not sent:
+            return
+        rate = stats.get("retransmitted", 0) / sent
+        if stats.get("timeouts", 0) or rate > LOSS_THRESHOLD:
+            self._decrease(RETRY_FACTOR, self.delay + DELAY_STEP,
+                           f"transfer retransmitted {rate:.0%}, {stats.get('timeouts', 0)} ACK timeouts")
+        elif rate == 0:
+            self._increase(self.max_size, "clean transfer")
+
+    def _increase(self, target, reason):
+        size = min(target, self.max_size, self.packet_size + SIZE_STEP)
+        if size != self.packet_size:
+            self.stats["increases"] += 1
+            self._apply(size, self.delay, reason)
+
+    def _decrease(self, factor, delay, reason):
+        size = max(self.min_size, int(self.packet_size * factor))
+        delay = min(MAX_DELAY, delay)
+        if size != self.packet_size or delay != self.delay:
+            self.stats["decreases"] += 1
+            self._apply(size, delay, reason)
+
+    def _apply(self, size, delay, reason):
+        print(f"[LINK] Packet size {self.packet_size} -> {size} bytes, "
+              f"delay {self.delay:.2f} -> {delay:.2f}s ({reason})")
+        self.packet_size = size
+        self.delay = delay
+
+    def summary(self):
+        return (f"{self.packet_size} bytes, {self.delay:.2f}s delay, "
+                f"{self.stats['sends']} sends ({self.stats['failures']} failed, {self.stats['retries']} retried)")
@@ -0,0 +1,517 @@
+import argparse
+import importlib.util
+import math
+import os
+import random
+import sys
+import threading
+import time
+from collections import deque
+from airtime import time_on_air, RH_HEADER_SIZE, DEFAULT_SF, DEFAULT_BW, DEFAULT_CR
+
+'''
+Simulated LoRa radio pair for testing performance without hardware.
+
+SimChannel connects SimRadios that behave like adafruit_rfm9x.RFM9x as far as
+this project uses it: send, send_with_ack, receive(timeout, with_ack,
+with_header), ack_delay/ack_retries/ack_wait, node/destination/identifier,
+last_rssi/last_snr. Like the chip, a radio is half duplex, holds one unread
+packet, and only hears packets while listening (after receive, or send with
+keep_listening). Every frame costs its LoRa time on air for the configured
+spreading factor, bandwidth and coding rate.
+
+A packet is lost if the receiver was transmitting, if its RSSI (log-distance
+path loss with shadowing) falls near the receiver sensitivity for the
+spreading factor, or by the configured loss model (Bernoulli or
+Gilbert-Elliott bursts).
+
+With a VirtualClock, time only moves when every radio's thread is waiting on
+the channel, so a session runs as fast as the CPU allows and reports link
+time as it would be on air. RealClock runs in (optionally scaled) wall time.
+run_session() points the time module of the rover and Feather code at the
+channel clock so their sleeps and timeouts follow it.
+
+    python lora_sim.py --distance 800 --sf 9 --loss ge "PING" "ECHO 5 hello"
+'''
+
+BROADCAST = 0xFF
+FLAGS_ACK = 0x80
+FLAGS_RETRY = 0x40
+TX_POWER = 23               # dBm, as set in lora_setup.py
+PATH_LOSS_1M = 31.7         # dB at 1 m, free space at 915 MHz
+PATH_LOSS_EXPONENT = 2.7    # Suburban, partly obstructed
+SHADOWING = 4.0             # Standard deviation of the RSSI around the path loss (dB)
+NOISE_FIGURE = 6            # Receiver noise figure (dB)
+EDGE_SOFTNESS = 1.0         # dB; how gradually delivery falls off around the sensitivity
+
+# RFM95 sensitivity at 125 kHz (datasheet), dBm
+SENSITIVITY = {6: -118, 7: -123, 8: -126, 9: -129, 10: -132, 11: -134.5, 12: -137}
+
+
+def sensitivity(sf=DEFAULT_SF, bw=DEFAULT_BW):
+    return SENSITIVITY[sf] + 10 * math.log10(bw / 125000)
+
+
+class BernoulliLoss:
+    """Every packet is lost independently with probability p."""
+
+    def __init__(self, p):
+        self.p = p
+
+    def lost(self, rng):
+        return rng.random() < self.p
+
+    def __str__(self):
+        return f"bernoulli {self.p:g}"
+
+
+class GilbertElliottLoss:
+    """
+    Two-state burst loss: packets are lost with loss_good in the good state and
+    loss_bad in the bad one; the state flips with p_enter_bad / p_leave_bad per packet.
+    """
+
+    def __init__(self, p_enter_bad=0.05, p_leave_bad=0.3, loss_good=0.01, loss_bad=0.6):
+        self.p_enter_bad = p_enter_bad
+        self.p_leave_bad = p_leave_bad
+        self.loss_good = loss_good
+        self.loss_bad = loss_bad
+        self.bad = False
+
+    def lost(self, rng):
+        if self.bad:
+            self.bad = rng.random() >= self.p_leave_bad
+        else:
+            self.bad = rng.random() < self.p_enter_bad
+        return rng.random() < (self.loss_bad if self.bad else self.loss_good)
+
+    def __str__(self):
+        return (f"gilbert-elliott {self.p_enter_bad:g}/{self.p_leave_bad:g}, "
+                f"loss {self.loss_good:g} good / {self.loss_bad:g} bad")
+
+
+class RealClock:
+    """Wall time; scale < 1 runs the link faster than real (0.1 = ten times faster)."""
+
+    def __init__(self, scale=1.0):
+        self.scale = scale
+        self.start = time.monotonic()
+        self.condition = threading.Condition()
+
+    def time(self):
+        return (time.monotonic() - self.start) / self.scale
+
+    def join(self):
+        pass
+
+    def leave(self):
+        pass
+
+    def sleep(self, seconds):
+        time.sleep(seconds * self.scale)
+
+    def wait(self, timeout, predicate=None):
+        """Waits up to timeout seconds for predicate() to come true; returns its last value."""
+        with self.condition:
+            return self.condition.wait_for(predicate or (lambda: False), timeout * self.scale)
+
+    def notify(self):
+        with self.condition:
+            self.condition.notify_all()
+
+
+class VirtualClock:
+    """
+    Simulated time. Each radio joins as a participant; time jumps to the next
+    deadline once every participant is waiting and none of them can proceed.
+    A thread busy outside the channel (building a response) holds time still.
+    """
+
+    def __init__(self):
+        self.now = 0.0
+        self.condition = threading.Condition()
+        self.participants = 0
+        self.waiters = {}   # token -> (deadline, predicate)
+
+    def time(self):
+        return self.now
+
+    def join(self):
+        with self.condition:
+            self.participants += 1
+
+    def leave(self):
+        with self.condition:
+            self.participants -= 1
+            self._advance()
+
+    def sleep(self, seconds):
+        self.wait(seconds)
+
+    def wait(self, timeout, predicate=None):
+        """Waits up to timeout virtual seconds for predicate() to come true; returns its last value."""
+        with self.condition:
+            token = object()
+            self.waiters[token] = (self.now + (timeout if timeout is not None else math.inf), predicate)
+            try:
+                while True:
+                    if predicate is not None and predicate():
+                        return True
+                    if self.now >= self.waiters[token][0]:
+                        return False
+                    if not self._advance():
+                        self.condition.wait()
+            finally:
+                del self.waiters[token]
+
+    def notify(self):
+        with self.condition:
+            self.condition.notify_all()
+
+    def _advance(self):
+        # Caller holds the condition
+        if not self.waiters or len(self.waiters) < self.participants:
+            return False
+        if any(predicate is not None and predicate() for _, predicate in self.waiters.values()):
+            self.condition.notify_all()
+            return False
+        deadline = min(deadline for deadline, _ in self.waiters.values())
+        if deadline <= self.now:
+            self.condition.notify_all()  # Another waiter is due; let it run first
+            return False
+        if deadline == math.inf:
+            return False
+        self.now = deadline
+        self.condition.notify_all()
+        return True
+
+
+class SimTime:
+    """Stands in for the time module of code under simulation, so its timeouts follow the channel clock."""
+
+    def __init__(self, clock):
+        self.clock = clock
+
+    def time(self):
+        return self.clock.time()
+
+    def monotonic(self):
+        return self.clock.time()
+
+    def sleep(self, seconds):
+        self.clock.sleep(seconds)
+
+    def __getattr__(self, name):
+        return getattr(time, name)
+
+
+class SimChannel:
+    def __init__(self, distance=100.0, sf=DEFAULT_SF, bw=DEFAULT_BW, cr=DEFAULT_CR, loss=None, clock=None,
+                 seed=None, shadowing=SHADOWING, path_loss_exponent=PATH_LOSS_EXPONENT):
+        self.distance = distance
+        self.sf = sf
+        self.bw = bw
+        self.cr = cr
+        self.loss = loss
+        self.clock = clock or VirtualClock()
+        self.random = random.Random(seed)
+        self.shadowing = shadowing
+        self.path_loss_exponent = path_loss_exponent
+        self.radios = []
+        self.stats = {"frames": 0, "lost": 0, "collisions": 0, "deaf": 0, "weak": 0, "overwritten": 0,
+                      "airtime": 0.0}
+
+    def radio(self, name=None):
+        radio = SimRadio(self, name or f"radio{len(self.radios) + 1}")
+        self.radios.append(radio)
+        self.clock.join()
+        return radio
+
+    def time_on_air(self, size):
+        return time_on_air(size, self.sf, self.bw, self.cr)
+
+    def mean_rssi(self, tx_power=TX_POWER):
+        path_loss = PATH_LOSS_1M + 10 * self.path_loss_exponent * math.log10(max(self.distance, 1.0))
+        return tx_power - path_loss
+
+    def transmit(self, sender, packet):
+        """Puts a packet on air, blocking the sender for its time on air, then delivers it."""
+        airtime = self.time_on_air(len(packet))
+        with self.clock.condition:
+            start = self.clock.time()
+            sender.tx_start, sender.tx_end = start, start + airtime
+            self.stats["frames"] += 1
+            self.stats["airtime"] += airtime
+        self.clock.sleep(airtime)
+        with self.clock.condition:
+            for radio in self.radios:
+                if radio is not sender and not radio.closed:
+                    self._deliver(sender, radio, packet, start)
+            self.clock.condition.notify_all()
+
+    def _deliver(self, sender, radio, packet, start):
+        # Caller holds the clock condition
+        if radio.tx_start < self.clock.time() and radio.tx_end > start:
+            self.stats["collisions"] += 1  # Half duplex: it was transmitting itself
+            return
+        if not radio.listening:
+            self.stats["deaf"] += 1
+            return
+        rssi = self.mean_rssi(sender.tx_power) + self.random.gauss(0, self.shadowing)
+        margin = rssi - sensitivity(self.sf, self.bw)
+        if self.random.random() >= 1 / (1 + math.exp(-margin / EDGE_SOFTNESS)):
+            self.stats["weak"] += 1
+            return
+        if self.loss is not None and self.loss.lost(self.random):
+            self.stats["lost"] += 1
+            return
+        if radio.fifo:
+            self.stats["overwritten"] += 1  # The chip keeps only the newest packet
+        radio.fifo.clear()
+        noise = -174 + 10 * math.log10(self.bw) + NOISE_FIGURE
+        radio.fifo.append((bytes(packet), int(rssi), rssi - noise))
+
+    def summary(self):
+        stats = self.stats
+        dropped = stats["lost"] + stats["collisions"] + stats["deaf"] + stats["weak"] + stats["overwritten"]
+        return (f"{stats['frames']} frames, {stats['airtime']:.1f}s on air, {dropped} dropped "
+                f"({stats['weak']} weak, {stats['lost']} loss model, {stats['collisions']} collisions, "
+                f"{stats['deaf']} not listening, {stats['overwritten']} overwritten)")
+
+
+class SimRadio:
+    """Stands in for adafruit_rfm9x.RFM9x on a SimChannel."""
+
+    def __init__(self, channel, name):
+        self.channel = channel
+        self.name = name
+        self.node = BROADCAST
+        self.destination = BROADCAST
+        self.identifier = 0
+        self.flags = 0
+        self.ack_delay = None
+        self.ack_retries = 5
+        self.ack_wait = 0.5
+        self.receive_timeout = 0.5
+        self.xmit_timeout = 2.0
+        self.tx_power = TX_POWER
+        self.last_rssi = 0
+        self.last_snr = 0.0
+        self.sequence_number = 0
+        self.seen_ids = bytearray(256)
+        self.fifo = deque()
+        self.listening = False
+        self.tx_start = self.tx_end = -1.0
+        self.closed = False
+
+    @property
+    def spreading_factor(self):
+        return self.channel.sf
+
+    @property
+    def signal_bandwidth(self):
+        return self.channel.bw
+
+    @property
+    def coding_rate(self):
+        return self.channel.cr
+
+    def close(self):
+        """Takes the radio off the channel; a VirtualClock stops waiting for its thread."""
+        if not self.closed:
+            self.closed = True
+            self.channel.clock.leave()
+
+    def send(self, data, *, keep_listening=False, destination=None, node=None, identifier=None, flags=None):
+        data = bytes(data)
+        if len(data) > 252:
+            raise ValueError("Data must be 252 bytes or less")
+        header = bytes((
+            self.destination if destination is None else destination,
+            self.node if node is None else node,
+            self.identifier if identifier is None else identifier,
+            self.flags if flags is None else flags,
+        ))
+        self.listening = False
+        self.channel.transmit(self, header + data)
+        self.listening = keep_listening
+        return True
+
+    def send_with_ack(self, data):
+        retries_remaining = self.ack_retries if self.ack_retries else 1
+        got_ack = False
+        self.sequence_number = (self.sequence_number + 1) & 0xFF
+        while not got_ack and retries_remaining:
+            self.identifier = self.sequence_number
+            self.send(data, keep_listening=True)
+            if self.destination == BROADCAST:
+                got_ack = True
+            else:
+                ack = self.receive(timeout=self.ack_wait, with_header=True)
+                if ack is not None and ack[3] & FLAGS_ACK and ack[2] == self.identifier:
+                    got_ack = True
+                    break
+            if not got_ack:
+                self.channel.clock.sleep(self.ack_wait + self.ack_wait * self.channel.random.random())
+            retries_remaining -= 1
+            self.flags |= FLAGS_RETRY
+        self.flags = 0
+        return got_ack
+
+    def receive(self, *, keep_listening=True, with_header=False, with_ack=False, timeout=None):
+        if timeout is None:
+            timeout = self.receive_timeout
+        clock = self.channel.clock
+        self.listening = True
+        if not clock.wait(timeout, lambda: bool(self.fifo)):
+            self.listening = keep_listening
+            return None
+        with clock.condition:
+            packet, self.last_rssi, self.last_snr = self.fifo.popleft()
+
+        if len(packet) < RH_HEADER_SIZE + 1:
+            packet = None
+        elif self.node != BROADCAST and packet[0] != BROADCAST and packet[0] != self.node:
+            packet = None  # Addressed to another node
+        elif with_ack and not packet[3] & FLAGS_ACK and packet[0] != BROADCAST:
+            if self.ack_delay is not None:
+                clock.sleep(self.ack_delay)
+            self.send(b"!", destination=packet[1], node=packet[0], identifier=packet[2],
+                      flags=packet[3] | FLAGS_ACK)
+            if self.seen_ids[packet[1]] == packet[2] and packet[3] & FLAGS_RETRY:
+                packet = None  # Retransmission of a packet we already returned
+            else:
+                self.seen_ids[packet[1]] = packet[2]
+        self.listening = keep_listening
+        if packet is not None and not with_header:
+            packet = packet[RH_HEADER_SIZE:]
+        return packet
+
+
+def load_feather():
+    """Imports the Feather's code.py as a module (its radio setup only runs in main())."""
+    feather_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "adafruit_feather_code")
+    if feather_dir not in sys.path:
+        sys.path.append(feather_dir)  # After rover_code, whose framing.py is the same file
+    spec = importlib.util.spec_from_file_location("feather_code", os.path.join(feather_dir, "code.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class SerialSink:
+    """Collects what the Feather would write to the basestation's serial port."""
+
+    def __init__(self):
+        self.bytes = 0
+        self.writes = 0
+
+    def write(self, data):
+        self.bytes += len(data)
+        self.writes += 1
+        return len(data)
+
+
+def serve(handler, radio, stop):
+    """The rover's receive loop, one command at a time so simulated time stays exact."""
+    from executor import parse_packet, run_lines
+
+    while not stop.is_set():
+        packet = radio.receive(timeout=0.5, with_ack=True)
+        if not packet:
+            continue
+        lines = parse_packet(packet)
+        if lines:
+            try:
+                run_lines(handler, lines)
+            except Exception as e:
+                print(f"[ERROR] Packet processing failed: {e}")
+
+
+def run_session(commands, channel, window=1, packet_size=None, feather=None, serial_out=None, metrics_path=None):
+    """
+    Runs the rover CommandHandler and the Feather's handle_command against each
+    other on channel. feather (default load_feather()) writes its forwarded
+    frames to serial_out (default a SerialSink that only counts them). The
+    rover's metrics are written to metrics_path as JSON, if given.
+    """
+    import airtime
+    import command_handler
+    import file_sender
+    import windowed_transfer
+    from command_handler import CommandHandler
+
+    rover_radio = channel.radio("rover")
+    feather_radio = channel.radio("feather")
+    handler = CommandHandler(rover_radio)
+    handler.window_size = window
+    if packet_size:
+        handler.max_packet_size = packet_size
+
+    feather = feather or load_feather()
+    feather.serial_out = sink = serial_out or SerialSink()
+    sim_time = SimTime(channel.clock)
+    for module in (airtime, command_handler, file_sender, windowed_transfer, feather, sys.modules["windowed_receiver"]):
+        module.time = sim_time
+    feather_radio.ack_delay = 0.01
+    feather_radio.node = 2
+    feather_radio.destination = 1
+
+    stop = threading.Event()
+    rover = threading.Thread(target=serve, args=(handler, rover_radio, stop), name="rover", daemon=True)
+    rover.start()
+    results = []
+    try:
+        for command in commands:
+            start, frames, writes = channel.clock.time(), channel.stats["frames"], sink.writes
+            feather.handle_command(feather_radio, command)
+            results.append((command, channel.clock.time() - start, channel.stats["frames"] - frames,
+                            sink.writes - writes))
+    finally:
+        stop.set()
+        feather_radio.close()
+        rover.join()
+        rover_radio.close()
+    if metrics_path:
+        handler.metrics.write_json(metrics_path)
+        print(f"[SIM] Rover metrics written to {metrics_path}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run rover commands over a simulated LoRa link")
+    parser.add_argument("commands", nargs="+", help="Commands as typed at the basestation")
+    parser.add_argument("--distance", type=float, default=100.0, help="Rover to basestation distance (m)")
+    parser.add_argument("--sf", type=int, default=DEFAULT_SF, choices=sorted(SENSITIVITY))
+    parser.add_argument("--bw", type=int, default=DEFAULT_BW, help="Bandwidth (Hz)")
+    parser.add_argument("--cr", type=int, default=DEFAULT_CR, choices=(5, 6, 7, 8), help="Coding rate 4/CR")
+    parser.add_argument("--loss", default="none", help="none, a probability for Bernoulli loss, or ge for bursts")
+    parser.add_argument("--window", type=int, default=1, help="Window size for file transfers")
+    parser.add_argument("--packet-size", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--real-time", type=float, metavar="SCALE", default=None,
+                        help="Run in wall time scaled by SCALE (1 = real time) instead of virtual time")
+    parser.add_argument("--metrics", metavar="PATH", default=None, help="Write the rover's metrics to PATH as JSON")
+    options = parser.parse_args()
+
+    if options.loss == "none":
+        loss = None
+    elif options.loss == "ge":
+        loss = GilbertElliottLoss()
+    else:
+        loss = BernoulliLoss(float(options.loss))
+    clock = RealClock(options.real_time) if options.real_time else VirtualClock()
+    channel = SimChannel(options.distance, options.sf, options.bw, options.cr, loss, clock, options.seed)
+
+    print(f"[SIM] SF{channel.sf} {channel.bw / 1000:g} kHz 4/{channel.cr}, {channel.distance:g} m, "
+          f"mean RSSI {channel.mean_rssi():.0f} dBm (sensitivity {sensitivity(channel.sf, channel.bw):.0f}), "
+          f"loss {loss or 'none'}, {'virtual' if options.real_time is None else 'real'} time")
+    results = run_session(options.commands, channel, options.window, options.packet_size,
+                          metrics_path=options.metrics)
+    for command, elapsed, frames, forwarded in results:
+        print(f"[SIM] {command:<24} {elapsed:7.2f}s link time, {frames} frames on air, {forwarded} forwarded")
+    print(f"[SIM] {channel.summary()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from payloads import STATS_HEADER, STATS_COMMAND
+
+'''
+Counters, gauges and fixed-bucket histograms for where rover time goes.
+
+CommandHandler owns one Metrics. Command dispatch times every handler run
+(command.seconds, command.runs/errors/cancelled per command), the
+AirtimeScheduler counts every transmission (tx.packets, tx.bytes, tx.retries,
+tx.failures per command, tx.seconds) and the executor reports its radio
+queue (radio.queue gauge, radio.queue_seconds). Recording is a lock and a
+few dict and list operations, a couple of microseconds per packet; record()
+takes the lock once for all of a packet's counters and its latency.
+
+STATS sends snapshot() packed with pack() in TYPE_STATS frames; write_json()
+and text() are for bench runs on the rover or in the simulator.
+'''
+
+# Upper bounds (s); the last bucket takes everything slower
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+COMMAND_NAME_SIZE = 8  # The name field of STATS_COMMAND
+CPU_INTERVAL = 1.0  # Shortest span (s) CPU use is averaged over
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q quantile (the maximum for the last bucket)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self.buckets[index], self.max) if index < len(self.buckets) else self.max
+        return self.max
+
+    def summary(self):
+        return {"count": self.count, "sum": self.total, "max": self.max, "p50": self.quantile(0.5),
+                "p90": self.quantile(0.9), "p99": self.quantile(0.99),
+                "buckets": dict(zip([str(bound) for bound in self.buckets] + ["inf"], self.counts))}
+
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}      # (name, label) -> number
+        self.histograms = {}    # (name, label) -> Histogram
+        self.gauges = {}        # name -> value, or a function called at snapshot time
+        self.started = time.time()
+        self._cpu_sample = (time.monotonic(), self._cpu_seconds())
+        self._cpu_percent = 0.0
+
+    def count(self, name, label=None, amount=1):
+        key = (name, label)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, value, label=None, buckets=LATENCY_BUCKETS):
+        key = (name, label)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def record(self, label, counts, name, value):
+        """count() each (counter, amount) in counts for label and observe(name, value), under one lock."""
+        with self.lock:
+            for counter, amount in counts:
+                key = (counter, label)
+                self.counters[key] = self.counters.get(key, 0) + amount
+            histogram = self.histograms.get((name, None))
+            if histogram is None:
+                histogram = self.histograms[(name, None)] = Histogram()
+            histogram.observe(value)
+
+    def gauge(self, name, value):
+        """Sets a gauge to a value, or to a function that reads it at snapshot time."""
+        with self.lock:
+            self.gauges[name] = value
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    @staticmethod
+    def _cpu_seconds():
+        times = os.times()
+        return times.user + times.system
+
+    def process(self):
+        """
+        Uptime, CPU use since the last call (%), resident memory (KiB) and thread
+        count. Calls less than CPU_INTERVAL apart repeat the last CPU figure.
+        """
+        now, cpu = time.monotonic(), self._cpu_seconds()
+        last_time, last_cpu = self._cpu_sample
+        if now - last_time >= CPU_INTERVAL:
+            self._cpu_sample = (now, cpu)
+            self._cpu_percent = 100.0 * (cpu - last_cpu) / (now - last_time)
+        return {"uptime": time.time() - self.started, "cpu_percent": self._cpu_percent, "rss_kib": resident_kib(),
+                "threads": threading.active_count()}
+
+    def snapshot(self):
+        """Everything recorded so far as plain dicts: {process, gauges, counters, histograms}."""
+        with self.lock:
+            counters = dict(self.counters)
+            histograms = {key: histogram.summary() for key, histogram in self.histograms.items()}
+            gauges = dict(self.gauges)
+        for name, value in gauges.items():
+            if callable(value):
+                try:
+                    gauges[name] = value()
+                except Exception as e:
+                    gauges[name] = None
+                    print(f"[METRICS] Gauge {name} failed: {e}")
+        return {"process": self.process(), "gauges": gauges,
+                "counters": {join_key(key): value for key, value in sorted(counters.items(), key=sort_key)},
+                "histograms": {join_key(key): value for key, value in sorted(histograms.items(), key=sort_key)}}
+
+    def commands(self, snapshot=None):
+        """Per command: {runs, errors, packets, bytes, retries, p50, p90, max} from a snapshot."""
+        snapshot = snapshot or self.snapshot()
+        commands = {}
+        for key, value in snapshot["counters"].items():
+            name, _, command = key.partition("/")
+            if command and name in COMMAND_COUNTERS:
+                commands.setdefault(command, dict.fromkeys(COMMAND_FIELDS, 0))[COMMAND_COUNTERS[name]] = value
+        for key, value in snapshot["histograms"].items():
+            name, _, command = key.partition("/")
+            if name == "command.seconds" and command:
+                entry = commands.setdefault(command, dict.fromkeys(COMMAND_FIELDS, 0))
+                entry.update(p50=value["p50"], p90=value["p90"], max=value["max"])
+        return commands
+
+    def pack(self):
+        """A snapshot in the STATS_HEADER / STATS_COMMAND layout of payloads.py."""
+        snapshot = self.snapshot()
+        process, gauges = snapshot["process"], snapshot["gauges"]
+        commands = self.commands(snapshot)
+        data = bytearray(STATS_HEADER.pack(
+            clamp(process["uptime"], 0xFFFFFFFF), clamp(process["cpu_percent"] * 10, 0xFFFF),
+            clamp(process["rss_kib"], 0xFFFFFFFF), clamp(process["threads"], 0xFF),
+            clamp(gauges.get("jobs") or 0, 0xFF), clamp(gauges.get("radio.queue") or 0, 0xFFFF),
+            clamp(len(commands), 0xFF)))
+        for command, entry in list(commands.items())[:0xFF]:
+            data += STATS_COMMAND.pack(
+                command.encode("utf-8")[:COMMAND_NAME_SIZE], clamp(entry["runs"], 0xFFFF),
+                clamp(entry["errors"], 0xFFFF), clamp(entry["packets"], 0xFFFFFFFF),
+                clamp(entry["bytes"], 0xFFFFFFFF), clamp(entry["retries"], 0xFFFF),
+                clamp(entry["p50"] * 1000, 0xFFFFFFFF), clamp(entry["p90"] * 1000, 0xFFFFFFFF),
+                clamp(entry["max"] * 1000, 0xFFFFFFFF))
+        return bytes(data)
+
+    def text(self, snapshot=None):
+        snapshot = snapshot or self.snapshot()
+        process = snapshot["process"]
+        lines = [f"Up {process['uptime']:.0f}s, CPU {process['cpu_percent']:.1f}%, "
+                 f"RSS {process['rss_kib'] / 1024:.1f} MiB, {process['threads']} threads"]
+        gauges = ", ".join(f"{name} {value}" for name, value in sorted(snapshot["gauges"].items()))
+        if gauges:
+            lines.append(gauges)
+        for command, entry in sorted(self.commands(snapshot).items()):
+            lines.append(f"{command}: {entry['runs']} runs ({entry['errors']} failed), {entry['packets']} pkts, "
+                         f"{entry['bytes']} B, {entry['retries']} retries, "
+                         f"p50 {entry['p50'] * 1000:.0f}ms p90 {entry['p90'] * 1000:.0f}ms max {entry['max'] * 1000:.0f}ms")
+        for key, value in snapshot["histograms"].items():
+            if not key.startswith("command.seconds"):
+                lines.append(f"{key}: {value['count']} x, p50 {value['p50'] * 1000:.1f}ms "
+                             f"p90 {value['p90'] * 1000:.1f}ms max {value['max'] * 1000:.1f}ms")
+        return "\n".join(lines)
+
+    def write_json(self, path):
+        with open(path, "w") as f:
+            json.dump(self.snapshot(), f, indent=2, default=str)
+
+
+# Counters that make up the per-command STATS entries
+COMMAND_COUNTERS = {"command.runs": "runs", "command.errors": "errors", "tx.packets": "packets",
+                    "tx.bytes": "bytes", "tx.retries": "retries"}
+COMMAND_FIELDS = ("runs", "errors", "packets", "bytes", "retries", "p50", "p90", "max")
+
+
+def join_key(key):
+    name, label = key
+    return name if label is None else f"{name}/{label}"
+
+
+def sort_key(item):
+    name, label = item[0]
+    return name, label or ""
+
+
+def clamp(value, limit):
+    return max(0, min(int(value), limit))
+
+
+def resident_kib():
+    """Resident set size of this process in KiB (peak size where /proc is missing)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError, IndexError):
+        try:
+            import resource
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        except ImportError:
+            return 0
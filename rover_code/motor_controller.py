@@ -1,5 +1,6 @@
 import time
 import math
+import threading
 
 try:
     import board
@@ -22,20 +23,33 @@ except OSError as e:
 except ModuleNotFoundError as e:
     print(f"[WARNING] Adafruit Motorkit module is not installed: {e}")
 
+# Held for a whole move including its ramp-down, so a MOVE or STOP that cancelled
+# a running move only touches the motors once that move has stopped them
+motor_lock = threading.Lock()
+
 def ease_in_out_quad(t):
     """Quadratic easing function."""
     if t < 0.5:
         return 2 * t * t
     return -1 + (4 - 2 * t) * t
 
-def soft_start(motor, target_speed, duration):
+def _pause(seconds, cancel=None):
+    """Sleeps, returning True early if the cancel Event is set (STOP or a newer MOVE)."""
+    if cancel is None:
+        time.sleep(seconds)
+        return False
+    return cancel.wait(seconds)
+
+def soft_start(motor, target_speed, duration, cancel=None):
     steps = 20  # More steps = smoother
     step_time = duration / steps
     for i in range(steps):
         t = i / (steps - 1)
         eased = ease_in_out_quad(t)
         motor.throttle = target_speed * eased
-        time.sleep(step_time)
+        if _pause(step_time, cancel):
+            return False
+    return True
 
 def soft_stop(motor, duration):
     steps = 20
@@ -48,35 +62,45 @@ def soft_stop(motor, duration):
         time.sleep(step_time)
     motor.throttle = 0
 
-def move_with_soft(motor1, motor1_speed, motor3, motor3_speed, total_duration):
+def move_with_soft(motor1, motor1_speed, motor3, motor3_speed, total_duration, cancel=None):
+    """Returns False if cancel was set before the move finished; the motors are ramped down either way."""
+    with motor_lock:
+        return _move_with_soft(motor1, motor1_speed, motor3, motor3_speed, total_duration, cancel)
+
+def _move_with_soft(motor1, motor1_speed, motor3, motor3_speed, total_duration, cancel=None):
     ramp_duration = total_duration * 0.15  # 15% for start, 15% for stop
     run_duration = total_duration * 0.7        # 70% full speed
     
     # Soft start
-    soft_start(motor1, motor1_speed, ramp_duration)
-    soft_start(motor3, motor3_speed, ramp_duration)
+    completed = soft_start(motor1, motor1_speed, ramp_duration, cancel) and \
+        soft_start(motor3, motor3_speed, ramp_duration, cancel)
     
     # Full speed
-    motor1.throttle = motor1_speed
-    motor3.throttle = motor3_speed
-    time.sleep(run_duration)
+    if completed:
+        motor1.throttle = motor1_speed
+        motor3.throttle = motor3_speed
+        completed = not _pause(run_duration, cancel)
     
-    # Soft stop
-    soft_stop(motor1, ramp_duration)
-    soft_stop(motor3, ramp_duration)
+    # Soft stop (a cancelled move stops quickly)
+    soft_stop(motor1, ramp_duration if completed else 0.15)
+    soft_stop(motor3, ramp_duration if completed else 0.15)
+    return completed
 
-def move_forward(duration, speed):
-    move_with_soft(kit.motor1, -speed, kit.motor3, -speed, duration)
+def move_forward(duration, speed, cancel=None):
+    return move_with_soft(kit.motor1, -speed, kit.motor3, -speed, duration, cancel)
 
-def move_backward(duration, speed):
-    move_with_soft(kit.motor1, speed, kit.motor3, speed, duration)
+def move_backward(duration, speed, cancel=None):
+    return move_with_soft(kit.motor1, speed, kit.motor3, speed, duration, cancel)
 
-def turn_left(duration, speed):
-    move_with_soft(kit.motor1, -speed, kit.motor3, speed, duration)  # Left motor backward, right motor forward
+def turn_left(duration, speed, cancel=None):
+    return move_with_soft(kit.motor1, -speed, kit.motor3, speed, duration, cancel)  # Left motor backward, right motor forward
 
-def turn_right(duration, speed):
-    move_with_soft(kit.motor1, speed, kit.motor3, -speed, duration)  # Left motor forward, right motor backward
+def turn_right(duration, speed, cancel=None):
+    return move_with_soft(kit.motor1, speed, kit.motor3, -speed, duration, cancel)  # Left motor forward, right motor backward
 
 def stop():
-    soft_stop(kit.motor1, 0.15)  # optional: set a small soft stop time
-    soft_stop(kit.motor3, 0.15)
\ No newline at end of file
+    if kit is None:
+        return
+    with motor_lock:
+        soft_stop(kit.motor1, 0.15)  # optional: set a small soft stop time
+        soft_stop(kit.motor3, 0.15)
\ No newline at end of file
@@ -1,45 +1,47 @@
 import subprocess
+from executor import stream_lines
 
-def ping_host(host="8.8.8.8", count=1, timeout=1):
-    """Ping a host and return the output."""
+
+def _run(args, label, out=None, cancel=None):
+    """
+    Runs a test command and returns its output. With a ResponseWriter as out,
+    lines are also sent as they are printed instead of after the process exits.
+    """
+    if out is None:
+        try:
+            result = subprocess.run(
+                args,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                text=True
+            )
+            output = result.stdout.strip()
+        except Exception as e:
+            output = f"[{label} ERROR] {e}"
+        return output
+
+    lines = []
     try:
-        result = subprocess.run(
-            ["ping", "-c", str(count), "-W", str(timeout), host],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True
-        )
-        output = result.stdout.strip()
-    except Exception as e:
-        output = f"[PING ERROR] {e}"
-    return output
-
-
-def check_dns(domain="google.com"):
+        for line in stream_lines(args, cancel):
+            if line.strip() or lines:
+                lines.append(line)
+                out.write(line)
+    except OSError as e:
+        lines.append(f"[{label} ERROR] {e}")
+        out.write(lines[-1])
+    return "\n".join(lines).strip()
+
+
+def ping_host(host="8.8.8.8", count=1, timeout=1, out=None, cancel=None):
+    """Ping a host and return the output."""
+    return _run(["ping", "-c", str(count), "-W", str(timeout), host], "PING", out, cancel)
+
+
+def check_dns(domain="google.com", out=None, cancel=None):
     """Do a basic DNS lookup test."""
-    try:
-        result = subprocess.run(
-            ["nslookup", domain],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True
-        )
-        output = result.stdout.strip()
-    except Exception as e:
-        output = f"[DNS ERROR] {e}"
-    return output
-
-
-def check_internet_connectivity():
+    return _run(["nslookup", domain], "DNS", out, cancel)
+
+
+def check_internet_connectivity(out=None, cancel=None):
     """Check if we can reach a known URL using curl (or similar)."""
-    try:
-        result = subprocess.run(
-            ["curl", "-Is", "https://github.com", "--max-time", "3"],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True
-        )
-        output = result.stdout.strip()
-    except Exception as e:
-        output = f"[CONNECTIVITY ERROR] {e}"
-    return output
+    return _run(["curl", "-Is", "https://github.com", "--max-time", "3"], "CONNECTIVITY", out, cancel)
@@ -0,0 +1,116 @@
+from array import array
+
+'''
+Bounded history of sent packets for HISTORY/RESEND.
+
+Every stored packet gets a monotonically increasing sequence number that never
+changes, so "RESEND 120-125" always means the same packets for as long as they
+are retained. Storage is preallocated: slot metadata in fixed arrays and the
+packet bytes in one circular arena. The oldest packets are evicted when either
+the packet count or the byte budget would be exceeded.
+'''
+
+MAX_HISTORY = 500           # Number of sent packets to retain in memory
+MAX_HISTORY_BYTES = 65536   # Arena size for their bytes
+
+
+class PacketHistory:
+    def __init__(self, capacity=MAX_HISTORY, byte_budget=MAX_HISTORY_BYTES):
+        self.capacity = capacity
+        self.byte_budget = byte_budget
+        self._arena = bytearray(byte_budget)
+        self._offsets = array('I', [0]) * capacity
+        self._lengths = array('H', [0]) * capacity
+        self._first = 0     # Oldest retained sequence number
+        self._next = 0      # Sequence number of the next packet
+        self._write = 0     # Arena offset for the next packet
+        self._used = 0      # Bytes held by retained packets
+
+    def __len__(self):
+        return self._next - self._first
+
+    @property
+    def first_seq(self):
+        return self._first
+
+    @property
+    def last_seq(self):
+        """Sequence number of the newest packet, or -1 if nothing was stored yet."""
+        return self._next - 1
+
+    @property
+    def bytes_used(self):
+        return self._used
+
+    def _evict_oldest(self):
+        self._used -= self._lengths[self._first % self.capacity]
+        self._first += 1
+
+    def append(self, packet):
+        """Stores a packet and returns its sequence number."""
+        size = len(packet)
+        if size > self.byte_budget:
+            raise ValueError(f"Packet of {size} bytes exceeds the history budget")
+
+        if len(self) == self.capacity:
+            self._evict_oldest()
+
+        if self._write + size > self.byte_budget:
+            # Wrap around. Whatever still sits between here and the end of the
+            # arena is older than anything at the start, so it goes first.
+            while len(self) and self._offsets[self._first % self.capacity] >= self._write:
+                self._evict_oldest()
+            self._write = 0
+
+        end = self._write + size
+        while len(self):
+            slot = self._first % self.capacity
+            offset = self._offsets[slot]
+            if offset >= end or (offset < self._write and offset + self._lengths[slot] <= self._write):
+                break
+            self._evict_oldest()
+
+        slot = self._next % self.capacity
+        self._arena[self._write:end] = packet
+        self._offsets[slot] = self._write
+        self._lengths[slot] = size
+        self._write = end
+        self._used += size
+        seq = self._next
+        self._next += 1
+        return seq
+
+    def get(self, seq):
+        """Returns the packet with this sequence number, or None if it is not retained."""
+        if not self._first <= seq < self._next:
+            return None
+        slot = seq % self.capacity
+        offset = self._offsets[slot]
+        return bytes(self._arena[offset:offset + self._lengths[slot]])
+
+    def range(self, start, end):
+        """Returns (seq, packet) for every retained packet with start <= seq <= end."""
+        return [(seq, self.get(seq)) for seq in range(max(start, self._first), min(end, self.last_seq) + 1)]
+
+    def last(self, count):
+        """Returns (seq, packet) for the newest count packets."""
+        return self.range(self._next - count, self.last_seq)
+
+
+def parse_seq_ranges(args):
+    """
+    Parses sequence numbers and ranges such as "5", "10-20" or "3,7-9 12"
+    into a list of inclusive (start, end) pairs.
+    """
+    text = " ".join(args).replace(":", "").replace(",", " ")
+    ranges = []
+    for token in text.split():
+        if "-" in token:
+            start, end = token.split("-", 1)
+            start, end = int(start), int(end)
+        else:
+            start = end = int(token)
+        if start > end:
+            start, end = end, start
+        ranges.append((start, end))
+    return ranges
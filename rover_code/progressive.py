@@ -0,0 +1,44 @@
+import zlib
+from images import pack_pixels
+from payloads import ADAM7_PASSES
+
+'''
+Progressive (coarse-to-fine) image encoding for SCREENSHOT.
+
+The quantized pixels are reordered into the seven Adam7 passes used by
+interlaced PNGs: pass 1 holds every 8th pixel of every 8th row, and each
+later pass doubles the resolution in one direction. Every pass is packed at
+the bit depth like convert_image() (starting on a byte boundary) and the
+passes go through one zlib stream that is flushed after each pass, so the
+basestation can inflate and draw a pass as soon as the chunks up to its
+flush point arrived.
+
+Payload (sent with CODEC_PROGRESSIVE): zlib(pass 1 | pass 2 | ... | pass 7).
+The first pass of a 128x128 4bpp image is 128 bytes before compression, so
+a blocky preview is on screen after the first packet or two, and the
+operator can STOP the transfer once the picture is good enough. The
+basestation side is ProgressiveDecoder in basestation_code/reconstructor.py.
+'''
+
+
+def adam7_indices(width, height):
+    """Row-major pixel indices of each Adam7 pass, in transmission order."""
+    return [[y * width + x for y in range(y0, height, dy) for x in range(x0, width, dx)]
+            for x0, y0, dx, dy in ADAM7_PASSES]
+
+
+def encode_progressive(pixels, size, bit_depth):
+    """
+    Encodes quantized pixels (see images.quantize_image). Returns the zlib
+    payload and the payload length at which each pass can be decoded.
+    """
+    width, height = size
+    compressor = zlib.compressobj(9)
+    payload = bytearray()
+    pass_ends = []
+    passes = adam7_indices(width, height)
+    for number, indices in enumerate(passes):
+        payload += compressor.compress(pack_pixels([pixels[i] for i in indices], bit_depth))
+        payload += compressor.flush(zlib.Z_FINISH if number == len(passes) - 1 else zlib.Z_SYNC_FLUSH)
+        pass_ends.append(len(payload))
+    return bytes(payload), pass_ends
@@ -0,0 +1,147 @@
+import threading
+import time
+from collections import deque
+from framing import HEADER_SIZE, MAX_PACKET_SIZE
+from executor import current_job, bind_job
+
+'''
+Coalesces line-by-line command output into full frames.
+
+Commands like RUN used to call send_response() for every stdout line, so a
+10-byte line cost a whole acknowledged packet. A ResponseWriter buffers lines
+and sends them as one response when the buffer fills a frame, when no new
+line arrived for IDLE_FLUSH seconds, when the oldest buffered line has waited
+MAX_DELAY seconds, or when the writer is closed (process exit).
+
+Sending happens on a helper thread so the command keeps reading its process
+output while the radio is busy. Once MAX_PENDING bytes are waiting to be sent,
+write() blocks; the process then blocks on its full pipe instead of the
+backlog growing without bound.
+
+    with ResponseWriter(handler) as out:
+        for line in stream_lines(args):
+            out.write(line)
+    handler.send_final_token()
+'''
+
+IDLE_FLUSH = 0.5        # Send buffered lines after this long without output (s)
+MAX_DELAY = 2.0         # Never hold a line longer than this (s)
+MAX_PENDING = 2048      # Bytes waiting for the radio before write() blocks
+COMPRESSED_FILL = 2     # Text bytes per frame byte assumed when compression is on
+
+
+class ResponseWriter:
+    def __init__(self, handler, flush_size=None, idle=IDLE_FLUSH, max_delay=MAX_DELAY, max_pending=MAX_PENDING):
+        self.handler = handler
+        if flush_size is None:
+            flush_size = min(handler.max_packet_size, MAX_PACKET_SIZE) - HEADER_SIZE
+            if handler.compression_enabled:
+                flush_size *= COMPRESSED_FILL
+        self.flush_size = flush_size
+        self.idle = idle
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        # The helper thread sends as part of the caller's message and job
+        self.msg_id = handler.msg_id
+        self.command = handler.airtime.command  # Its packets count towards the caller's command
+        self.job = current_job()
+        self.lines = []
+        self.buffered = 0
+        self.first_write = None
+        self.last_write = None
+        self.pending = deque()
+        self.pending_bytes = 0
+        self.closed = False
+        self.condition = threading.Condition()
+        self.thread = None
+        self.stats = {"lines": 0, "responses": 0, "bytes": 0, "stalls": 0}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def write(self, text):
+        """Buffers one or more lines of output. Blocks while too much is waiting to be sent."""
+        lines = str(text).splitlines() or [""]
+        with self.condition:
+            if self.closed:
+                raise ValueError("ResponseWriter is closed")
+            if self.pending_bytes >= self.max_pending:
+                self.stats["stalls"] += 1
+                while self.pending_bytes >= self.max_pending:
+                    self.condition.wait()
+            now = time.time()
+            for line in lines:
+                if not self.lines:
+                    self.first_write = now
+                self.lines.append(line)
+                self.buffered += len(line.encode('utf-8')) + 1
+                self.stats["lines"] += 1
+                if self.buffered >= self.flush_size:
+                    self._flush()
+            self.last_write = now
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="response-writer", daemon=True)
+                self.thread.start()
+            self.condition.notify_all()
+
+    def flush(self):
+        """Queues whatever is buffered without waiting for the timers."""
+        with self.condition:
+            self._flush()
+            self.condition.notify_all()
+
+    def close(self):
+        """Sends everything still buffered and waits until it went out."""
+        with self.condition:
+            self._flush()
+            self.closed = True
+            self.condition.notify_all()
+            thread = self.thread
+        if thread is not None:
+            thread.join()
+
+    def _flush(self):
+        # Caller holds the condition
+        if not self.lines:
+            return
+        text = "\n".join(self.lines)
+        self.pending.append(text)
+        self.pending_bytes += self.buffered
+        self.lines = []
+        self.buffered = 0
+
+    def _due(self, now):
+        """Seconds until the buffered lines must be sent, or None if nothing is buffered."""
+        if not self.lines:
+            return None
+        return min(self.last_write + self.idle, self.first_write + self.max_delay) - now
+
+    def _run(self):
+        bind_job(self.job)
+        self.handler.msg_id = self.msg_id
+        self.handler.airtime.command = self.command
+        while True:
+            with self.condition:
+                while not self.pending:
+                    due = self._due(time.time())
+                    if due is not None and due <= 0:
+                        self._flush()
+                        break
+                    if self.closed:
+                        return
+                    self.condition.wait(due)
+                text = self.pending.popleft()
+
+            size = len(text.encode('utf-8')) + 1
+            try:
+                self.handler.send_response(text)
+            except Exception as e:
+                print(f"[ERROR] Sending buffered output failed: {e}")
+            with self.condition:
+                self.pending_bytes -= size
+                self.stats["responses"] += 1
+                self.stats["bytes"] += size
+                self.condition.notify_all()
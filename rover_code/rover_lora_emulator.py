@@ -1,29 +1,262 @@
+import argparse
+import importlib.util
+import os
+import random
+import time
+from collections import deque
 from command_handler import CommandHandler
+from link_controller import LinkController
+from file_sender import send_file
+from executor import CommandExecutor
+from framing import (is_frame, decode_frame, encode_frame, FrameError, split_batch, pack_batch, TYPE_FILE,
+                     TYPE_XFER_BEGIN, TYPE_BATCH, FLAG_COMPRESSED)
 
 """
-This code emulates the basestation without LoRa hardware. 
+This code emulates the basestation without LoRa hardware.
 The purpose of this module is to test the rover command system locally
 without using LoRa hardware. You can simulate commands using your keyboard.
-This code is not what the rover should be running!! 
+This code is not what the rover should be running!!
 """
 
+# Rough per-packet costs taken from the field logs (128-byte stop-and-wait packets
+# took ~0.44 s each excluding the 0.1 s sleep). Only used to estimate link time.
+FRAME_TIME = 0.25   # seconds on air per data frame
+TURNAROUND = 0.19   # seconds per ACK round trip (radio turnaround + ACK frame)
+FRAME_OVERHEAD = 0.05   # seconds on air per frame before the first byte (virtual clock)
+BYTE_TIME = 0.0024      # seconds on air per byte (slope of the range test latencies)
+
+
+def _load_feather_receiver():
+    # The Feather's receiver module is plain Python, so reuse it as the emulated peer.
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "adafruit_feather_code", "windowed_receiver.py")
+    spec = importlib.util.spec_from_file_location("feather_windowed_receiver", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
 class FakeLoRa:
-    def send(self, data):
-        print(f"[SENT] [{len(data)} bytes]: {data.decode('utf-8')}")
-        
+    def __init__(self, loss=0.0, seed=None, verbose=True, ber=0.0):
+        self.loss = loss
+        self.ber = ber  # Bit error rate; makes long frames likelier to be lost
+        self.now = 0.0  # Virtual link time, advanced by every frame sent
+        self.random = random.Random(seed)
+        self.verbose = verbose
+        self.ack_delay = None
+        self.ack_retries = 5
+        self.ack_wait = 0.5
+        self.node = 1
+        self.destination = 2
+        self.last_rssi = -60
+        self.inbox = deque()
+        self.feather = _load_feather_receiver()
+        self.transfer = None
+        self.frames_sent = 0
+        self.frames_lost = 0
+        self.round_trips = 0
+
+    def _lost(self, size=0):
+        delivered = (1 - self.loss) * (1 - self.ber) ** (8 * size)
+        if self.random.random() >= delivered:
+            self.frames_lost += 1
+            return True
+        return False
+
+    def clock(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+    def _airtime(self, data):
+        return FRAME_OVERHEAD + BYTE_TIME * len(data)
+
+    def _print(self, data):
+        if not self.verbose:
+            return
+        if is_frame(data):
+            frame = decode_frame(data)
+            try:
+                payload = frame.payload.decode('utf-8')
+            except UnicodeDecodeError:
+                payload = frame.payload.hex()
+            if frame.flags & FLAG_COMPRESSED:
+                payload = f"(compressed) {frame.payload.hex()}"
+            print(f"[SENT] [{len(data)} bytes] type {frame.type} #{frame.seq + 1}/{frame.total}: {payload}")
+        else:
+            print(f"[SENT] [{len(data)} bytes]: {bytes(data).decode('utf-8')}")
+
+    def _deliver(self, data):
+        """Plays the Feather's part for windowed transfers and queues its ACKs."""
+        if not is_frame(data):
+            return
+        try:
+            frame = decode_frame(data)
+        except FrameError:
+            return
+        if frame.type == TYPE_XFER_BEGIN:
+            self.transfer = self.feather.begin_transfer(frame)
+            return
+        if frame.type != TYPE_FILE or self.transfer is None or frame.msg_id != self.transfer.xfer_id:
+            return
+        ack = self.transfer.handle_frame(frame, data, lambda seq, packet: None)
+        if self.transfer.done:
+            # Final ACK, repeated for any poll that arrives after completion
+            ack = self.transfer.ack_packet()
+        if ack is not None:
+            self.round_trips += 1
+            if not self._lost(len(ack)):
+                self.inbox.append(ack)
+
+    def send(self, data, **kwargs):
+        self._print(data)
+        self.frames_sent += 1
+        self.now += self._airtime(data)
+        if not self._lost(len(data)):
+            self._deliver(data)
+        return True
+
     def send_with_ack(self, data):
-        print(f"[SENT] [{len(data)} bytes]: {data.decode('utf-8')}")
+        self._print(data)
+        for _ in range(self.ack_retries):
+            self.frames_sent += 1
+            self.round_trips += 1
+            self.now += self._airtime(data)
+            if self._lost(len(data)):
+                self.now += self.ack_wait
+                continue
+            self._deliver(data)
+            if not self._lost(4):
+                self.now += TURNAROUND
+                return True
+            self.now += self.ack_wait
+        return False
+
+    def inject(self, line):
+        """Queues a command as if the Feather had sent it (deque appends are thread-safe)."""
+        batch = split_batch(line)
+        if len(batch) > 1:
+            self.inbox.append(encode_frame(TYPE_BATCH, pack_batch(batch)))
+        else:
+            self.inbox.append(line.encode("utf-8"))
+
+    def receive(self, timeout=None, with_ack=False, **kwargs):
+        if self.inbox:
+            self.now += TURNAROUND
+            return self.inbox.popleft()
+        if timeout:
+            self.now += timeout
+            time.sleep(timeout)
+        return None
+
+
+def compare_transfers(size, loss, seed=None, window=8, packet_size=128, fec=0):
+    """Sends the same payload stop-and-wait, windowed and (optionally) windowed with FEC."""
+    payload = "".join(random.Random(seed).choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789+/") for _ in range(size))
+
+    modes = [("stop-and-wait", 1, 0), (f"window {window}", window, 0)]
+    if fec:
+        modes.append((f"window {window} FEC {fec}%", window, fec))
+
+    for label, window_size, redundancy in modes:
+        rfm9x = FakeLoRa(loss=loss, seed=seed, verbose=False)
+        handler = CommandHandler(rfm9x)
+        handler.max_packet_size = packet_size
+        handler.window_size = window_size
+        handler.fec_redundancy = redundancy
+        handler.begin_message()  # The transfer id is the message id, as for a SCREENSHOT
+        ok = send_file(payload, handler)
+        link_time = rfm9x.frames_sent * FRAME_TIME + rfm9x.round_trips * TURNAROUND
+        throughput = size / link_time if link_time > 0 else 0
+        print(f"[COMPARE] {label:>20}: {'ok' if ok else 'FAILED'} | frames {rfm9x.frames_sent} "
+              f"(lost {rfm9x.frames_lost}) | ACK round trips {rfm9x.round_trips} | "
+              f"est. {link_time:.1f}s, {throughput:.1f} bytes/sec")
+
+
+def simulate_adaptive(messages, ber, seed=None, message_size=1024):
+    """
+    Sends the same text response over a link whose bit error rate steps from
+    clean to ber and back, once at a fixed 128-byte packet size and once with
+    the adaptive controller, and compares the virtual link time.
+    """
+    text = "".join(random.Random(seed).choice("abcdefghijklmnopqrstuvwxyz ") for _ in range(message_size))
+    phases = [0.0, ber, 0.0]
+
+    for label, adaptive in (("fixed 128", False), ("adaptive", True)):
+        rfm9x = FakeLoRa(seed=seed, verbose=False)
+        handler = CommandHandler(rfm9x)
+        handler.max_packet_size = 128
+        if adaptive:
+            handler.link = LinkController(clock=rfm9x.clock, sleep=rfm9x.sleep)
+            handler.max_packet_size = handler.link.packet_size
+        for phase, phase_ber in enumerate(phases):
+            rfm9x.ber = phase_ber
+            start, lost = rfm9x.now, rfm9x.frames_lost
+            for _ in range(messages):
+                handler.begin_message()
+                handler.send_response(text)
+                handler.send_final_token()
+            elapsed = rfm9x.now - start
+            print(f"[ADAPTIVE] {label:>9} phase {phase + 1} (BER {phase_ber:g}): {elapsed:.1f}s, "
+                  f"{messages * message_size / elapsed:.1f} bytes/sec, {rfm9x.frames_lost - lost} frames lost, "
+                  f"ending at {handler.max_packet_size} bytes")
+
+
+def run_concurrent(handler, rfm9x):
+    """Typed commands go through the radio inbox to the executor, as on the rover."""
+    executor = CommandExecutor(handler, rfm9x)
+    executor.start()
+    try:
+        while True:
+            raw_input = input().strip()
+            if raw_input.lower() in {"exit", "quit"}:
+                print("Exiting simulation.")
+                break
+            if raw_input:
+                rfm9x.inject(raw_input)
+    except (KeyboardInterrupt, EOFError):
+        print("\n[CTRL+C] Exiting simulation.")
+    finally:
+        executor.shutdown()
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Rover command emulator without LoRa hardware")
+    parser.add_argument("--loss", type=float, default=0.0, help="Probability that any frame is lost (0-1)")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for repeatable loss")
+    parser.add_argument("--compare", type=int, metavar="BYTES",
+                        help="Compare stop-and-wait and windowed transfers of BYTES bytes and exit")
+    parser.add_argument("--window", type=int, default=8, help="Window size used by --compare")
+    parser.add_argument("--fec", type=int, default=0, metavar="PERCENT",
+                        help="Also compare a windowed transfer with this much FEC parity")
+    parser.add_argument("--ber", type=float, default=0.0,
+                        help="Bit error rate; longer frames are lost more often")
+    parser.add_argument("--adaptive", type=int, metavar="MESSAGES",
+                        help="Compare fixed and adaptive packet sizing over MESSAGES responses per link phase and exit")
+    parser.add_argument("--concurrent", action="store_true",
+                        help="Run commands on the CommandExecutor like main.py, so STOP/STATUS work mid-command")
+    options = parser.parse_args()
+
+    if options.adaptive:
+        simulate_adaptive(options.adaptive, options.ber or 1e-4, options.seed)
+        return
+
+    if options.compare:
+        compare_transfers(options.compare, options.loss, options.seed, options.window, fec=options.fec)
+        return
+
     print("LoRa simulation started. Type commands below (or 'exit' to quit).")
 
-    rfm9x = FakeLoRa()
+    rfm9x = FakeLoRa(loss=options.loss, seed=options.seed, ber=options.ber)
     # Assuming rfm9x is already defined and configured
     handler = CommandHandler(rfm9x)
 
+    if options.concurrent:
+        run_concurrent(handler, rfm9x)
+        return
+
 # Dispatch the command using the CommandHandler instance
-    
+
     while True:
         try:
             raw_input = input(">> ").strip()
@@ -34,6 +267,11 @@ def main():
             if not raw_input:
                 continue
 
+            batch = split_batch(raw_input)
+            if len(batch) > 1:
+                handler.handle_batch(batch)
+                continue
+
             parts = raw_input.split()
             command = parts[0]
             args = parts[1:]
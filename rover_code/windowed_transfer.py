@@ -0,0 +1,156 @@
+import struct
+import time
+from framing import (encode_frame, decode_frame, is_frame, FrameError, HEADER_SIZE, XFER_INFO,
+                     TYPE_FILE, TYPE_XFER_BEGIN, TYPE_XFER_ACK, FLAG_POLL, FLAG_ABORT)
+
+'''
+Sliding-window selective-repeat transfers for bulk data (images, files).
+
+Instead of paying a full send_with_ack round trip for every chunk, the rover
+sends a burst of up to `window` data frames back to back and only the last
+frame of the burst asks the receiver for an ACK. The ACK carries the next
+sequence number the receiver is waiting for (cumulative) plus a bitmap of the
+out-of-order frames it already holds, so only the missing sequences are sent
+again. The Feather side lives in adafruit_feather_code/windowed_receiver.py.
+
+With FEC the chunks already include Reed-Solomon parity (see fec.py). The
+Feather treats a block as complete once any k of its frames arrived, so lost
+frames inside a block never need a retransmission round trip.
+
+An ACK with FLAG_ABORT means the operator stopped the transfer at the
+basestation; the sender returns False without sending the rest.
+'''
+
+ACK_BITMAP = struct.Struct(">I")    # bit i set -> seq (cumulative + 1 + i) received
+
+MAX_WINDOW = 32         # Limited by the 32-bit ACK bitmap
+DEFAULT_WINDOW = 8
+ACK_TIMEOUT = 1.5       # seconds to wait for an ACK after a poll
+MAX_TIMEOUTS = 5        # consecutive ACK timeouts before giving up
+
+
+def chunk_payload(data, packet_size):
+    """Splits data into chunks that fit in a frame of packet_size bytes."""
+    chunk_size = packet_size - HEADER_SIZE
+    if chunk_size <= 0:
+        raise ValueError(f"Packet size {packet_size} leaves no room for data")
+    return [data[i:i + chunk_size] for i in range(0, len(data), chunk_size)]
+
+
+class WindowedSender:
+    def __init__(self, rfm9x, window=DEFAULT_WINDOW, ack_timeout=ACK_TIMEOUT, max_timeouts=MAX_TIMEOUTS, cancel=None):
+        self.rfm9x = rfm9x
+        self.cancel = cancel  # threading.Event; the transfer stops between bursts once set
+        self.window = max(1, min(MAX_WINDOW, window))
+        self.ack_timeout = ack_timeout
+        self.max_timeouts = max_timeouts
+        self.stats = {}
+
+    def send(self, chunks, xfer_id, fec_block=0, fec_parity=0, data_chunks=None, data_length=None):
+        """
+        Sends a list of byte chunks as TYPE_FILE frames with message id xfer_id.
+        For FEC transfers pass the block parameters and the size of the data before encoding.
+        Returns True once every chunk has been acknowledged.
+        """
+        total = len(chunks)
+        acked = [False] * total
+        sent = [False] * total
+        base = 0
+        timeouts = 0
+        poll_only = False
+        self.stats = {"packets": total, "sent": 0, "retransmitted": 0, "acks": 0, "timeouts": 0, "aborted": False}
+        start_time = time.time()
+
+        # The start of a transfer goes out reliably so the receiver knows how many
+        # frames to expect and switches to windowed (un-ACKed) receive.
+        if data_chunks is None:
+            data_chunks = total
+        if data_length is None:
+            data_length = sum(len(chunk) for chunk in chunks)
+        info = XFER_INFO.pack(self.window, fec_block, fec_parity, data_chunks, data_length)
+        begin = encode_frame(TYPE_XFER_BEGIN, info, msg_id=xfer_id, total=total)
+        if not self.rfm9x.send_with_ack(begin):
+            # The receiver may have started and only its link ACKs got lost; ask for an XFER_ACK instead
+            polled = encode_frame(TYPE_XFER_BEGIN, info, msg_id=xfer_id, total=total, flags=FLAG_POLL)
+            if not self._confirm_start(polled, xfer_id):
+                print(f"[XFER] Transfer {xfer_id}: receiver did not acknowledge start")
+                return False
+
+        while base < total:
+            if self.cancel is not None and self.cancel.is_set():
+                print(f"[XFER] Transfer {xfer_id} cancelled at {base}/{total}")
+                return False
+            missing = [seq for seq in range(base, min(base + self.window, total)) if not acked[seq]]
+            # After a lost ACK only poke the receiver instead of resending the whole burst.
+            burst = missing[-1:] if poll_only else missing
+
+            for i, seq in enumerate(burst):
+                flags = FLAG_POLL if i == len(burst) - 1 else 0
+                self.rfm9x.send(encode_frame(TYPE_FILE, chunks[seq], msg_id=xfer_id, seq=seq, total=total, flags=flags))
+                self.stats["sent"] += 1
+                if sent[seq]:
+                    self.stats["retransmitted"] += 1
+                sent[seq] = True
+
+            ack = self._wait_for_ack(xfer_id)
+            if ack is None:
+                timeouts += 1
+                self.stats["timeouts"] += 1
+                if timeouts > self.max_timeouts:
+                    print(f"[XFER] Transfer {xfer_id}: no ACK after {timeouts} polls, giving up at {base}/{total}")
+                    return False
+                poll_only = True
+                continue
+
+            timeouts = 0
+            poll_only = False
+            self.stats["acks"] += 1
+            cumulative, bitmap, flags = ack
+            if flags & FLAG_ABORT:
+                self.stats["aborted"] = True
+                print(f"[XFER] Transfer {xfer_id} stopped by the receiver at {cumulative}/{total}")
+                return False
+            for seq in range(base, min(cumulative, total)):
+                acked[seq] = True
+            for bit in range(MAX_WINDOW):
+                seq = cumulative + 1 + bit
+                if seq < total and bitmap & (1 << bit):
+                    acked[seq] = True
+            while base < total and acked[base]:
+                base += 1
+
+        elapsed = time.time() - start_time
+        self.stats["elapsed"] = elapsed
+        print(f"[XFER] Transfer {xfer_id} complete: {total} packets, "
+              f"{self.stats['retransmitted']} retransmitted, {elapsed:.2f}s")
+        return True
+
+    def _confirm_start(self, polled, xfer_id):
+        """Sends the polled XFER_BEGIN until an XFER_ACK for the transfer comes back."""
+        for _ in range(self.max_timeouts):
+            if self.cancel is not None and self.cancel.is_set():
+                return False
+            self.rfm9x.send(polled)
+            if self._wait_for_ack(xfer_id) is not None:
+                print(f"[XFER] Transfer {xfer_id}: start confirmed by XFER_ACK")
+                return True
+        return False
+
+    def _wait_for_ack(self, xfer_id):
+        deadline = time.time() + self.ack_timeout
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return None
+            packet = self.rfm9x.receive(timeout=remaining, with_ack=False)
+            if not is_frame(packet):
+                continue
+            try:
+                frame = decode_frame(packet)
+            except FrameError as e:
+                print(f"[XFER] Dropping bad ACK: {e}")
+                continue
+            if frame.type != TYPE_XFER_ACK or frame.msg_id != xfer_id or len(frame.payload) < ACK_BITMAP.size:
+                continue
+            (bitmap,) = ACK_BITMAP.unpack_from(frame.payload)
+            return frame.seq, bitmap, frame.flags